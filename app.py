@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
 import matplotlib.pyplot as plt
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode 
@@ -9,12 +10,27 @@ import io
 import requests 
 from io import BytesIO 
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import gspread # NOVO: Para interagir com Google Sheets
 from google.oauth2.service_account import Credentials # NOVO: Para autenticação
 
 # IMPORTAÇÃO DOS MÓDULOS DE PROCESSAMENTO E COLETA
-from pdf_processor import extract_text_from_drive_link, process_pdf_bytes, suggest_metadata, extract_file_id 
+from pdf_processor import download_pdf_from_drive_link, process_pdf_in_stages, suggest_metadata, extract_file_id, METADATA_PAGES
 from data_collector import unified_data_search 
+from row_index import build_row_index, duplicate_ids, lookup_rows, positions_by_id
+from write_queue import flush_queue, last_error, start_flusher, failed_rows, requeue_failed, discard_failed
+from storage import SheetsBackend, SQLiteBackend, StaleDataError
+from sheets_client import QuotaAwareSpreadsheet
+from catalog_model import normalize_catalog, normalize_datasets, fold_text, get_by_id, SEARCH_COLUMNS_BIBLIO, SEARCH_COLUMNS_DATASET, SCHEMA_BIBLIO, SCHEMA_DATASET
+from search_index import build_text_index, build_tag_index, build_trigram_index, build_facet_index, ResultSet, QueryCache, TextIndex, TagIndex
+from ranking import build_bm25_index, BM25Index, FIELD_WEIGHTS_BIBLIO, FIELD_WEIGHTS_DATASET
+import index_store
+import local_mirror
+from similarity import SimilarityIndex
+import content_store
+import extraction_cache
+from batch_ingest import run_batch, INGEST_WORKERS, WRITE_BATCH_SIZE
+from dedup import build_duplicate_index, reference_text, shingles, signature, estimated_similarity, DUPLICATE_THRESHOLD
 
 # --- Variáveis de Configuração e Segurança ---
 st.set_page_config(page_title="LABEUR - Biblioteca Digital", layout="wide")
@@ -24,6 +40,9 @@ CREDENCIAL_FILE = 'gdrive_credentials.json'
 SPREADSHEET_ID = "1A8EhdUs9ow5tywxY_xvDHACYezTf_AuQ39H8y3Zqtrc"
 SHEET_BIBLIOGRAFIA_NAME = "bibliografia" # Nome da Aba 1
 SHEET_DATASETS_NAME = "dados_externos" # Nome da Aba 2
+STORAGE_BACKEND = os.environ.get('BIBLIOTECA_BACKEND', 'sheets') # 'sheets' (padrão) ou 'sqlite' (local/offline)
+TAMANHOS_PAGINA = [25, 50, 100] # Opções de itens por página na busca unificada
+TAMANHO_CACHE_BUSCAS = 256 # Resultados de busca mantidos no cache LRU compartilhado
 
 # SENHA FIXA: Hash da senha 'labeur.operacional.senha'
 CORRECT_PASSWORD_HASH = hashlib.sha256("labeur.operacional.senha".encode()).hexdigest() 
@@ -37,6 +56,8 @@ if 'selecao_aggrid_row' not in st.session_state:
     st.session_state['selecao_aggrid_row'] = []
 if 'extracted_text' not in st.session_state:
     st.session_state['extracted_text'] = None
+if 'extracao_restante' not in st.session_state:
+    st.session_state['extracao_restante'] = None # Extração do restante do PDF em segundo plano (Future)
 if 'suggested_data' not in st.session_state:
     st.session_state['suggested_data'] = {}
 if 'logs' not in st.session_state:
@@ -62,178 +83,689 @@ def connect_to_sheets():
         creds = Credentials.from_service_account_file(CREDENCIAL_FILE, scopes=scope)
         client = gspread.authorize(creds)
         spreadsheet = client.open_by_key(SPREADSHEET_ID)
-        return spreadsheet
+        # Handle compartilhado por todas as sessões: cota controlada (token bucket) e métricas por operação
+        return QuotaAwareSpreadsheet(spreadsheet)
     except Exception as e:
         st.error(f"Falha na autenticação ou conexão com o Google Sheets. Verifique o compartilhamento do ID: {SPREADSHEET_ID}. Erro: {e}")
         return None
 
-# Definindo o esquema obrigatório (usado para salvar novos dados)
-SCHEMA_BIBLIO = ["id", "titulo", "autor", "tipo", "ano", "tags", "caminho_arquivo", "resumo", "localizacao_fisica", "data_adicao"]
-SCHEMA_DATASET = ["id", "titulo", "descricao", "link_drive", "data_cadastro"]
+@st.cache_resource
+def get_storage():
+    """Backend de armazenamento configurado (Google Sheets ou SQLite local)."""
+    if STORAGE_BACKEND == 'sqlite':
+        return SQLiteBackend({SHEET_BIBLIOGRAFIA_NAME: SCHEMA_BIBLIO, SHEET_DATASETS_NAME: SCHEMA_DATASET})
+    return SheetsBackend(connect_to_sheets)
 
-@st.cache_data(ttl=60) # Atualiza o cache a cada 60 segundos
-def carregar_dados_bibliografia():
-    """Lê a aba 'bibliografia' do Google Sheets e retorna um DataFrame."""
-    spreadsheet = connect_to_sheets()
-    if not spreadsheet: return pd.DataFrame()
+def _sincronizar_aba(sheet_name):
+    """Atualiza a visão local da aba (no Sheets, o espelho só consulta a planilha periodicamente) e devolve a versão atual."""
+    return get_storage().refresh(sheet_name)
+
+def invalidar_aba(sheet_name):
+    """Após uma escrita: invalida apenas os caches desta aba."""
+    get_storage().invalidate(sheet_name)
+
+def _versao_sincronizada(sheet_name, rotulo):
+    """Sincroniza a aba e devolve a versão atual, avisando sobre erros de leitura; None se a aba não existe."""
     try:
-        worksheet = spreadsheet.worksheet(SHEET_BIBLIOGRAFIA_NAME)
-        data = worksheet.get_all_records()
-        df = pd.DataFrame(data)
-        
-        # Garante que as colunas essenciais existem, adicionando se necessário (para compatibilidade)
-        for col in SCHEMA_BIBLIO:
-            if col not in df.columns:
-                 df[col] = None 
-        
-        # Adiciona um ID temporário se não houver (para visualização no AgGrid)
-        if 'id' not in df.columns or df['id'].empty or not pd.api.types.is_numeric_dtype(df['id']):
-             df['id'] = range(1, len(df) + 1)
-        
-        return df
+        return _sincronizar_aba(sheet_name)
     except gspread.WorksheetNotFound:
-        st.warning(f"Aba '{SHEET_BIBLIOGRAFIA_NAME}' não encontrada na Planilha Mestra. Crie-a.")
-        return pd.DataFrame()
+        st.warning(f"Aba '{sheet_name}' não encontrada na Planilha Mestra. Crie-a.")
+        return None
     except Exception as e:
-        st.error(f"Erro ao carregar dados da aba Bibliografia: {e}")
+        st.error(f"Erro ao carregar dados da aba {rotulo}: {e}")
+        return get_storage().version(sheet_name)
+
+def carregar_dados_bibliografia():
+    """
+    Lê a aba 'bibliografia' pelo backend de armazenamento e retorna um DataFrame.
+    O cache é chaveado pela versão da aba: só é refeito quando a própria aba muda.
+    """
+    versao = _versao_sincronizada(SHEET_BIBLIOGRAFIA_NAME, "Bibliografia")
+    if versao is None:
         return pd.DataFrame()
+    return _carregar_bibliografia_versao(versao)
 
-@st.cache_data(ttl=60)
-def carregar_datasets_externos():
-    """Lê a aba 'dados_externos' do Google Sheets e retorna um DataFrame."""
-    spreadsheet = connect_to_sheets()
-    if not spreadsheet: return pd.DataFrame()
-    try:
-        worksheet = spreadsheet.worksheet(SHEET_DATASETS_NAME)
-        data = worksheet.get_all_records()
-        df = pd.DataFrame(data)
+@st.cache_data(max_entries=2)
+def _carregar_bibliografia_versao(versao):
+    """Monta o DataFrame da aba 'bibliografia' (uma vez por versão)."""
+    df = get_storage().load(SHEET_BIBLIOGRAFIA_NAME)
+    
+    # Garante que as colunas essenciais existem, adicionando se necessário (para compatibilidade)
+    for col in SCHEMA_BIBLIO:
+        if col not in df.columns:
+             df[col] = None 
+    
+    # Adiciona um ID temporário se não houver (para visualização no AgGrid)
+    if 'id' not in df.columns or df['id'].empty or not pd.api.types.is_numeric_dtype(df['id']):
+         df['id'] = range(1, len(df) + 1)
+    
+    return df
 
-        for col in SCHEMA_DATASET:
-            if col not in df.columns:
-                 df[col] = None 
-        
-        if 'id' not in df.columns or df['id'].empty or not pd.api.types.is_numeric_dtype(df['id']):
-             df['id'] = range(1, len(df) + 1)
-             
-        return df
-    except gspread.WorksheetNotFound:
-        st.warning(f"Aba '{SHEET_DATASETS_NAME}' não encontrada na Planilha Mestra. Crie-a.")
-        return pd.DataFrame()
-    except Exception as e:
-        st.error(f"Erro ao carregar dados da aba Datasets: {e}")
+def carregar_datasets_externos():
+    """
+    Lê a aba 'dados_externos' pelo backend de armazenamento e retorna um DataFrame.
+    O cache é chaveado pela versão da aba: só é refeito quando a própria aba muda.
+    """
+    versao = _versao_sincronizada(SHEET_DATASETS_NAME, "Datasets")
+    if versao is None:
         return pd.DataFrame()
+    return _carregar_datasets_versao(versao)
 
-# --- Funções de Escrita e CRUD (Substituindo SQLite) ---
+@st.cache_data(max_entries=2)
+def _carregar_datasets_versao(versao):
+    """Monta o DataFrame da aba 'dados_externos' (uma vez por versão)."""
+    df = get_storage().load(SHEET_DATASETS_NAME)
 
-# Função auxiliar para garantir que o dataframe tem o esquema correto
-def _prepare_df_for_sheets(df, schema):
-    df = df.copy()
-    # Garante que todas as colunas do esquema estão presentes
-    for col in schema:
+    for col in SCHEMA_DATASET:
         if col not in df.columns:
-            df[col] = None
-    # Seleciona apenas as colunas na ordem correta
-    return df[schema]
+             df[col] = None 
+    
+    if 'id' not in df.columns or df['id'].empty or not pd.api.types.is_numeric_dtype(df['id']):
+         df['id'] = range(1, len(df) + 1)
+         
+    return df
 
-def update_all_data(df_atualizado):
-    """Sobrescreve TODA a aba 'bibliografia' com os dados atualizados."""
-    spreadsheet = connect_to_sheets()
-    if not spreadsheet: return False
+def carregar_indice_bibliografia():
+    """Índice id → linha da planilha da aba 'bibliografia', montado uma vez por versão."""
+    return _indice_bibliografia_versao(get_storage().version(SHEET_BIBLIOGRAFIA_NAME))
+
+@st.cache_data(max_entries=2)
+def _indice_bibliografia_versao(versao):
+    return build_row_index(_carregar_bibliografia_versao(versao))
+
+def carregar_indice_datasets():
+    """Índice id → linha da planilha da aba 'dados_externos', montado uma vez por versão."""
+    return _indice_datasets_versao(get_storage().version(SHEET_DATASETS_NAME))
+
+@st.cache_data(max_entries=2)
+def _indice_datasets_versao(versao):
+    return build_row_index(_carregar_datasets_versao(versao))
+
+def _origem_indices():
+    """
+    Identifica a base local das versões: índices persistidos de outra base não são reaproveitados.
+    Inclui o identificador aleatório da base, já que uma base recriada no mesmo caminho recomeça as versões.
+    """
+    storage = get_storage()
+    db_path = storage.db_path or local_mirror.MIRROR_DB_FILE
+    return f"{storage.name}:{os.path.abspath(db_path)}:{local_mirror.database_id(db_path)}"
+
+def versoes_catalogo():
+    """
+    Versões (bibliografia, datasets) sincronizadas, lidas uma única vez. A busca
+    carrega o catálogo e todos os índices exatamente destas versões: o flush da
+    fila de escrita muda as versões em segundo plano, e reler a versão a cada
+    índice misturaria catálogos de tamanhos diferentes.
+    """
+    _versao_sincronizada(SHEET_BIBLIOGRAFIA_NAME, "Bibliografia") # Sincroniza e trata erros de leitura
+    _versao_sincronizada(SHEET_DATASETS_NAME, "Datasets")
+    storage = get_storage()
+    return storage.version(SHEET_BIBLIOGRAFIA_NAME), storage.version(SHEET_DATASETS_NAME)
+
+def carregar_catalogo_bibliografia(versao=None):
+    """
+    Modelo tipado da aba 'bibliografia' para as páginas de consulta (normalizado uma vez por versão).
+    Persistido em disco com os índices: após um reinício, não relê nem renormaliza a aba.
+    `versao` fixa a versão (ver versoes_catalogo); sem ela, sincroniza e usa a atual.
+    """
+    if versao is None:
+        _versao_sincronizada(SHEET_BIBLIOGRAFIA_NAME, "Bibliografia") # Sincroniza e trata erros de leitura
+        versao = get_storage().version(SHEET_BIBLIOGRAFIA_NAME)
+    return _catalogo_bibliografia_versao(versao)
+
+# cache_resource: um único modelo por versão, compartilhado entre sessões e reruns sem cópia
+# (cache_data desserializaria o catálogo inteiro a cada chamada). Somente leitura: quem
+# precisar alterar colunas trabalha sobre uma cópia (.copy()).
+@st.cache_resource(max_entries=2)
+def _catalogo_bibliografia_versao(versao):
+    return index_store.load_or_build_catalog(
+        'catalogo_bibliografia', versao, _origem_indices(),
+        lambda: normalize_catalog(_carregar_bibliografia_versao(versao))
+    )
+
+def carregar_catalogo_datasets(versao=None):
+    """Modelo tipado da aba 'dados_externos' para as páginas de consulta (normalizado uma vez por versão)."""
+    if versao is None:
+        _versao_sincronizada(SHEET_DATASETS_NAME, "Datasets")
+        versao = get_storage().version(SHEET_DATASETS_NAME)
+    return _catalogo_datasets_versao(versao)
+
+@st.cache_resource(max_entries=2) # Somente leitura, como o modelo da bibliografia
+def _catalogo_datasets_versao(versao):
+    return index_store.load_or_build_catalog(
+        'catalogo_datasets', versao, _origem_indices(),
+        lambda: normalize_datasets(_carregar_datasets_versao(versao))
+    )
+
+@st.cache_resource(max_entries=2) # Somente leitura: compartilhado sem cópia entre sessões
+def _busca_bibliografia_versao(versao):
+    """Índice invertido da busca textual da bibliografia (construído uma vez por versão)."""
+    # Reaberto do disco (memory-map) quando outro processo já construiu esta versão
+    return index_store.load_or_build(
+        TextIndex, 'busca_bibliografia', versao, _origem_indices(),
+        lambda: build_text_index(_catalogo_bibliografia_versao(versao), list(SEARCH_COLUMNS_BIBLIO.values()))
+    )
+
+@st.cache_resource(max_entries=2)
+def _busca_aproximada_versao(versao):
+    """Índice de trigramas de titulo/autor da bibliografia para a busca tolerante a erros."""
+    return build_trigram_index(_catalogo_bibliografia_versao(versao), ['busca_titulo', 'busca_autor'])
+
+@st.cache_resource(max_entries=2)
+def _busca_datasets_versao(versao):
+    """Índice invertido da busca textual dos datasets (construído uma vez por versão)."""
+    return index_store.load_or_build(
+        TextIndex, 'busca_datasets', versao, _origem_indices(),
+        lambda: build_text_index(_catalogo_datasets_versao(versao), list(SEARCH_COLUMNS_DATASET.values()))
+    )
+
+@st.cache_resource(max_entries=2)
+def _ranking_bibliografia_versao(versao):
+    """Índice BM25 da bibliografia (titulo, autor, tags, resumo), construído uma vez por versão."""
+    return index_store.load_or_build(
+        BM25Index, 'ranking_bibliografia', versao, _origem_indices(),
+        lambda: build_bm25_index(_catalogo_bibliografia_versao(versao), FIELD_WEIGHTS_BIBLIO)
+    )
+
+@st.cache_resource(max_entries=2)
+def _ranking_datasets_versao(versao):
+    """Índice BM25 dos datasets (titulo, descricao), construído uma vez por versão."""
+    return index_store.load_or_build(
+        BM25Index, 'ranking_datasets', versao, _origem_indices(),
+        lambda: build_bm25_index(_catalogo_datasets_versao(versao), FIELD_WEIGHTS_DATASET)
+    )
+
+def _posicoes_ordenadas(mask, pontuacao):
+    """Posições das linhas filtradas, pela pontuação BM25 (decrescente); empates mantêm a ordem da planilha."""
+    posicoes = np.flatnonzero(mask)
+    if pontuacao is None:
+        return posicoes
+    return posicoes[np.argsort(-pontuacao[posicoes], kind='stable')]
+
+def executar_busca_unificada(versoes, filtro_geral, texto_completo=False):
+    """
+    Aplica a busca textual sobre os índices das `versoes` (bibliografia, datasets) e
+    devolve o conjunto de resultados ordenado por relevância (ResultSet), sem montar
+    DataFrames. Catálogo e índices vêm todos das mesmas versões (posições compatíveis).
+    Com `texto_completo`, inclui as referências cujo PDF contém os termos (após as demais).
+    As facetas são aplicadas depois, sobre este resultado (ver buscar_com_cache).
+    """
+    versao_biblio, versao_datasets = versoes
+    df_biblio = _catalogo_bibliografia_versao(versao_biblio)
+    df_datasets = _catalogo_datasets_versao(versao_datasets)
+    mask_biblio = np.ones(len(df_biblio), dtype=bool)
+    mask_datasets = np.ones(len(df_datasets), dtype=bool)
+    pontuacao_biblio = pontuacao_datasets = None
+    posicoes_conteudo = np.empty(0, dtype=np.int64)
+    aviso = None
+    
+    if filtro_geral:
+        # Busca sem diferenciar maiúsculas nem acentos, pelo índice invertido da versão.
+        # Vários termos: todos precisam aparecer (AND); entre aspas: frase exata.
+        # O BM25 ordena os resultados e também inclui variações (plural/gênero) e o resumo.
+        ranking_biblio = _ranking_bibliografia_versao(versao_biblio)
+        pontuacao_biblio = ranking_biblio.scores(filtro_geral, match_all=True)
+        pontuacao_datasets = _ranking_datasets_versao(versao_datasets).scores(filtro_geral, match_all=True)
+        mask_texto_biblio = _busca_bibliografia_versao(versao_biblio).search_mask(filtro_geral)
+        mask_texto_datasets = _busca_datasets_versao(versao_datasets).search_mask(filtro_geral)
+        if not filtro_geral.strip().startswith('"'): # Frase exata: o BM25 só ordena
+            mask_texto_biblio |= pontuacao_biblio > 0
+            mask_texto_datasets |= pontuacao_datasets > 0
+        if texto_completo:
+            posicoes_conteudo = positions_by_id(df_biblio['id'], [ref_id for ref_id, _n in content_store.search(filtro_geral)])
+        if not mask_texto_biblio.any() and not mask_texto_datasets.any() and not len(posicoes_conteudo):
+            # Nada encontrado: tenta a busca aproximada em título/autor ('Harvy' → 'Harvey')
+            busca_aproximada = _busca_aproximada_versao(versao_biblio)
+            mask_texto_biblio = busca_aproximada.search_mask(filtro_geral.strip('"'))
+            sugestoes = busca_aproximada.suggest(filtro_geral.strip('"'))
+            if sugestoes:
+                pontuacao_biblio = ranking_biblio.scores(sugestoes[0])
+            if mask_texto_biblio.any():
+                aviso = (
+                    f"Nenhum resultado exato para '{filtro_geral}'. Exibindo resultados aproximados"
+                    + (f" — você quis dizer: {', '.join(sugestoes)}?" if sugestoes else ".")
+                )
+        mask_biblio &= mask_texto_biblio
+        mask_datasets &= mask_texto_datasets
+    
+    # Mais relevantes primeiro: a seleção automática (primeira linha) é o melhor resultado.
+    posicoes_biblio = _posicoes_ordenadas(mask_biblio, pontuacao_biblio)
+    if len(posicoes_conteudo):
+        # Encontradas só no texto completo: depois, pela contagem de ocorrências
+        posicoes_biblio = np.concatenate([posicoes_biblio, posicoes_conteudo[~mask_biblio[posicoes_conteudo]]])
+    return ResultSet(
+        posicoes_biblio,
+        _posicoes_ordenadas(mask_datasets, pontuacao_datasets),
+        notice=aviso,
+    )
+
+@st.cache_resource
+def get_cache_buscas():
+    """Cache LRU dos resultados da busca unificada, compartilhado entre sessões."""
+    return QueryCache(maxsize=TAMANHO_CACHE_BUSCAS)
+
+def buscar_com_cache(versoes, filtro_geral, temas=(), todos_os_temas=True, tipos=(), anos=None, texto_completo=False):
+    """
+    Busca unificada com cache: a chave é a consulta normalizada e as facetas
+    (temas, tipos e faixa de anos), válida para as `versoes` (bibliografia, datasets)
+    com que a página carregou o catálogo; o cache é descartado quando a versão de
+    qualquer uma das abas muda. Refinar as facetas reaproveita o resultado textual em cache.
+    """
+    versoes = tuple(versoes)
+    consulta = ' '.join(fold_text(filtro_geral).split())
+    temas = tuple(sorted(temas))
+    todos_os_temas = todos_os_temas or len(temas) < 2 # E/OU só faz diferença com 2+ temas
+    tipos = tuple(sorted(tipos))
+    texto_completo = bool(texto_completo and consulta)
+    cache = get_cache_buscas()
+    resultado = cache.get_or_compute(
+        (consulta, texto_completo), versoes,
+        lambda: executar_busca_unificada(versoes, consulta, texto_completo)
+    )
+    if not (temas or tipos or anos):
+        return resultado
+    return cache.get_or_compute(
+        (consulta, texto_completo, temas, todos_os_temas, tipos, anos), versoes,
+        lambda: resultado.filter_biblio(carregar_facetas_bibliografia(versoes[0]).mask(tipos, anos, temas, todos_os_temas))
+    )
+
+def faixa_de_anos(facetas, faixa):
+    """Faixa (início, fim) do slider de anos, ou None quando cobre todo o catálogo (sem filtro)."""
+    if faixa is None or tuple(faixa) == (facetas.ano_min, facetas.ano_max):
+        return None
+    return tuple(int(a) for a in faixa)
+
+def ajustar_faixa_de_anos(facetas):
+    """Mantém a faixa do slider de anos (na sessão) dentro dos limites atuais do catálogo.
+
+    Após uma escrita ou sincronização, ano_min/ano_max podem mudar; um valor guardado fora
+    dos novos limites faz o Streamlit levantar erro. A faixa é recortada aos limites, e uma
+    faixa que cobria todo o catálogo antigo passa a cobrir todo o novo. O valor inicial do
+    slider também é semeado aqui (o widget não recebe `value`, que conflitaria com a sessão).
+    """
+    limites = (facetas.ano_min, facetas.ano_max)
+    limites_anteriores = st.session_state.get('faceta_anos_limites')
+    st.session_state['faceta_anos_limites'] = limites
+    if facetas.ano_min is None or facetas.ano_min >= facetas.ano_max:
+        st.session_state.pop('faceta_anos', None) # Sem slider
+        return
+    faixa = st.session_state.get('faceta_anos')
+    if faixa is None or (limites_anteriores != limites and tuple(faixa) == limites_anteriores):
+        st.session_state['faceta_anos'] = limites
+    elif limites_anteriores != limites:
+        inicio = min(max(int(faixa[0]), facetas.ano_min), facetas.ano_max)
+        fim = min(max(int(faixa[1]), facetas.ano_min), facetas.ano_max)
+        st.session_state['faceta_anos'] = (inicio, fim) if inicio <= fim else limites
+
+def formatar_pagina_resultados(df_biblio, df_datasets, posicoes_biblio, posicoes_datasets):
+    """Monta apenas as linhas da página visível, no formato da grade unificada."""
+    paginas = []
+    if len(posicoes_biblio):
+        refs = df_biblio.iloc[posicoes_biblio]
+        paginas.append(pd.DataFrame({
+            'Tipo de Recurso': 'Referência (' + refs['tipo'].astype(str) + ')',
+            'titulo': refs['titulo'],
+            'Autor/Fonte': refs['autor'],
+            'Ano/Data': refs['ano'].astype('string').fillna(''),
+            'Localização': refs['localizacao_fisica'].astype(str),
+            'ID_Recurso': 'B-' + refs['id'].astype(str),
+        }))
+    if len(posicoes_datasets):
+        dados = df_datasets.iloc[posicoes_datasets]
+        paginas.append(pd.DataFrame({
+            'Tipo de Recurso': 'Dataset/Dado',
+            'titulo': dados['titulo'],
+            'Autor/Fonte': dados['descricao'],
+            'Ano/Data': dados['data_cadastro'].str[:10],
+            'Localização': 'Drive/Online',
+            'ID_Recurso': 'D-' + dados['id'].astype(str),
+        }))
+    if not paginas:
+        return pd.DataFrame(columns=['Tipo de Recurso', 'titulo', 'Autor/Fonte', 'Ano/Data', 'Localização', 'ID_Recurso'])
+    return pd.concat(paginas, ignore_index=True)
+
+@st.cache_resource
+def get_similares():
+    """Índice de obras relacionadas (TF-IDF), carregado do disco sem retreinamento."""
+    return SimilarityIndex()
+
+def carregar_similares():
+    """Índice de obras relacionadas alinhado à versão atual do catálogo (vetoriza só o que mudou)."""
+    return _similares_versao(get_storage().version(SHEET_BIBLIOGRAFIA_NAME))
+
+@st.cache_resource(max_entries=1)
+def _similares_versao(versao):
+    indice = get_similares()
+    pendentes = [r[0] for r in get_storage().pending_rows(SHEET_BIBLIOGRAFIA_NAME) if isinstance(r[0], (int, float))]
+    indice.sync(_catalogo_bibliografia_versao(versao), keep_ids=pendentes)
+    return indice
+
+def carregar_duplicatas_bibliografia():
+    """Índice MinHash/LSH de quase-duplicatas da bibliografia (construído uma vez por versão)."""
+    return _duplicatas_versao(get_storage().version(SHEET_BIBLIOGRAFIA_NAME))
+
+@st.cache_resource(max_entries=2)
+def _duplicatas_versao(versao):
+    return build_duplicate_index(_catalogo_bibliografia_versao(versao))
+
+def possiveis_duplicatas(data):
+    """
+    Referências já cadastradas (ou ainda na fila de envio) parecidas com `data`:
+    lista de (id, título, similaridade), da mais parecida para a menos.
+    """
+    texto = reference_text(data.get('titulo'), data.get('autor'), data.get('resumo'))
+    df_biblio = carregar_catalogo_bibliografia()
+    encontradas = [
+        (dup_id, get_by_id(df_biblio, dup_id)['titulo'], sim)
+        for dup_id, sim in carregar_duplicatas_bibliografia().query(texto)
+    ]
+    # Linhas na fila ainda não estão no índice: poucas, comparadas uma a uma (ordem do SCHEMA_BIBLIO)
+    assinatura = signature(shingles(texto))
+    for row in get_storage().pending_rows(SHEET_BIBLIOGRAFIA_NAME):
+        sim = estimated_similarity(assinatura, signature(shingles(reference_text(row[1], row[2], row[7]))))
+        if sim >= DUPLICATE_THRESHOLD:
+            encontradas.append((row[0], row[1], sim))
+    return sorted(encontradas, key=lambda d: -d[2])
+
+def _avisar_duplicatas(duplicatas):
+    st.warning(
+        "Esta referência parece já estar cadastrada:\n\n"
+        + "\n".join(f"- ID {dup_id}: **{titulo}** (similaridade {sim:.0%})" for dup_id, titulo, sim in duplicatas[:5])
+        + "\n\nSe não for duplicata, marque \"Salvar mesmo assim\" e envie novamente."
+    )
+
+def carregar_facetas_bibliografia(versao=None):
+    """Facetas tipo/ano/tags da bibliografia para filtros e contagens (construídas uma vez por versão)."""
+    return _facetas_versao(get_storage().version(SHEET_BIBLIOGRAFIA_NAME) if versao is None else versao)
+
+@st.cache_resource(max_entries=2)
+def _facetas_versao(versao):
+    return build_facet_index(_catalogo_bibliografia_versao(versao), _temas_versao(versao))
+
+@st.cache_resource(max_entries=2)
+def _temas_versao(versao):
+    """Índice tag → linhas da bibliografia, com contagens (construído uma vez por versão)."""
+    return index_store.load_or_build(
+        TagIndex, 'temas_bibliografia', versao, _origem_indices(),
+        lambda: build_tag_index(_catalogo_bibliografia_versao(versao))
+    )
+
+# --- Extração de PDFs em Duas Etapas ---
+
+@st.cache_resource
+def get_executor_extracao():
+    """Threads que terminam a extração de PDFs longos em segundo plano (compartilhadas entre sessões)."""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix='extracao_pdf')
+
+def texto_extraido_completo(esperar=False):
+    """
+    Texto do PDF em processamento: o documento inteiro quando a extração em segundo plano
+    terminou (ou, com `esperar`, aguardando-a); até lá, o das primeiras páginas.
+    """
+    futuro = st.session_state.get('extracao_restante')
+    if futuro is not None and (esperar or futuro.done()):
+        st.session_state['extracao_restante'] = None
+        texto = futuro.result()
+        if texto and not texto.startswith("Erro"):
+            st.session_state['extracted_text'] = texto
+        else:
+            st.warning(f"O restante do documento não pôde ser extraído; foram mantidas apenas as primeiras páginas. {texto}")
+    return st.session_state['extracted_text']
+
+# --- Ingestão em Lote (Sincronização Drive) ---
+
+def _celula_vazia(serie):
+    """Células ausentes: NaN/None ou texto em branco (como o Sheets devolve células vazias)."""
+    return serie.fillna('').astype(str).str.strip().eq('')
+
+def aplicar_resultados_lote(df, resultados):
+    """Preenche no DataFrame da aba o resumo sugerido e os campos ainda vazios (autor, tags) dos PDFs processados."""
+    por_id = {r['id']: r for r in resultados}
+    ids = df['id']
+    for pos in positions_by_id(ids, list(por_id)): # IDs excluídos durante o processamento não aparecem
+        r = por_id[ids.iat[pos]] # Um ID repetido na aba preenche todas as suas linhas
+        sugestoes, idx = r['sugestoes'], df.index[pos]
+        df.at[idx, 'resumo'] = sugestoes.get('resumo') or r['texto'][:1500]
+        for col, vazio in (('autor', "Autor não detectado"), ('tags', "")):
+            atual = df.at[idx, col]
+            if (atual is None or pd.isna(atual) or not str(atual).strip()) and sugestoes.get(col, vazio) != vazio:
+                df.at[idx, col] = sugestoes[col]
+
+def _indexar_textos_lote(df, resultados):
+    """Texto completo dos PDFs gravados: busca no conteúdo e obras relacionadas."""
     try:
-        df_clean = _prepare_df_for_sheets(df_atualizado, SCHEMA_BIBLIO)
-        worksheet = spreadsheet.worksheet(SHEET_BIBLIOGRAFIA_NAME)
-        worksheet.update([df_clean.columns.values.tolist()] + df_clean.values.tolist())
-        st.cache_data.clear() # Limpa o cache para forçar nova leitura
-        return True
+        similares = get_similares()
+        linhas = df.drop_duplicates('id').set_index('id') # Um vetor por ID: o da primeira linha de um ID repetido
+        for r in resultados:
+            content_store.store_text(r['id'], r['texto'])
+            if r['id'] in linhas.index:
+                similares.add_reference(r['id'], str(linhas.at[r['id'], 'titulo']), str(linhas.at[r['id'], 'resumo']), r['texto'])
+        similares.save()
     except Exception as e:
-        st.error(f"Erro ao salvar dados (bibliografia) no Google Sheets: {e}")
-        return False
+        st.warning(f"Resumos gravados, mas os índices de texto completo não foram atualizados: {e}")
 
-def delete_reference(id_livro):
-    """Exclui uma referência no Google Sheets pelo ID."""
-    df = carregar_dados_bibliografia()
-    if df.empty: return
+def processar_lote_pendentes(df_biblio, itens, n_processos):
+    """
+    Ingestão em lote dos PDFs pendentes: progresso e resultado por item na página,
+    gravação no catálogo a cada WRITE_BATCH_SIZE itens processados com sucesso.
+    Retorna o nº de referências gravadas.
+    """
+    titulos = dict(zip(df_biblio['id'].tolist(), df_biblio['titulo'].tolist()))
+    df_original = df_biblio
+    df_atual = df_biblio.copy()
+    for col in ('resumo', 'autor', 'tags'):
+        df_atual[col] = df_atual[col].astype(object) # Colunas vazias chegam como float (NaN)
+    barra = st.progress(0.0, text=f"0 de {len(itens)} processados")
+    tabela = st.empty()
+    linhas, lote = [], []
+    gravados = 0
+
+    def gravar():
+        nonlocal df_original, gravados
+        if not lote:
+            return
+        aplicar_resultados_lote(df_atual, lote)
+        if update_all_data(df_atual, df_original) is not None: # Uma escrita em bloco (só as células alteradas)
+            _indexar_textos_lote(df_atual, lote)
+            gravados += len(lote)
+            df_original = df_atual.copy() # Próximo lote compara só as novas alterações
+        lote.clear()
+
+    for i, r in enumerate(run_batch(itens, n_processos), 1):
+        linhas.append({
+            'ID': f"B-{r['id']}", 'Título Provisório': titulos.get(r['id'], ''),
+            'Resultado': "✅ Extraído" if r['ok'] else "❌ Falhou",
+            'Detalhe': r['mensagem'][:300], 'Tempo (s)': r['segundos'],
+        })
+        if r['ok']:
+            lote.append(r)
+        if len(lote) >= WRITE_BATCH_SIZE:
+            gravar()
+        barra.progress(i / len(itens), text=f"{i} de {len(itens)} processados")
+        tabela.dataframe(pd.DataFrame(linhas), hide_index=True, use_container_width=True)
+    gravar()
+    return gravados
+
+def _extracao_em_cache(sha256=None, file_id=None):
+    """Extração já feita do mesmo PDF (pelo conteúdo ou pelo ID do Drive), ou None."""
+    try:
+        return extraction_cache.get(sha256=sha256, file_id=file_id)
+    except Exception:
+        return None # O cache é só uma otimização: falhas viram uma extração normal
+
+def _guardar_extracao(sha_pdf, file_id, texto_inicial, sugestoes):
+    """Guarda no cache de extrações o texto completo (quando a extração em segundo plano terminar) e as sugestões."""
+    def guardar(texto):
+        if texto and not texto.startswith("Erro"):
+            try:
+                extraction_cache.put(sha_pdf, texto, sugestoes, file_id)
+            except Exception:
+                pass
+    futuro = st.session_state.get('extracao_restante')
+    if futuro is None:
+        guardar(texto_inicial)
+    else:
+        futuro.add_done_callback(lambda f: guardar(f.result())) # Roda na thread da extração
+
+# --- Funções de Escrita e CRUD (via Backend de Armazenamento) ---
+
+def _salvar_alteracoes(sheet_name, df_original, df_atualizado, schema):
+    """
+    Grava apenas as células alteradas em relação ao snapshot carregado (no Sheets, uma única chamada batch_update).
+    Se a estrutura mudou (ou não há snapshot), recai na reescrita completa da aba.
+    Retorna o número de células escritas.
+    """
+    n_cells = get_storage().update(sheet_name, df_original, df_atualizado, schema)
+    if n_cells:
+        invalidar_aba(sheet_name) # Invalida apenas o cache desta aba
+    return n_cells
 
-    # O Sheets usa indexação baseada em 1, e a linha 1 é o header.
-    # O Gspread usa row_index (2 para a primeira linha de dados).
+def update_all_data(df_atualizado, df_original=None):
+    """Salva na aba 'bibliografia' as alterações feitas no AgGrid. Retorna o nº de células escritas (None em caso de erro)."""
     try:
-        row_to_delete = df[df['id'] == id_livro].index.tolist()
-        if not row_to_delete: return
-        
-        sheet = connect_to_sheets().worksheet(SHEET_BIBLIOGRAFIA_NAME)
-        sheet.delete_rows(row_to_delete[0] + 2) # +2: 0-indexed para 1-indexed (linha de dados)
-        st.cache_data.clear()
+        return _salvar_alteracoes(SHEET_BIBLIOGRAFIA_NAME, df_original, df_atualizado, SCHEMA_BIBLIO)
+    except Exception as e:
+        st.error(f"Erro ao salvar dados (bibliografia): {e}")
+        return None
+
+def _delete_rows_by_id(sheet_name, ids, row_index):
+    """
+    Exclui várias linhas pelo ID (no Sheets, uma única chamada batch_update com intervalos contíguos agrupados).
+    Antes de excluir, o backend confere se a aba não mudou desde a carga.
+    Um ID repetido em várias linhas tem todas elas excluídas (avisado na tela).
+    Retorna o nº de linhas excluídas, ou None em caso de erro.
+    """
+    repetidos = duplicate_ids(row_index, ids)
+    if repetidos:
+        linhas, _ausentes = lookup_rows(row_index, ids)
+        st.warning(
+            f"ID(s) repetido(s) na planilha: {', '.join(sorted(map(str, repetidos)))}. "
+            f"Todas as {len(linhas)} linha(s) com os IDs selecionados serão excluídas."
+        )
+    try:
+        n_rows = get_storage().delete(sheet_name, ids, row_index)
+    except StaleDataError:
+        invalidar_aba(sheet_name)
+        st.error("A planilha foi alterada desde o último carregamento. Os dados foram recarregados; confirme a exclusão novamente.")
+        return None
+    if n_rows:
+        invalidar_aba(sheet_name) # Invalida apenas o cache desta aba
+    return n_rows
+
+def delete_references(ids_livros):
+    """Exclui várias referências pelos IDs."""
+    try:
+        n_rows = _delete_rows_by_id(SHEET_BIBLIOGRAFIA_NAME, ids_livros, carregar_indice_bibliografia())
     except Exception as e:
-        st.error(f"Erro ao excluir referência no Google Sheets: {e}")
+        st.error(f"Erro ao excluir referência: {e}")
+        return None
+    if n_rows:
+        content_store.delete_texts(ids_livros)
+    return n_rows
+
+def delete_reference(id_livro):
+    """Exclui uma referência pelo ID."""
+    return delete_references([id_livro])
+
+def _menor_id_livre(df):
+    """1 + maior ID da aba carregada: piso para o ID que o armazenamento aloca atomicamente."""
+    ids = pd.to_numeric(df['id'], errors='coerce').dropna() if 'id' in df.columns else pd.Series(dtype=float)
+    return int(ids.max()) + 1 if len(ids) else 1
 
 def append_new_reference(data):
-    """Adiciona uma nova linha (referência) à aba 'bibliografia'."""
-    spreadsheet = connect_to_sheets()
-    if not spreadsheet: return False
+    """
+    Adiciona uma nova linha (referência) à aba 'bibliografia'.
+    Retorna imediatamente o ID atribuído (ou False em caso de erro); no Sheets, o envio é feito em lote pela fila.
+    """
     try:
-        # Prepara os dados na ordem do SCHEMA
+        # Prepara os dados na ordem do SCHEMA, sem o ID (primeira coluna): o armazenamento
+        # aloca o ID e grava a linha na mesma transação (sessões simultâneas não colidem)
         new_row = [
             data.get('titulo'), data.get('autor'), data.get('tipo'), data.get('ano'), 
             data.get('tags'), data.get('caminho_arquivo'), data.get('resumo'), 
             data.get('localizacao_fisica'), datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         ]
         
-        worksheet = spreadsheet.worksheet(SHEET_BIBLIOGRAFIA_NAME)
-        worksheet.append_row(new_row, value_input_option='USER_ENTERED')
-        st.cache_data.clear()
-        return True
+        novo_id = get_storage().append_new(
+            SHEET_BIBLIOGRAFIA_NAME, new_row, min_id=_menor_id_livre(carregar_dados_bibliografia())
+        )
     except Exception as e:
         st.error(f"Erro ao adicionar nova referência: {e}")
         return False
 
+    try:
+        # Obras relacionadas: só o novo documento é vetorizado (com o texto extraído do PDF, se houver)
+        similares = get_similares()
+        similares.add_reference(novo_id, data.get('titulo'), data.get('resumo'), data.get('texto_extraido'))
+        similares.save()
+        if data.get('texto_extraido'):
+            content_store.store_text(novo_id, data['texto_extraido']) # Texto completo pesquisável
+    except Exception as e:
+        st.warning(f"Referência salva, mas o índice de obras relacionadas não foi atualizado: {e}")
+    return novo_id
+
 # --- Funções de CRUD para Datasets (Implementação similar) ---
 
-def update_all_data_datasets(df_atualizado):
-    """Sobrescreve TODA a aba 'dados_externos' com os dados atualizados."""
-    spreadsheet = connect_to_sheets()
-    if not spreadsheet: return False
+def update_all_data_datasets(df_atualizado, df_original=None):
+    """Salva na aba 'dados_externos' as alterações feitas no AgGrid. Retorna o nº de células escritas (None em caso de erro)."""
     try:
-        df_clean = _prepare_df_for_sheets(df_atualizado, SCHEMA_DATASET)
-        worksheet = spreadsheet.worksheet(SHEET_DATASETS_NAME)
-        worksheet.update([df_clean.columns.values.tolist()] + df_clean.values.tolist())
-        st.cache_data.clear()
-        return True
+        return _salvar_alteracoes(SHEET_DATASETS_NAME, df_original, df_atualizado, SCHEMA_DATASET)
     except Exception as e:
-        st.error(f"Erro ao salvar dados (datasets) no Google Sheets: {e}")
-        return False
+        st.error(f"Erro ao salvar dados (datasets): {e}")
+        return None
         
 def append_new_dataset(data):
-    """Adiciona uma nova linha (dataset) à aba 'dados_externos'."""
-    spreadsheet = connect_to_sheets()
-    if not spreadsheet: return False
+    """
+    Adiciona uma nova linha (dataset) à aba 'dados_externos'.
+    Retorna imediatamente o ID atribuído (ou False em caso de erro); no Sheets, o envio é feito em lote pela fila.
+    """
     try:
-        # Prepara os dados na ordem do SCHEMA
         new_row = [
             data.get('titulo'), data.get('descricao'), data.get('link_drive'), 
             datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         ]
         
-        worksheet = spreadsheet.worksheet(SHEET_DATASETS_NAME)
-        worksheet.append_row(new_row, value_input_option='USER_ENTERED')
-        st.cache_data.clear()
-        return True
+        novo_id = get_storage().append_new(
+            SHEET_DATASETS_NAME, new_row, min_id=_menor_id_livre(carregar_datasets_externos())
+        )
+        return novo_id
     except Exception as e:
         st.error(f"Erro ao adicionar novo dataset: {e}")
         return False
 
-def delete_dataset(id_dataset):
-    """Exclui um item da tabela dados_externos no Google Sheets."""
-    df = carregar_datasets_externos()
-    if df.empty: return
+def delete_datasets(ids_datasets):
+    """Exclui vários itens da tabela dados_externos pelos IDs."""
     try:
-        row_to_delete = df[df['id'] == id_dataset].index.tolist()
-        if not row_to_delete: return
-        
-        sheet = connect_to_sheets().worksheet(SHEET_DATASETS_NAME)
-        sheet.delete_rows(row_to_delete[0] + 2) 
-        st.cache_data.clear()
+        return _delete_rows_by_id(SHEET_DATASETS_NAME, ids_datasets, carregar_indice_datasets())
     except Exception as e:
-        st.error(f"Erro ao excluir dataset no Google Sheets: {e}")
+        st.error(f"Erro ao excluir dataset: {e}")
+        return None
+
+def delete_dataset(id_dataset):
+    """Exclui um item da tabela dados_externos."""
+    return delete_datasets([id_dataset])
+
+# --- Fila de Escrita do Sheets (Envio em Lote em Segundo Plano) ---
+
+def _apos_envio_da_fila(sheet_name, n_rows):
+    """Chamado pelo flusher após enviar linhas: invalida apenas a aba que recebeu as linhas."""
+    invalidar_aba(sheet_name)
+
+@st.cache_resource
+def iniciar_fila_de_escrita():
+    """Inicia (uma vez por servidor) o envio em segundo plano das linhas pendentes. Só usado com o backend Sheets."""
+    if get_storage().name != 'sheets':
+        return None
+    return start_flusher(connect_to_sheets, on_flush=_apos_envio_da_fila)
+
+def enviar_fila_agora():
+    """Envia imediatamente as linhas pendentes. Retorna {aba: nº de linhas enviadas}."""
+    spreadsheet = connect_to_sheets()
+    if not spreadsheet: return {}
+    enviados = flush_queue(spreadsheet)
+    for sheet_name, n_rows in enviados.items():
+        _apos_envio_da_fila(sheet_name, n_rows)
+    return enviados
 
 
 # --- FUNÇÃO DE LOGIN (Inalterada) ---
@@ -327,6 +859,38 @@ if check_password():
 else:
     pass 
 
+# --- STATUS DA FILA DE ESCRITA ---
+iniciar_fila_de_escrita()
+n_pendentes = get_storage().pending_count()
+if n_pendentes:
+    st.sidebar.info(f"⏳ {n_pendentes} novo(s) item(ns) aguardando envio ao Google Sheets.")
+    erro_fila = last_error()
+    if erro_fila:
+        st.sidebar.caption(f"Última falha no envio (será tentado novamente): {erro_fila}")
+    if st.session_state.get("logged_in") and st.sidebar.button("Enviar fila agora"):
+        enviados = enviar_fila_agora()
+        st.sidebar.success(f"{sum(enviados.values())} linha(s) enviada(s) ao Google Sheets.")
+
+# Linhas que falharam repetidamente (erro permanente) saem da fila para não bloquear as demais
+linhas_com_falha = failed_rows()
+if linhas_com_falha:
+    st.sidebar.warning(f"⚠️ {len(linhas_com_falha)} item(ns) não puderam ser enviados ao Google Sheets.")
+    if st.session_state.get("logged_in"):
+        with st.sidebar.expander("Itens com falha no envio"):
+            for falha in linhas_com_falha:
+                linha = falha['linha']
+                st.caption(
+                    f"Aba '{falha['aba']}', ID {linha[0] if linha else '?'}: {linha[1] if len(linha) > 1 else ''} "
+                    f"— {falha['tentativas']} tentativa(s). Erro: {falha['erro']}"
+                )
+            col_reenviar, col_descartar = st.columns(2)
+            if col_reenviar.button("Reenviar", key="fila_reenviar_falhas"):
+                requeue_failed([f['seq'] for f in linhas_com_falha])
+                st.rerun()
+            if col_descartar.button("Descartar", key="fila_descartar_falhas"):
+                discard_failed([f['seq'] for f in linhas_com_falha])
+                st.rerun()
+
 if 'menu_selection' in st.session_state:
     menu = st.session_state.pop('menu_selection')
 else:
@@ -359,10 +923,14 @@ if menu == "Sincronização Drive (Coleta)":
     # Combinando e filtrando por status 'Pendente' (Assumindo que você adiciona essa coluna manualmente no Sheets)
     # ATENÇÃO: Se suas abas do Sheets não tiverem a coluna 'Status', esta lógica falhará.
     
-    df_pendente_biblio = df_biblio[(df_biblio['resumo'].isna()) & (df_biblio['caminho_arquivo'].str.contains('http', na=False))]
+    # Células vazias chegam do Sheets (espelho local) como '' e não como NaN: as duas contam como ausentes
+    df_pendente_biblio = df_biblio[
+        _celula_vazia(df_biblio['resumo'])
+        & df_biblio['caminho_arquivo'].fillna('').astype(str).str.contains('http', regex=False)
+    ]
     # Aqui, a lógica é simplificada: Pendente = Tem link, mas não tem resumo (precisa de extração)
     
-    df_pendente_datasets = df_datasets[df_datasets['link_drive'].notna()]
+    df_pendente_datasets = df_datasets[~_celula_vazia(df_datasets['link_drive'])]
     # Para datasets, assumimos que eles são apenas cadastrados e não "processados"
     
     # Criando uma lista unificada para exibição
@@ -384,6 +952,18 @@ if menu == "Sincronização Drive (Coleta)":
     
     st.markdown("---")
     st.subheader(f"Arquivos Pendentes de Processamento ({len(df_pendente)} itens)")
+
+    # --- Processamento em Lote (todos os pendentes, em paralelo) ---
+    itens_lote = list(zip(df_pendente_biblio['id'].tolist(), df_pendente_biblio['caminho_arquivo'].tolist()))
+    with st.expander(f"⚙️ Processamento em Lote ({len(itens_lote)} PDFs)"):
+        st.caption(
+            "Baixa e extrai todos os PDFs pendentes em paralelo, preenche o resumo (e autor/tags, se vazios) "
+            f"com as sugestões e grava no catálogo a cada {WRITE_BATCH_SIZE} itens. Revise-os depois em Gestão de Referências."
+        )
+        n_processos = st.number_input("Processos em paralelo", min_value=1, max_value=32, value=INGEST_WORKERS, step=1, key="lote_processos")
+        if st.button("Processar Todos os Pendentes", key="processar_lote_btn", type="primary"):
+            gravados = processar_lote_pendentes(df_biblio, itens_lote, int(n_processos))
+            st.success(f"Lote concluído: {gravados} de {len(itens_lote)} referência(s) atualizada(s). Os itens gravados saem da lista na próxima atualização da página.")
     
     # --- Configuração AgGrid ---
     df_display = df_pendente[['Tipo', 'Título Provisório', 'Link para Processamento']]
@@ -581,31 +1161,66 @@ elif menu == "Cadastro Automatizado (PDF)":
 
     if process_button:
         st.session_state['extracted_text'] = None
+        st.session_state['extracao_restante'] = None
         st.session_state['suggested_data'] = {}
         st.session_state['logs'] = {} 
         raw_text = None
+        pdf_bytes = None
+        em_cache = None
+        sha_pdf = file_id = None
         
         with st.spinner("Processando o PDF e extraindo metadados..."):
             if uploaded_file is not None:
                 pdf_bytes = BytesIO(uploaded_file.read())
-                raw_text = process_pdf_bytes(pdf_bytes)
                 st.session_state['suggested_data']['caminho_arquivo'] = "Local Upload"
             
             elif link_drive_input:
-                raw_text = extract_text_from_drive_link(link_drive_input)
+                file_id = extract_file_id(link_drive_input)
+                em_cache = _extracao_em_cache(file_id=file_id) if file_id else None # Arquivo já visto: nem baixa
+                if em_cache is None:
+                    pdf_bytes, sha_pdf, raw_text = download_pdf_from_drive_link(link_drive_input)
                 st.session_state['suggested_data']['caminho_arquivo'] = link_drive_input
             
             else:
                 st.warning("Por favor, forneça um arquivo por upload ou um link do Google Drive.")
+
+            if pdf_bytes is not None:
+                sha_pdf = sha_pdf or extraction_cache.pdf_sha256(pdf_bytes) # Download já traz o hash
+                em_cache = _extracao_em_cache(sha256=sha_pdf) # Mesmo conteúdo (novo upload ou outro link)
+                if em_cache is not None and file_id:
+                    extraction_cache.link_file_id(file_id, sha_pdf)
+                if em_cache is not None:
+                    pdf_bytes.close() # Downloads grandes ficam num arquivo temporário em disco
+
+            if pdf_bytes is not None and em_cache is None:
+                # Só as primeiras páginas antes das sugestões; o restante segue em segundo plano
+                raw_text, extrair_restante = process_pdf_in_stages(pdf_bytes, METADATA_PAGES)
+                if extrair_restante is not None:
+                    futuro = get_executor_extracao().submit(extrair_restante)
+                    futuro.add_done_callback(lambda _futuro, arquivo=pdf_bytes: arquivo.close())
+                    st.session_state['extracao_restante'] = futuro
+                else:
+                    pdf_bytes.close()
+
+        if em_cache is not None:
+            st.session_state['extracted_text'] = em_cache['texto']
+            st.session_state['suggested_data'].update(em_cache['sugestoes'])
+            st.session_state['logs'] = {'status_geral': "Sucesso: PDF já processado antes; texto e sugestões recuperados do cache de extrações."}
+            st.rerun()
         
         if raw_text and not raw_text.startswith("Erro"):
             st.session_state['extracted_text'] = raw_text
             
             if len(raw_text) > 100: 
                 try:
-                    suggested_data, logs = suggest_metadata(raw_text) 
+                    suggested_data = suggest_metadata(raw_text) 
                     st.session_state['suggested_data'].update(suggested_data)
-                    st.session_state['logs'] = logs 
+                    st.session_state['logs'] = {
+                        'status_geral': f"Sucesso: metadados sugeridos a partir das primeiras {METADATA_PAGES} páginas."
+                        + (" O restante do documento está sendo extraído em segundo plano." if st.session_state['extracao_restante'] else "")
+                    }
+                    if sha_pdf:
+                        _guardar_extracao(sha_pdf, file_id, raw_text, suggested_data)
                     st.success("Extração de texto e sugestões de metadados concluídas! Revise ao lado.")
                 except Exception as e:
                     st.error(f"Erro na sugestão automática de metadados. Revise manualmente. Erro: {e}")
@@ -675,20 +1290,25 @@ elif menu == "Cadastro Automatizado (PDF)":
                 
                 st.caption(f"Caminho do Arquivo: {caminho if caminho != 'Local Upload' else 'Arquivo carregado localmente'}")
 
+                ignorar_duplicata_s = st.checkbox("Salvar mesmo assim (ignorar aviso de duplicata)", key="ignorar_duplicata_pdf")
                 salvar_sugestao = st.form_submit_button("Salvar Referência Automatizada", type="primary")
 
                 if salvar_sugestao:
                     data = {
                         'titulo': titulo_s, 'autor': autor_s, 'tipo': tipo_s, 'ano': ano_s,
                         'tags': tags_s, 'caminho_arquivo': caminho if caminho != 'Local Upload' else '', 
-                        'resumo': resumo_s, 'localizacao_fisica': localizacao_s
+                        'resumo': resumo_s, 'localizacao_fisica': localizacao_s,
+                        'texto_extraido': texto_extraido_completo(esperar=True) # Obras relacionadas e busca no texto completo
                     }
-                    if append_new_reference(data): # NOVO: Usando a função Sheets
-                        st.success(f"Referência '{titulo_s}' salva com sucesso no Google Sheets!")
+                    duplicatas = [] if ignorar_duplicata_s else possiveis_duplicatas(data)
+                    if duplicatas:
+                        _avisar_duplicatas(duplicatas)
+                    elif append_new_reference(data): # Entra na fila de envio ao Sheets
+                        st.success(f"Referência '{titulo_s}' salva! Ela será enviada ao Google Sheets em segundo plano.")
                         st.session_state['extracted_text'] = None
+                        st.session_state['extracao_restante'] = None
                         st.session_state['suggested_data'] = {}
                         st.session_state['logs'] = {}
-                        st.cache_data.clear()
                         st.rerun()
                     else:
                         st.error("Falha ao salvar no Google Sheets.")
@@ -709,7 +1329,10 @@ elif menu == "Cadastro Automatizado (PDF)":
                  st.info("Nenhum link de Drive disponível para prévia.")
 
         with st.expander("Ver Texto Completo Extraído (Para Revisão da IA)"):
-            st.code(st.session_state['extracted_text'])
+            texto_revisao = texto_extraido_completo()
+            if st.session_state['extracao_restante'] is not None:
+                st.caption(f"Exibindo as primeiras {METADATA_PAGES} páginas; o restante do documento ainda está sendo extraído.")
+            st.code(texto_revisao)
     
     st.markdown('</div>', unsafe_allow_html=True) 
 
@@ -730,11 +1353,14 @@ elif menu == "Biblioteca Principal":
     
     st.markdown("---") 
 
-    df_biblio = carregar_dados_bibliografia()
-    df_datasets = carregar_datasets_externos()
+    # Versões lidas uma vez: catálogo, índices, facetas e chave da busca ficam todos nelas
+    versoes = versoes_catalogo()
+    df_biblio = carregar_catalogo_bibliografia(versoes[0])
+    df_datasets = carregar_catalogo_datasets(versoes[1])
 
     st.markdown('<div class="search-container">', unsafe_allow_html=True)
     filtro_geral = st.text_input("Pesquisa por Título, Autor, Tag ou Localização:", key="search_geral", label_visibility="visible")
+    busca_texto_completo = st.checkbox("Buscar também dentro do texto completo dos documentos (PDFs)", key="busca_texto_completo")
     st.markdown('</div>', unsafe_allow_html=True)
     
     busca_placeholder = st.empty()
@@ -742,78 +1368,93 @@ elif menu == "Biblioteca Principal":
     with busca_placeholder.container():
         st.markdown('<div class="content-box">', unsafe_allow_html=True)
         
-        todas_tags = set()
-        for tags_str in df_biblio['tags'].dropna():
-            tags_limpas = [tag.strip() for tag in tags_str.split(',') if tag.strip()]
-            todas_tags.update(tags_limpas)
+        facetas = carregar_facetas_bibliografia(versoes[0])
+        ajustar_faixa_de_anos(facetas)
         
-        temas_opcoes = sorted(list(todas_tags))
-        temas_opcoes.insert(0, "TODOS OS TEMAS")
+        # Contagens das facetas dentro do resultado da busca textual, com as seleções atuais
+        # (lidas antes dos widgets) aplicadas às demais facetas.
+        resultado_texto = buscar_com_cache(versoes, filtro_geral, texto_completo=busca_texto_completo)
+        mask_texto = np.zeros(len(df_biblio), dtype=bool)
+        mask_texto[resultado_texto.biblio] = True
+        contagens = facetas.counts(
+            mask_texto,
+            tipos=st.session_state.get('faceta_tipos', []),
+            anos=faixa_de_anos(facetas, st.session_state.get('faceta_anos')),
+            tags=st.session_state.get('select_tema_principal', []),
+            match_all=st.session_state.get('modo_tema_principal', "Todos (E)") == "Todos (E)",
+        )
         
-        col_tema, col_vazia = st.columns([1, 3])
+        col_tema, col_modo = st.columns([3, 1])
         with col_tema:
-            tema_selecionado = st.selectbox("Filtrar Referências por Tema Principal:", temas_opcoes, key="select_tema_principal")
-            
-        df_biblio_filtrada = df_biblio.copy()
-        deve_exibir_resultados = False
-        
-        if tema_selecionado != "TODOS OS TEMAS":
-            df_biblio_filtrada = df_biblio_filtrada[
-                df_biblio_filtrada['tags'].fillna('').apply(lambda x: tema_selecionado in [t.strip() for t in x.split(',')])
-            ].copy()
-            deve_exibir_resultados = True
-        
-        df_datasets_filtrados = df_datasets.copy()
+            temas_selecionados = st.multiselect(
+                "Filtrar Referências por Tema Principal:", facetas.tags, key="select_tema_principal",
+                format_func=lambda tag: f"{tag} ({contagens['tags'].get(tag, 0)})", placeholder="TODOS OS TEMAS"
+            )
+        with col_modo:
+            modo_temas = st.radio("Combinar temas:", ["Todos (E)", "Qualquer (OU)"], key="modo_tema_principal", horizontal=True)
+        tema_selecionado = ", ".join(temas_selecionados) if temas_selecionados else "TODOS OS TEMAS"
         
-        if filtro_geral:
-            deve_exibir_resultados = True
+        col_tipo, col_ano = st.columns([1, 2])
+        with col_tipo:
+            tipos_selecionados = st.multiselect(
+                "Tipo:", facetas.tipos, key="faceta_tipos",
+                format_func=lambda tipo: f"{tipo} ({contagens['tipo'].get(tipo, 0)})", placeholder="TODOS OS TIPOS"
+            )
+        with col_ano:
+            anos_selecionados = None
+            if facetas.ano_min is not None and facetas.ano_min < facetas.ano_max:
+                faixa = st.slider("Ano:", facetas.ano_min, facetas.ano_max, key="faceta_anos") # Valor semeado em ajustar_faixa_de_anos
+                anos_selecionados = faixa_de_anos(facetas, faixa)
+                st.caption(f"{contagens['ano']} referência(s) no intervalo")
             
-            if not df_biblio_filtrada.empty:
-                df_biblio_filtrada = df_biblio_filtrada[
-                    df_biblio_filtrada['titulo'].str.contains(filtro_geral, case=False, na=False) | 
-                    df_biblio_filtrada['autor'].str.contains(filtro_geral, case=False, na=False) |
-                    df_biblio_filtrada['tags'].str.contains(filtro_geral, case=False, na=False) |
-                    df_biblio_filtrada['localizacao_fisica'].str.contains(filtro_geral, case=False, na=False) 
-                ].copy()
-                
-            if not df_datasets_filtrados.empty:
-                df_datasets_filtrados = df_datasets_filtrados[
-                    df_datasets_filtrados['titulo'].str.contains(filtro_geral, case=False, na=False) |
-                    df_datasets_filtrados['descricao'].str.contains(filtro_geral, case=False, na=False)
-                ].copy()
-                
+        deve_exibir_resultados = bool(filtro_geral) or bool(temas_selecionados) or bool(tipos_selecionados) or anos_selecionados is not None
         
-        df_unificado = pd.DataFrame()
-
-        if not df_biblio_filtrada.empty:
-            df_biblio_formatado = df_biblio_filtrada[['id', 'titulo', 'autor', 'ano', 'tipo', 'localizacao_fisica']].copy()
-            df_biblio_formatado['ID_Recurso'] = 'B-' + df_biblio_formatado['id'].astype(str)
-            df_biblio_formatado['Tipo de Recurso'] = df_biblio_formatado['tipo'].apply(lambda x: f"Referência ({x})")
-            df_biblio_formatado = df_biblio_formatado.rename(columns={'autor': 'Autor/Fonte', 'ano': 'Ano/Data', 'localizacao_fisica': 'Localização'})
-            df_biblio_formatado = df_biblio_formatado[['ID_Recurso', 'Tipo de Recurso', 'titulo', 'Autor/Fonte', 'Ano/Data', 'Localização']]
-            df_unificado = pd.concat([df_unificado, df_biblio_formatado])
-
-        if not df_datasets_filtrados.empty:
-            df_datasets_formatado = df_datasets_filtrados[['id', 'titulo', 'descricao', 'data_cadastro']].copy()
-            df_datasets_formatado['ID_Recurso'] = 'D-' + df_datasets_filtrados['id'].astype(str)
-            df_datasets_formatado['Tipo de Recurso'] = 'Dataset/Dado'
-            df_datasets_formatado['Localização'] = 'Drive/Online'
-            df_datasets_formatado['Ano/Data'] = df_datasets_formatado['data_cadastro'].str[:10]
-            df_datasets_formatado = df_datasets_formatado.rename(columns={'descricao': 'Autor/Fonte'})
-            df_datasets_formatado = df_datasets_formatado[['ID_Recurso', 'Tipo de Recurso', 'titulo', 'Autor/Fonte', 'Ano/Data', 'Localização']]
-            df_unificado = pd.concat([df_unificado, df_datasets_formatado])
-            
+        # O conjunto de resultados fica na sessão: trocar de página não refaz a busca
+        chave_busca = (
+            filtro_geral, busca_texto_completo, tuple(temas_selecionados), modo_temas, tuple(tipos_selecionados), anos_selecionados,
+            versoes
+        )
+        if st.session_state.get('busca_chave') != chave_busca:
+            st.session_state['busca_chave'] = chave_busca
+            st.session_state['busca_resultado'] = buscar_com_cache(
+                versoes, filtro_geral, temas_selecionados, modo_temas == "Todos (E)",
+                tipos_selecionados, anos_selecionados, busca_texto_completo
+            )
+            st.session_state['busca_pagina'] = 0
+        resultado = st.session_state['busca_resultado']
+        
+        if resultado.notice:
+            st.info(resultado.notice)
         
-        if deve_exibir_resultados and not df_unificado.empty:
+        if deve_exibir_resultados and resultado.total:
             
             if not st.session_state['layout_buscado']:
                 st.session_state['layout_buscado'] = True
                 st.rerun() 
 
-            st.subheader(f"Resultados da Busca Unificada ({len(df_unificado)} itens):")
+            st.subheader(f"Resultados da Busca Unificada ({resultado.total} itens):")
             st.info("Clique em uma linha na tabela abaixo para ver os detalhes e a pré-visualização.")
             
-            df_aggrid = df_unificado[['Tipo de Recurso', 'titulo', 'Autor/Fonte', 'Ano/Data', 'Localização', 'ID_Recurso']].reset_index(drop=True)
+            # Paginação no servidor: só a página visível é montada e enviada ao AgGrid
+            col_tamanho, col_anterior, col_pagina, col_proxima = st.columns([1, 1, 2, 1])
+            with col_tamanho:
+                tamanho_pagina = st.selectbox("Itens por página:", TAMANHOS_PAGINA, key="busca_tamanho_pagina")
+            n_paginas = resultado.n_pages(tamanho_pagina)
+            st.session_state['busca_pagina'] = min(st.session_state['busca_pagina'], n_paginas - 1)
+            with col_anterior:
+                if st.button("◀ Anterior", disabled=st.session_state['busca_pagina'] == 0, key="busca_pagina_anterior"):
+                    st.session_state['busca_pagina'] -= 1
+                    st.rerun()
+            with col_proxima:
+                if st.button("Próxima ▶", disabled=st.session_state['busca_pagina'] >= n_paginas - 1, key="busca_pagina_proxima"):
+                    st.session_state['busca_pagina'] += 1
+                    st.rerun()
+            with col_pagina:
+                st.markdown(f"Página **{st.session_state['busca_pagina'] + 1}** de **{n_paginas}**")
+            
+            df_aggrid = formatar_pagina_resultados(
+                df_biblio, df_datasets, *resultado.page(st.session_state['busca_pagina'], tamanho_pagina)
+            )
 
             gb = GridOptionsBuilder.from_dataframe(df_aggrid)
             gb.configure_column("ID_Recurso", hide=True)
@@ -838,8 +1479,8 @@ elif menu == "Biblioteca Principal":
             if selected_rows_df is not None and not selected_rows_df.empty: 
                 id_selecionado = selected_rows_df.iloc[0]['ID_Recurso']
             
-            elif not df_unificado.empty:
-                 id_selecionado = df_unificado['ID_Recurso'].iloc[0]
+            elif not df_aggrid.empty:
+                 id_selecionado = df_aggrid['ID_Recurso'].iloc[0] # Melhor resultado da página
 
             st.markdown('</div>', unsafe_allow_html=True) 
 
@@ -850,7 +1491,7 @@ elif menu == "Biblioteca Principal":
                 original_id = id_selecionado.split('-')[1] # Não precisamos converter para int se estamos buscando por ID no DataFrame
 
                 if recurso_tipo == 'B': # REFERÊNCIA BIBLIOGRÁFICA (PDF/DOCUMENTO)
-                    infos = df_biblio[df_biblio['id'] == int(original_id)].iloc[0]
+                    infos = get_by_id(df_biblio, int(original_id))
                     caminho = infos.get('caminho_arquivo', '')
                     resumo = infos.get('resumo', 'Nenhum resumo cadastrado.')
                     localizacao = infos.get('localizacao_fisica', 'Não cadastrada.')
@@ -866,6 +1507,22 @@ elif menu == "Biblioteca Principal":
                     with st.expander("Ver Resumo / Prévia Textual"):
                         st.write(resumo)
 
+                    trechos = content_store.snippets(int(original_id), filtro_geral) if filtro_geral else []
+                    if trechos:
+                        with st.expander("Trechos Encontrados no Documento", expanded=True):
+                            for trecho in trechos:
+                                st.markdown(f"> {trecho}")
+
+                    relacionadas = [
+                        (rel_id, score) for rel_id, score in carregar_similares().related(int(original_id), k=5)
+                        if (df_biblio['id'] == rel_id).any() # Ignora IDs ainda na fila de envio
+                    ]
+                    if relacionadas:
+                        with st.expander("Obras Relacionadas", expanded=True):
+                            for rel_id, score in relacionadas:
+                                rel = get_by_id(df_biblio, rel_id)
+                                st.markdown(f"- **{rel['titulo']}** — {rel['autor']} ({rel['ano'] if pd.notna(rel['ano']) else 's/d'}) · similaridade {score:.0%}")
+
                     if caminho and str(caminho).startswith("http"):
                         st.link_button("Abrir no Google Drive em Nova Aba", caminho, type="primary")
 
@@ -885,7 +1542,7 @@ elif menu == "Biblioteca Principal":
                     st.markdown('</div>', unsafe_allow_html=True)
                     
                 elif recurso_tipo == 'D': # DATASET EXTERNO (DADOS)
-                    infos = df_datasets[df_datasets['id'] == int(original_id)].iloc[0]
+                    infos = get_by_id(df_datasets, int(original_id))
                     link_drive = infos['link_drive']
                     file_id = extract_file_id(link_drive)
                     
@@ -923,7 +1580,7 @@ elif menu == "Biblioteca Principal":
                     st.markdown('</div>', unsafe_allow_html=True)
 
         
-        elif deve_exibir_resultados and df_unificado.empty:
+        elif deve_exibir_resultados and not resultado.total:
             if not st.session_state['layout_buscado']:
                 st.session_state['layout_buscado'] = True
                 st.rerun() 
@@ -985,13 +1642,35 @@ elif menu == "Gestão de Referências":
         
         # BOTÃO SALVAR
         if st.button("Salvar TODAS as Alterações no Google Sheets", type="primary"):
-            if update_all_data(df_atualizado): # NOVO: Usa Sheets Update
-                st.success("Todos os dados foram salvos na aba 'bibliografia' do Google Sheets!")
-            else:
+            n_cells = update_all_data(df_atualizado, df_original=df_links) # Envia apenas as células alteradas
+            if n_cells is None:
                 st.error("Falha ao salvar. Verifique o console e as credenciais.")
+            elif n_cells == 0:
+                st.info("Nenhuma alteração detectada. Nada foi enviado ao Google Sheets.")
+            else:
+                st.success(f"Alterações salvas na aba 'bibliografia' do Google Sheets! ({n_cells} células escritas)")
                 
         st.write("---")
         
+        with st.expander("Relatório de Possíveis Duplicatas"):
+            st.caption("Pares de referências com título, autor e resumo muito parecidos (MinHash/LSH, sem comparar todos os pares).")
+            if st.button("Gerar relatório", key="gerar_relatorio_duplicatas"):
+                df_catalogo = carregar_catalogo_bibliografia()
+                pares = carregar_duplicatas_bibliografia().report()
+                if pares:
+                    st.dataframe(pd.DataFrame([
+                        {
+                            'id_a': a, 'titulo_a': get_by_id(df_catalogo, a)['titulo'],
+                            'id_b': b, 'titulo_b': get_by_id(df_catalogo, b)['titulo'],
+                            'similaridade': f"{sim:.0%}",
+                        }
+                        for a, b, sim in pares
+                    ]), hide_index=True, use_container_width=True)
+                else:
+                    st.success("Nenhuma duplicata provável encontrada.")
+        
+        st.write("---")
+        
         # Funcionalidade de Excluir
         st.subheader("Excluir Referência Permanentemente")
         
@@ -1000,23 +1679,24 @@ elif menu == "Gestão de Referências":
         
         with col_del1:
             if opcoes_delete:
-                id_delete = st.selectbox(
-                    "Selecione o item para EXCLUIR:", 
-                    options=opcoes_delete.keys(), 
+                ids_delete = st.multiselect(
+                    "Selecione os itens para EXCLUIR:", 
+                    options=list(opcoes_delete.keys()), 
                     format_func=lambda x: opcoes_delete[x] if x in opcoes_delete else x,
                     key="select_delete_biblio"
                 )
             else:
-                id_delete = None
+                ids_delete = []
                 st.info("Nenhuma referência para excluir.")
 
 
         with col_del2:
             st.write(" ")
-            if id_delete and st.button("EXCLUIR SELECIONADO", type="primary"): 
-                delete_reference(id_delete) # NOVO: Usa Sheets Delete
-                st.success(f"Item ID {id_delete} excluído com sucesso do Google Sheets!")
-                st.rerun() 
+            if ids_delete and st.button("EXCLUIR SELECIONADOS", type="primary"): 
+                n_rows = delete_references(ids_delete) # Exclusão em lote (uma chamada batch_update)
+                if n_rows is not None:
+                    st.success(f"{n_rows} item(ns) excluído(s) com sucesso do Google Sheets!")
+                    st.rerun() 
 
     else:
         st.info("Nenhum dado para gerenciar.")
@@ -1065,10 +1745,13 @@ elif menu == "Gestão de Dados Externos":
         
         # BOTÃO SALVAR
         if st.button("Salvar TODAS as Alterações dos Datasets no Google Sheets", type="primary"):
-            if update_all_data_datasets(df_atualizado_datasets):
-                st.success("Todos os dados externos foram salvos na aba 'dados_externos' do Google Sheets!")
-            else:
+            n_cells = update_all_data_datasets(df_atualizado_datasets, df_original=df_datasets)
+            if n_cells is None:
                 st.error("Falha ao salvar. Verifique o console e as credenciais.")
+            elif n_cells == 0:
+                st.info("Nenhuma alteração detectada. Nada foi enviado ao Google Sheets.")
+            else:
+                st.success(f"Alterações salvas na aba 'dados_externos' do Google Sheets! ({n_cells} células escritas)")
                 
         st.write("---")
         
@@ -1080,22 +1763,23 @@ elif menu == "Gestão de Dados Externos":
         
         with col_del1:
             if opcoes_delete_data:
-                id_delete_data = st.selectbox(
-                    "Selecione o Dataset para EXCLUIR:", 
-                    options=opcoes_delete_data.keys(), 
+                ids_delete_data = st.multiselect(
+                    "Selecione os Datasets para EXCLUIR:", 
+                    options=list(opcoes_delete_data.keys()), 
                     format_func=lambda x: opcoes_delete_data[x] if x in opcoes_delete_data else x,
                     key="select_delete_dataset"
                 )
             else:
-                id_delete_data = None
+                ids_delete_data = []
                 st.info("Nenhum dataset para excluir.")
 
         with col_del2:
             st.write(" ")
-            if id_delete_data and st.button("EXCLUIR DATASET SELECIONADO", type="primary"): 
-                delete_dataset(id_delete_data) # NOVO: Usa Sheets Delete
-                st.success(f"Dataset ID {id_delete_data} excluído com sucesso do Google Sheets!")
-                st.rerun() 
+            if ids_delete_data and st.button("EXCLUIR DATASETS SELECIONADOS", type="primary"): 
+                n_rows = delete_datasets(ids_delete_data) # Exclusão em lote (uma chamada batch_update)
+                if n_rows is not None:
+                    st.success(f"{n_rows} dataset(s) excluído(s) com sucesso do Google Sheets!")
+                    st.rerun() 
 
     else:
         st.info("Nenhum dataset para gerenciar.")
@@ -1130,6 +1814,7 @@ elif menu == "Cadastro Manual":
         
         resumo = st.text_area("Resumo / Prévia")
         
+        ignorar_duplicata = st.checkbox("Salvar mesmo assim (ignorar aviso de duplicata)", key="ignorar_duplicata_manual")
         enviado = st.form_submit_button("Salvar Referência", type="primary")
 
         if enviado:
@@ -1139,8 +1824,11 @@ elif menu == "Cadastro Manual":
                     'tags': tags, 'caminho_arquivo': link_drive, 'resumo': resumo, 
                     'localizacao_fisica': localizacao_fisica
                 }
-                if append_new_reference(data):
-                    st.success(f"Referência '{titulo}' salva com sucesso no Google Sheets!")
+                duplicatas = [] if ignorar_duplicata else possiveis_duplicatas(data)
+                if duplicatas:
+                    _avisar_duplicatas(duplicatas)
+                elif append_new_reference(data):
+                    st.success(f"Referência '{titulo}' salva! Ela será enviada ao Google Sheets em segundo plano.")
                 else:
                     st.error("Falha ao salvar no Google Sheets.")
             else:
@@ -1176,7 +1864,7 @@ elif menu == "Cadastro de Dados Externos":
                     'titulo': titulo, 'descricao': descricao, 'link_drive': link_drive
                 }
                 if append_new_dataset(data):
-                    st.success(f"Dataset '{titulo}' cadastrado com sucesso no Google Sheets!")
+                    st.success(f"Dataset '{titulo}' cadastrado! Ele será enviado ao Google Sheets em segundo plano.")
                 else:
                     st.error("Falha ao salvar no Google Sheets.")
             else:
@@ -1193,7 +1881,7 @@ elif menu == "Dashboard":
         
     st.title("Estatísticas da Biblioteca")
     
-    df_biblio = carregar_dados_bibliografia()
+    df_biblio = carregar_catalogo_bibliografia()
     
     if not df_biblio.empty:
         st.markdown('<div class="content-box">', unsafe_allow_html=True)
@@ -1202,7 +1890,7 @@ elif menu == "Dashboard":
         
         with col1:
             st.subheader("Por Tipo (Bibliografia)")
-            dados_tipo = df_biblio.groupby('tipo').size().reset_index(name='qtd')
+            dados_tipo = df_biblio.groupby('tipo', observed=True).size().reset_index(name='qtd')
             if not dados_tipo.empty:
                 fig, ax = plt.subplots()
                 ax.pie(dados_tipo['qtd'], labels=dados_tipo['tipo'], autopct='%1.1f%%', startangle=90)
@@ -1212,9 +1900,8 @@ elif menu == "Dashboard":
 
         with col2:
             st.subheader("Publicações por Ano (Últimos 15)")
-            df_clean_year = df_biblio[pd.to_numeric(df_biblio['ano'], errors='coerce').notna()]
-            df_clean_year['ano'] = df_clean_year['ano'].astype(int)
-            dados_ano = df_clean_year[df_clean_year['ano'] > 1900].groupby('ano').size().reset_index(name='qtd').sort_values('ano', ascending=False).head(15).sort_values('ano', ascending=True)
+            # 'ano' já é inteiro (anulável) no modelo do catálogo
+            dados_ano = df_biblio[(df_biblio['ano'] > 1900).fillna(False)].groupby('ano').size().reset_index(name='qtd').sort_values('ano', ascending=False).head(15).sort_values('ano', ascending=True)
             
             if not dados_ano.empty:
                 st.bar_chart(dados_ano.set_index('ano')) 
@@ -1225,6 +1912,39 @@ elif menu == "Dashboard":
     else:
         st.error("Nenhum dado encontrado na Planilha Mestra (aba 'bibliografia').")
 
+    if get_storage().name == 'sheets':
+        spreadsheet = connect_to_sheets()
+        metricas_api = spreadsheet.metrics.snapshot() if spreadsheet else []
+        st.markdown('<div class="content-box">', unsafe_allow_html=True)
+        st.subheader("Uso da API do Google Sheets (desde o início do servidor)")
+        if metricas_api:
+            st.dataframe(pd.DataFrame(metricas_api).round(1), hide_index=True, use_container_width=True)
+        else:
+            st.write("Nenhuma chamada registrada.")
+        st.markdown('</div>', unsafe_allow_html=True)
+
+    cache_buscas = get_cache_buscas().stats()
+    st.markdown('<div class="content-box">', unsafe_allow_html=True)
+    st.subheader("Cache de Buscas (desde o início do servidor)")
+    col_entradas, col_acertos, col_faltas, col_taxa = st.columns(4)
+    col_entradas.metric("Entradas", cache_buscas['entradas'])
+    col_acertos.metric("Acertos", cache_buscas['acertos'])
+    col_faltas.metric("Faltas", cache_buscas['faltas'])
+    col_taxa.metric("Taxa de acerto", f"{cache_buscas['taxa_acerto']:.0%}")
+
+    try:
+        cache_extracoes = extraction_cache.stats()
+        st.subheader("Cache de Extrações de PDF")
+        col_pdfs, col_uso = st.columns(2)
+        col_pdfs.metric("PDFs em cache", cache_extracoes['entradas'])
+        col_uso.metric(
+            "Espaço usado",
+            f"{cache_extracoes['bytes'] / 1024 ** 2:.1f} MB de {cache_extracoes['limite_bytes'] / 1024 ** 2:.0f} MB"
+        )
+    except Exception as e:
+        st.caption(f"Cache de extrações indisponível: {e}")
+    st.markdown('</div>', unsafe_allow_html=True)
+
 
 # --- CRÉDITOS NO RODAPÉ ---
 st.markdown(
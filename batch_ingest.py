@@ -0,0 +1,83 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import extraction_cache
+from pdf_processor import download_pdf_from_drive_link, process_pdf_bytes, suggest_metadata, extract_file_id
+
+# --- Ingestão em Lote dos PDFs Pendentes (Sincronização Drive) ---
+# Cada item (referência com link do Drive e sem resumo) é baixado, extraído e
+# recebe sugestões de metadados num processo separado: o pdfminer é CPU-bound,
+# então só processos (e não threads) usam vários núcleos. Os resultados voltam
+# na ordem em que terminam, para a página mostrar o progresso e gravar em lotes.
+
+INGEST_WORKERS = int(os.environ.get('BIBLIOTECA_INGEST_WORKERS', 0)) or max(1, os.cpu_count() or 1)
+WRITE_BATCH_SIZE = 10 # Resultados acumulados antes de cada gravação no catálogo
+MIN_TEXT_CHARS = 100 # Abaixo disso o texto é insignificante para sugerir metadados
+
+
+def process_drive_item(item_id, drive_link):
+    """
+    Download + extração + sugestões de um item (roda num processo do lote).
+    PDFs já extraídos antes (mesmo ID do Drive ou mesmo conteúdo) vêm do cache de extrações.
+    Retorna um dict simples (serializável): id, ok, mensagem, texto, sugestoes, segundos.
+    """
+    inicio = time.perf_counter()
+    resultado = {'id': item_id, 'ok': False, 'mensagem': '', 'texto': '', 'sugestoes': {}}
+    try:
+        file_id = extract_file_id(drive_link)
+        em_cache = extraction_cache.get(file_id=file_id) if file_id else None
+        if em_cache is None:
+            pdf_file, sha_pdf, erro = download_pdf_from_drive_link(drive_link) # SHA-256 calculado no download
+            if erro:
+                resultado['mensagem'] = erro
+                return resultado
+            with pdf_file: # Fechado em qualquer caminho: acima de 8 MB é um arquivo temporário em disco
+                em_cache = extraction_cache.get(sha256=sha_pdf)
+                if em_cache is None:
+                    texto = process_pdf_bytes(pdf_file)
+            if em_cache is not None and file_id:
+                extraction_cache.link_file_id(file_id, sha_pdf)
+
+        if em_cache is not None:
+            resultado.update(ok=True, texto=em_cache['texto'], sugestoes=em_cache['sugestoes'], mensagem="Sucesso (cache)")
+            return resultado
+
+        if texto.startswith("Erro"):
+            resultado['mensagem'] = texto
+        elif len(texto) <= MIN_TEXT_CHARS:
+            resultado['mensagem'] = "Texto extraído insignificante para processamento."
+        else:
+            resultado.update(ok=True, texto=texto, sugestoes=suggest_metadata(texto), mensagem="Sucesso")
+            try:
+                extraction_cache.put(sha_pdf, texto, resultado['sugestoes'], file_id)
+            except Exception:
+                pass # Sem cache, o item continua processado
+    except Exception as e: # Exceções de bibliotecas nem sempre são serializáveis: vira mensagem
+        resultado['mensagem'] = f"Erro inesperado: {e}"
+    finally:
+        resultado['segundos'] = round(time.perf_counter() - inicio, 2)
+    return resultado
+
+
+def run_batch(items, workers=INGEST_WORKERS):
+    """
+    Processa os itens [(id, link), ...] num pool de processos e gera os resultados
+    à medida que terminam. Interromper a iteração cancela os itens ainda não iniciados.
+    """
+    if not items:
+        return
+    # 'spawn': os processos não herdam as threads do servidor Streamlit (fila de escrita, sessões)
+    contexto = multiprocessing.get_context('spawn')
+    executor = ProcessPoolExecutor(max_workers=min(workers, len(items)), mp_context=contexto)
+    try:
+        futuros = {executor.submit(process_drive_item, item_id, link): item_id for item_id, link in items}
+        for futuro in as_completed(futuros):
+            try:
+                yield futuro.result()
+            except Exception as e: # Processo do pool encerrado abruptamente (ex.: falta de memória)
+                yield {'id': futuros[futuro], 'ok': False, 'mensagem': f"Falha no processo de extração: {e}",
+                       'texto': '', 'sugestoes': {}, 'segundos': 0.0}
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,375 @@
+"""
+Benchmark da busca da Biblioteca Principal com catálogos sintéticos.
+
+Gera catálogos no formato de SCHEMA_BIBLIO/SCHEMA_DATASET (títulos, autores,
+resumos e tags em português/espanhol), grava-os numa base SQLite temporária e
+mede as etapas da página de consulta: carga + normalização, construção dos
+índices, opções do filtro de temas, filtro de temas, filtro textual e a busca
+unificada completa (texto + facetas + primeira página). O relatório em JSON
+permite acompanhar regressões entre versões.
+
+Com --pdfs, mede também a limpeza do texto extraído (normalizador de passada
+única × implementação original por regex) sobre PDFs de amostra, conferindo
+que as duas saídas são idênticas.
+
+Uso:
+    python benchmark.py                           # 1k, 10k, 100k e 1M linhas
+    python benchmark.py --sizes 1000 10000 --repeat 7 --output bench.json
+    python benchmark.py --sizes --pdfs amostras/*.pdf   # só a limpeza de texto
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import textwrap
+import time
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from catalog_model import fold_text, normalize_catalog, normalize_datasets, SCHEMA_BIBLIO, SCHEMA_DATASET, SEARCH_COLUMNS_BIBLIO, SEARCH_COLUMNS_DATASET
+from search_index import build_text_index, build_tag_index, build_trigram_index, build_facet_index, ResultSet
+from ranking import build_bm25_index, FIELD_WEIGHTS_BIBLIO, FIELD_WEIGHTS_DATASET
+from storage import SQLiteBackend
+from pdf_processor import iter_pdf_pages, TextNormalizer, _clean_extracted_text_regex
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_REPEAT = 5
+DATASETS_RATIO = 0.1 # Datasets por referência no catálogo sintético
+PAGE_SIZE = 25
+SEED = 20240601
+
+SHEET_BIBLIO = 'bibliografia'
+SHEET_DATASETS = 'dados_externos'
+
+# --- Vocabulário do Catálogo Sintético ---
+
+_SUJEITOS = [
+    'Mineração', 'Urbanização', 'Desigualdade', 'Habitação', 'Favelas', 'Planejamento urbano',
+    'Segregação', 'Mobilidade', 'Regularização fundiária', 'Periferias', 'Políticas públicas',
+    'Desenvolvimento regional', 'Movimentos sociais', 'Conflitos territoriais', 'Saneamento',
+    'Minería', 'Urbanización', 'Desigualdad', 'Vivienda', 'Asentamientos informales',
+    'Planificación territorial', 'Segregación residencial', 'Movilidad', 'Gentrificación',
+]
+_COMPLEMENTOS = [
+    'na Amazônia', 'em Minas Gerais', 'no Brasil contemporâneo', 'nas metrópoles latino-americanas',
+    'e o direito à cidade', 'no século XX', 'em cidades médias', 'e meio ambiente',
+    'en América Latina', 'en la ciudad de México', 'en Buenos Aires', 'y territorio', 'en Chile',
+    'e trabalho', 'e reforma agrária', 'no Vale do Jequitinhonha', 'em São Paulo', 'y ciudadanía',
+]
+_PREFIXOS = [
+    '', '', '', 'Uma análise de ', 'Estudo sobre ', 'Notas sobre ', 'Crítica da ', 'Ensayo sobre ',
+    'La cuestión de la ', 'Dinâmicas da ', 'Transformações da ', 'Historia de la ',
+]
+_NOMES = [
+    'Ana', 'João', 'Maria', 'José', 'Carlos', 'Fernanda', 'Lucía', 'Alejandro', 'Raquel', 'Milton',
+    'David', 'Ermínia', 'Flávio', 'Henri', 'Teresa', 'Marcelo', 'Ana Fani', 'Roberto', 'Paula', 'Diego',
+]
+_SOBRENOMES = [
+    'Santos', 'Silva', 'Rolnik', 'Maricato', 'Harvey', 'Villaça', 'Lefebvre', 'Caldeira', 'Souza',
+    'Carlos', 'Oliveira', 'Pereira', 'Fernández', 'González', 'Rodríguez', 'Martínez', 'Sabatini',
+    'Jaramillo', 'Abramo', 'Ribeiro', 'Kowarick', 'Gonçalves', 'Lima', 'Costa',
+]
+_TAGS = [
+    'urbanismo', 'mineração', 'desigualdade', 'habitação', 'favela', 'planejamento', 'segregação',
+    'mobilidade', 'meio ambiente', 'amazônia', 'direito à cidade', 'periferia', 'políticas públicas',
+    'movimentos sociais', 'território', 'minería', 'vivienda', 'gentrificación', 'américa latina',
+    'economia política', 'geografia urbana', 'história urbana', 'metodologia', 'conflitos',
+    'saneamento', 'trabalho', 'reforma agrária', 'cartografia', 'demografia', 'patrimônio',
+]
+_TIPOS = ['Livro', 'Artigo', 'Tese', 'Dissertação', 'Relatório', 'Capítulo']
+_LOCAIS = ['Estante A', 'Estante B', 'Estante C', 'Arquivo Digital', 'Sala de Leitura']
+_FRASES_RESUMO = [
+    'O trabalho discute a produção do espaço urbano a partir de dados censitários.',
+    'Analisa-se a relação entre extração mineral e transformações territoriais.',
+    'El artículo examina las políticas de vivienda social y sus efectos sobre la segregación.',
+    'A pesquisa combina entrevistas, cartografia e análise documental.',
+    'Se discuten los conflictos socioambientales asociados a la minería a gran escala.',
+    'Os resultados indicam a persistência da desigualdade no acesso à terra urbana.',
+    'Propõe-se uma leitura crítica do planejamento urbano no período recente.',
+    'La investigación reconstruye la historia de los asentamientos informales.',
+]
+
+# Consultas medidas: termos frequentes e raros, vários termos, frase e sem resultado
+QUERIES = ['mineração', 'vivienda', 'harvey', 'desigualdade urbana', '"planejamento urbano"', 'xyzzy']
+THEME_FILTERS = [(['urbanismo'], True), (['mineração', 'amazônia'], True), (['vivienda', 'favela', 'periferia'], False)]
+
+
+def _choice(rng, values, n):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), n)]
+
+
+def _zipf_choice(rng, values, n):
+    """Escolhas com frequência decrescente (poucas tags muito comuns, muitas raras)."""
+    weights = 1.0 / np.arange(1, len(values) + 1)
+    return np.asarray(values, dtype=object)[rng.choice(len(values), n, p=weights / weights.sum())]
+
+
+def synthetic_biblio(n, seed=SEED):
+    """DataFrame sintético no formato da aba 'bibliografia' (SCHEMA_BIBLIO)."""
+    rng = np.random.default_rng(seed)
+    titulos = (
+        pd.Series(_choice(rng, _PREFIXOS, n)) + pd.Series(_choice(rng, _SUJEITOS, n)) + ' '
+        + pd.Series(_choice(rng, _COMPLEMENTOS, n))
+    )
+    # Sufixo numérico em parte dos títulos: vocabulário maior, como num acervo real
+    com_volume = rng.random(n) < 0.3
+    titulos[com_volume] = titulos[com_volume] + ' (vol. ' + pd.Series(rng.integers(1, 500, n)).astype(str)[com_volume] + ')'
+    autores = pd.Series(_choice(rng, _NOMES, n)) + ' ' + pd.Series(_choice(rng, _SOBRENOMES, n))
+    n_tags = rng.integers(1, 5, n)
+    todas_tags = _zipf_choice(rng, _TAGS, int(n_tags.sum()))
+    tags = [', '.join(dict.fromkeys(t)) for t in np.split(todas_tags, np.cumsum(n_tags)[:-1])]
+    resumos = pd.Series(_choice(rng, _FRASES_RESUMO, n)) + ' ' + pd.Series(_choice(rng, _FRASES_RESUMO, n))
+    anos = rng.integers(1950, 2026, n).astype(object)
+    anos[rng.random(n) < 0.05] = '' # Alguns sem ano, como na planilha
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'titulo': titulos,
+        'autor': autores,
+        'tipo': _choice(rng, _TIPOS, n),
+        'ano': anos,
+        'tags': tags,
+        'caminho_arquivo': '',
+        'resumo': resumos,
+        'localizacao_fisica': _choice(rng, _LOCAIS, n),
+        'data_adicao': '2024-01-01 10:00:00',
+    })[SCHEMA_BIBLIO]
+
+
+def synthetic_datasets(n, seed=SEED + 1):
+    """DataFrame sintético no formato da aba 'dados_externos' (SCHEMA_DATASET)."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'titulo': 'Base de dados: ' + pd.Series(_choice(rng, _SUJEITOS, n)) + ' ' + pd.Series(_choice(rng, _COMPLEMENTOS, n)),
+        'descricao': pd.Series(_choice(rng, _FRASES_RESUMO, n)),
+        'link_drive': '',
+        'data_cadastro': '2024-01-01 10:00:00',
+    })[SCHEMA_DATASET]
+
+
+# --- Medição ---
+
+def _time(func, repeat):
+    """Executa `func` `repeat` vezes; devolve (estatísticas em ms, último resultado)."""
+    tempos = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        inicio = time.perf_counter()
+        result = func()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return {
+        'median_ms': round(statistics.median(tempos), 3),
+        'min_ms': round(tempos[0], 3),
+        'max_ms': round(tempos[-1], 3),
+        'runs': repeat,
+    }, result
+
+
+def _time_each(func, args_list, repeat):
+    """Mede `func(*args)` para cada item de `args_list`; estatísticas agregadas + por item."""
+    por_item = {}
+    medianas = []
+    for args in args_list:
+        stats, _ = _time(lambda: func(*args), repeat)
+        por_item[' | '.join(str(a) for a in args)] = stats['median_ms']
+        medianas.append(stats['median_ms'])
+    return {
+        'median_ms': round(statistics.median(medianas), 3),
+        'max_ms': round(max(medianas), 3),
+        'runs': repeat,
+        'items': por_item,
+    }
+
+
+def _text_masks(ix, consulta):
+    """Filtro textual da bibliografia e dos datasets (mesmas etapas de buscar_com_cache/executar_busca_unificada)."""
+    consulta = ' '.join(fold_text(consulta).split())
+    pontuacao_b = ix['ranking_b'].scores(consulta, match_all=True)
+    pontuacao_d = ix['ranking_d'].scores(consulta, match_all=True)
+    mask_b = ix['texto_b'].search_mask(consulta)
+    mask_d = ix['texto_d'].search_mask(consulta)
+    if not consulta.strip().startswith('"'):
+        mask_b |= pontuacao_b > 0
+        mask_d |= pontuacao_d > 0
+    if not mask_b.any() and not mask_d.any():
+        mask_b = ix['aproximada'].search_mask(consulta.strip('"'))
+    return mask_b, pontuacao_b, mask_d, pontuacao_d
+
+
+def _ordenar(mask, pontuacao):
+    posicoes = np.flatnonzero(mask)
+    return posicoes[np.argsort(-pontuacao[posicoes], kind='stable')]
+
+
+def _busca_unificada(ix, cat_b, cat_d, consulta, temas, todos):
+    """Busca completa: texto + ranking, facetas de tema, contagens e materialização da primeira página."""
+    mask_b, pontuacao_b, mask_d, pontuacao_d = _text_masks(ix, consulta)
+    resultado = ResultSet(_ordenar(mask_b, pontuacao_b), _ordenar(mask_d, pontuacao_d))
+    base = np.zeros(len(cat_b), dtype=bool)
+    base[resultado.biblio] = True
+    ix['facetas'].counts(base, tags=temas, match_all=todos)
+    resultado = resultado.filter_biblio(ix['facetas'].mask(tags=temas, match_all=todos))
+    pos_b, pos_d = resultado.page(0, PAGE_SIZE)
+    return pd.concat([cat_b.iloc[pos_b][['titulo', 'autor']], cat_d.iloc[pos_d][['titulo']]], ignore_index=True)
+
+
+def bench_size(n_biblio, repeat, workdir):
+    """Roda todas as etapas para um catálogo de `n_biblio` referências."""
+    n_datasets = max(1, int(n_biblio * DATASETS_RATIO))
+    resultado = {'rows_biblio': n_biblio, 'rows_datasets': n_datasets, 'steps': {}}
+    steps = resultado['steps']
+
+    inicio = time.perf_counter()
+    df_b, df_d = synthetic_biblio(n_biblio), synthetic_datasets(n_datasets)
+    resultado['generate_s'] = round(time.perf_counter() - inicio, 3)
+
+    db_path = os.path.join(workdir, f'bench_{n_biblio}.sqlite')
+    backend = SQLiteBackend({SHEET_BIBLIO: SCHEMA_BIBLIO, SHEET_DATASETS: SCHEMA_DATASET}, db_path=db_path)
+    inicio = time.perf_counter()
+    backend.append_many(SHEET_BIBLIO, df_b.values.tolist())
+    backend.append_many(SHEET_DATASETS, df_d.values.tolist())
+    resultado['populate_s'] = round(time.perf_counter() - inicio, 3)
+    del df_b, df_d
+
+    # Etapas pesadas (uma vez por versão do catálogo no app): menos repetições nos tamanhos grandes
+    repeat_build = 1 if n_biblio >= 100_000 else repeat
+    steps['load'], (cat_b, cat_d) = _time(
+        lambda: (normalize_catalog(backend.load(SHEET_BIBLIO)), normalize_datasets(backend.load(SHEET_DATASETS))),
+        repeat_build,
+    )
+
+    ix = {}
+    construcoes = {
+        'texto_b': lambda: build_text_index(cat_b, list(SEARCH_COLUMNS_BIBLIO.values())),
+        'texto_d': lambda: build_text_index(cat_d, list(SEARCH_COLUMNS_DATASET.values())),
+        'ranking_b': lambda: build_bm25_index(cat_b, FIELD_WEIGHTS_BIBLIO),
+        'ranking_d': lambda: build_bm25_index(cat_d, FIELD_WEIGHTS_DATASET),
+        'aproximada': lambda: build_trigram_index(cat_b, ['busca_titulo', 'busca_autor']),
+        'temas': lambda: build_tag_index(cat_b),
+    }
+    for nome, construir in construcoes.items():
+        steps[f'build_{nome}'], ix[nome] = _time(construir, repeat_build)
+    steps['build_facetas'], ix['facetas'] = _time(lambda: build_facet_index(cat_b, ix['temas']), repeat_build)
+
+    # Opções do filtro de temas com contagens, sobre o catálogo inteiro (página sem busca)
+    todos = np.ones(len(cat_b), dtype=bool)
+    steps['tag_options'], _ = _time(
+        lambda: sorted(f"{t} ({c})" for t, c in ix['facetas'].counts(todos)['tags'].items() if c), repeat
+    )
+    steps['theme_filter'] = _time_each(
+        lambda temas, modo: ix['temas'].search_mask(temas, modo), THEME_FILTERS, repeat
+    )
+    steps['text_filter'] = _time_each(lambda q: _text_masks(ix, q), [(q,) for q in QUERIES], repeat)
+    steps['unified_search'] = _time_each(
+        lambda q, temas, modo: _busca_unificada(ix, cat_b, cat_d, q, temas, modo),
+        [(q, *THEME_FILTERS[i % len(THEME_FILTERS)]) for i, q in enumerate(QUERIES)],
+        repeat,
+    )
+    resultado['matches'] = {q: int(_text_masks(ix, q)[0].sum()) for q in QUERIES}
+    return resultado
+
+
+# --- Limpeza do Texto Extraído ---
+
+def _reflow(text, width=72):
+    """
+    Variante do texto com quebras de linha, hifenização no fim das linhas e
+    parágrafos (o texto do pdfminer sem análise de layout quase não tem quebras).
+    """
+    paragrafos = []
+    for i in range(0, len(text), 2000):
+        linhas = textwrap.wrap(text[i:i + 2000], width=width, break_long_words=True, break_on_hyphens=False)
+        paragrafos.append('\n'.join(l + '-' if len(l) == width else l for l in linhas))
+    return '\n \n'.join(paragrafos)
+
+
+def bench_text_cleaning(paths, repeat):
+    """Normalizador de passada única × regex original, por PDF (texto bruto e variante com quebras)."""
+    resultados = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            pdf = BytesIO(f.read())
+        inicio = time.perf_counter()
+        paginas = list(iter_pdf_pages(pdf))
+        extracao_s = round(time.perf_counter() - inicio, 3)
+        for variante, blocos in (('raw', paginas), ('reflowed', [_reflow(p) for p in paginas])):
+            bruto = ''.join(blocos)
+
+            def normalizar():
+                normalizer = TextNormalizer()
+                for bloco in blocos:
+                    normalizer.feed(bloco)
+                return normalizer.text()
+
+            legado, esperado = _time(lambda: _clean_extracted_text_regex(bruto), repeat)
+            novo, obtido = _time(normalizar, repeat)
+            if obtido != esperado:
+                raise AssertionError(f"Saída diferente da implementação original: {path} ({variante})")
+            resultados.append({
+                'pdf': os.path.basename(path), 'variant': variante, 'pages': len(paginas),
+                'chars': len(bruto), 'line_breaks': bruto.count('\n'), 'extraction_s': extracao_s,
+                'regex_4_pass': legado, 'single_pass': novo,
+                'speedup': round(legado['median_ms'] / max(novo['median_ms'], 1e-6), 2),
+            })
+    return resultados
+
+
+def environment():
+    return {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da busca da Biblioteca Principal.")
+    parser.add_argument('--sizes', type=int, nargs='*', default=DEFAULT_SIZES, help="Nº de referências por catálogo (vazio: não mede a busca).")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="Repetições por medição (usa-se a mediana).")
+    parser.add_argument('--output', default='benchmark_report.json', help="Arquivo do relatório JSON ('-' para stdout).")
+    parser.add_argument('--pdfs', nargs='+', default=[], help="PDFs de amostra para medir a limpeza do texto extraído.")
+    args = parser.parse_args(argv)
+
+    relatorio = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'config': {'repeat': args.repeat, 'page_size': PAGE_SIZE, 'queries': QUERIES, 'seed': SEED},
+        'results': [],
+    }
+    with tempfile.TemporaryDirectory(prefix='biblioteca_bench_') as workdir:
+        for n in args.sizes:
+            print(f"[{n:>9,} linhas] gerando e medindo...", file=sys.stderr, flush=True)
+            resultado = bench_size(n, args.repeat, workdir)
+            relatorio['results'].append(resultado)
+            resumo = ', '.join(f"{k}={v['median_ms']:.1f}ms" for k, v in resultado['steps'].items() if not k.startswith('build_'))
+            print(f"[{n:>9,} linhas] {resumo}", file=sys.stderr, flush=True)
+
+    if args.pdfs:
+        relatorio['text_cleaning'] = bench_text_cleaning(args.pdfs, args.repeat)
+        for r in relatorio['text_cleaning']:
+            print(f"[{r['pdf']} {r['variant']}] regex={r['regex_4_pass']['median_ms']:.2f}ms "
+                  f"passada única={r['single_pass']['median_ms']:.2f}ms ({r['speedup']}×)", file=sys.stderr, flush=True)
+
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(texto)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+        print(f"Relatório salvo em {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
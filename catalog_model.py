@@ -0,0 +1,85 @@
+import unicodedata
+import pandas as pd
+
+# --- Modelo Tipado do Catálogo (Leitura) ---
+# Normaliza uma única vez, por versão da aba, o DataFrame lido do backend:
+# tipos compactos, tags já separadas e colunas de busca minúsculas e sem
+# acentos. As páginas de consulta usam este modelo sem novas conversões a cada rerun.
+
+# Esquema obrigatório das abas (ordem das colunas usada para salvar novos dados)
+SCHEMA_BIBLIO = ["id", "titulo", "autor", "tipo", "ano", "tags", "caminho_arquivo", "resumo", "localizacao_fisica", "data_adicao"]
+SCHEMA_DATASET = ["id", "titulo", "descricao", "link_drive", "data_cadastro"]
+
+SEARCH_COLUMNS_BIBLIO = {
+    'titulo': 'busca_titulo',
+    'autor': 'busca_autor',
+    'tags': 'busca_tags',
+    'localizacao_fisica': 'busca_localizacao',
+}
+SEARCH_COLUMNS_DATASET = {
+    'titulo': 'busca_titulo',
+    'descricao': 'busca_descricao',
+}
+
+
+def fold_text(text):
+    """Minúsculas e sem acentos ('Mineração' → 'mineracao')."""
+    if text is None or (isinstance(text, float) and pd.isna(text)):
+        return ''
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def split_tags(tags_str):
+    """Separa a string de tags por vírgula, sem espaços e sem vazios."""
+    if not isinstance(tags_str, str):
+        return []
+    return [tag.strip() for tag in tags_str.split(',') if tag.strip()]
+
+
+def _text_column(series):
+    """Coluna de texto sem nulos (valores vazios viram '')."""
+    return series.where(series.notna(), '').astype(str)
+
+
+def normalize_catalog(df):
+    """
+    Constrói o modelo tipado da aba 'bibliografia':
+    `id` inteiro (também usado como índice, se único), `tipo` e `localizacao_fisica`
+    categóricos, `ano` inteiro anulável, `tags_lista` pré-separada e colunas `busca_*`.
+    """
+    cat = pd.DataFrame(index=df.index)
+    cat['id'] = pd.to_numeric(df['id'], errors='coerce').fillna(-1).astype('int64')
+    for col in ('titulo', 'autor', 'tags', 'caminho_arquivo', 'resumo', 'data_adicao'):
+        cat[col] = _text_column(df[col])
+    cat['tipo'] = _text_column(df['tipo']).astype('category')
+    cat['localizacao_fisica'] = _text_column(df['localizacao_fisica']).astype('category')
+    cat['ano'] = pd.to_numeric(df['ano'], errors='coerce').round().astype('Int64')
+    cat['tags_lista'] = cat['tags'].map(split_tags)
+    for col, busca in SEARCH_COLUMNS_BIBLIO.items():
+        cat[busca] = cat[col].astype(str).map(fold_text)
+    return _index_by_id(cat)
+
+
+def normalize_datasets(df):
+    """Constrói o modelo tipado da aba 'dados_externos' (mesmas convenções de normalize_catalog)."""
+    cat = pd.DataFrame(index=df.index)
+    cat['id'] = pd.to_numeric(df['id'], errors='coerce').fillna(-1).astype('int64')
+    for col in ('titulo', 'descricao', 'link_drive', 'data_cadastro'):
+        cat[col] = _text_column(df[col])
+    for col, busca in SEARCH_COLUMNS_DATASET.items():
+        cat[busca] = cat[col].map(fold_text)
+    return _index_by_id(cat)
+
+
+def _index_by_id(cat):
+    if cat['id'].is_unique:
+        cat.index = pd.Index(cat['id'].values, name='id_ref')
+    return cat
+
+
+def get_by_id(cat, item_id):
+    """Linha do modelo pelo ID (acesso direto pelo índice quando os IDs são únicos)."""
+    if cat.index.name == 'id_ref':
+        return cat.loc[item_id]
+    return cat[cat['id'] == item_id].iloc[0]
@@ -0,0 +1,102 @@
+import math
+from gspread.utils import rowcol_to_a1
+
+# --- Motor de Diferenças (Change-Set) para Edições em Bloco ---
+# Compara a saída do AgGrid com o DataFrame carregado e gera apenas as células
+# alteradas, que são enviadas ao Sheets em uma única chamada batch_update.
+
+
+def normalize_value(value):
+    """Normaliza valores para comparação (AgGrid pode devolver 2000, 2000.0 ou '2000')."""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if math.isnan(value):
+            return ''
+        if value.is_integer():
+            return str(int(value))
+    return str(value).strip()
+
+
+def _cell_value(value):
+    """Converte o valor do DataFrame para um tipo aceito pela API do Sheets."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    if hasattr(value, 'item'): # Tipos numpy (int64, float64...)
+        return value.item()
+    return value
+
+
+def _align_rows(df_original, df_atualizado):
+    """
+    Retorna pares (posição no original, posição no atualizado).
+    Usa o 'id' quando ele é único nos dois DataFrames; caso contrário, a ordem das linhas.
+    """
+    if 'id' in df_original.columns and 'id' in df_atualizado.columns:
+        ids_orig = df_original['id'].map(normalize_value)
+        ids_novos = df_atualizado['id'].map(normalize_value)
+        if ids_orig.is_unique and ids_novos.is_unique and set(ids_orig) == set(ids_novos):
+            pos_novo = {v: i for i, v in enumerate(ids_novos)}
+            return [(i, pos_novo[v]) for i, v in enumerate(ids_orig)]
+
+    if len(df_original) != len(df_atualizado):
+        return None
+    return [(i, i) for i in range(len(df_original))]
+
+
+def compute_changes(df_original, df_atualizado, header, schema):
+    """
+    Calcula as células alteradas entre o snapshot carregado e a saída do AgGrid.
+
+    `header` é o cabeçalho real da aba (ordem das colunas na planilha).
+    O índice de `df_original` deve ser a posição da linha de dados (linha da planilha - 2).
+    Retorna uma lista de (linha_planilha, coluna_planilha, valor) ou None quando a
+    estrutura mudou (linhas/colunas que não existem na aba) e só uma reescrita completa é segura.
+    """
+    pares = _align_rows(df_original, df_atualizado)
+    if pares is None:
+        return None
+
+    colunas = [c for c in schema if c in df_atualizado.columns and c in df_original.columns]
+    if any(c not in header for c in colunas):
+        return None
+
+    linhas_planilha = [int(i) + 2 for i in df_original.index]
+    changes = []
+    for col in colunas:
+        col_number = header.index(col) + 1
+        antigos = df_original[col].tolist()
+        novos = df_atualizado[col].tolist()
+        for pos_orig, pos_novo in pares:
+            if normalize_value(antigos[pos_orig]) != normalize_value(novos[pos_novo]):
+                changes.append((linhas_planilha[pos_orig], col_number, _cell_value(novos[pos_novo])))
+
+    changes.sort(key=lambda c: (c[0], c[1]))
+    return changes
+
+
+def _group_ranges(changes):
+    """Agrupa células vizinhas da mesma linha em um único intervalo A1."""
+    grupos = []
+    for row, col, value in changes:
+        if grupos and grupos[-1]['row'] == row and grupos[-1]['last_col'] == col - 1:
+            grupos[-1]['values'].append(value)
+            grupos[-1]['last_col'] = col
+        else:
+            grupos.append({'row': row, 'first_col': col, 'last_col': col, 'values': [value]})
+
+    return [
+        {
+            'range': f"{rowcol_to_a1(g['row'], g['first_col'])}:{rowcol_to_a1(g['row'], g['last_col'])}",
+            'values': [g['values']]
+        }
+        for g in grupos
+    ]
+
+
+def apply_changes(worksheet, changes):
+    """Envia as células alteradas em uma única chamada batch_update. Retorna o nº de células escritas."""
+    if not changes:
+        return 0
+    worksheet.batch_update(_group_ranges(changes))
+    return len(changes)
@@ -0,0 +1,231 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+import numpy as np
+
+from ranking import analyze, analyze_with_offsets, ANALYZER_VERSION
+
+# --- Texto Completo dos Documentos (Armazenamento Comprimido + Índice Posicional) ---
+# O texto extraído de cada PDF é guardado comprimido (zlib) em um SQLite local,
+# pela ID da referência. Um índice posicional (termo → referência → posições)
+# permite buscar dentro dos documentos, inclusive frases exatas, e montar
+# trechos com os termos encontrados em destaque.
+
+CONTENT_DB_FILE = os.environ.get('BIBLIOTECA_CONTENT_DB', 'biblioteca_conteudo.sqlite')
+SNIPPET_CHARS = 160 # Largura aproximada de cada trecho exibido
+MAX_SNIPPETS = 3
+
+_lock = threading.Lock()
+
+
+def _connect(db_path=None):
+    conn = sqlite3.connect(db_path or CONTENT_DB_FILE, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS content (
+            ref_id INTEGER PRIMARY KEY,
+            text BLOB NOT NULL,
+            chars INTEGER,
+            updated_at REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL,
+            ref_id INTEGER NOT NULL,
+            positions BLOB NOT NULL,
+            PRIMARY KEY (term, ref_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS postings_ref ON postings (ref_id)")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != ANALYZER_VERSION:
+        _reindex(conn)
+    return conn
+
+
+def _positions_by_term(text):
+    positions = {}
+    for pos, term in enumerate(analyze(text)):
+        positions.setdefault(term, []).append(pos)
+    return positions
+
+
+def _reindex(conn):
+    """Refaz as posições de todos os textos guardados com a análise atual (termos de outra versão não casam)."""
+    conn.execute("DELETE FROM postings")
+    for ref_id, blob in conn.execute("SELECT ref_id, text FROM content").fetchall():
+        positions = _positions_by_term(zlib.decompress(blob).decode('utf-8'))
+        conn.executemany(
+            "INSERT INTO postings (term, ref_id, positions) VALUES (?, ?, ?)",
+            [(term, ref_id, _encode_positions(pos)) for term, pos in positions.items()]
+        )
+    conn.execute(f"PRAGMA user_version = {int(ANALYZER_VERSION)}")
+    conn.commit()
+
+
+def _encode_positions(positions):
+    # Posições em ordem crescente, gravadas como diferenças (comprimem bem)
+    return zlib.compress(np.diff(np.asarray(positions, dtype=np.uint32), prepend=np.uint32(0)).tobytes())
+
+
+def _decode_positions(blob):
+    return np.cumsum(np.frombuffer(zlib.decompress(blob), dtype=np.uint32), dtype=np.uint32)
+
+
+def store_text(ref_id, text, db_path=None):
+    """Guarda (ou substitui) o texto completo de uma referência e indexa as posições dos termos."""
+    text = unicodedata.normalize('NFC', text or '')
+    positions = _positions_by_term(text)
+
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            conn.execute("DELETE FROM postings WHERE ref_id = ?", (ref_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO content (ref_id, text, chars, updated_at) VALUES (?, ?, ?, ?)",
+                (ref_id, zlib.compress(text.encode('utf-8'), 6), len(text), time.time())
+            )
+            conn.executemany(
+                "INSERT INTO postings (term, ref_id, positions) VALUES (?, ?, ?)",
+                [(term, ref_id, _encode_positions(pos)) for term, pos in positions.items()]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def delete_texts(ref_ids, db_path=None):
+    """Remove os textos (e as posições) de referências excluídas."""
+    ref_ids = [(int(r),) for r in ref_ids]
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            conn.executemany("DELETE FROM postings WHERE ref_id = ?", ref_ids)
+            conn.executemany("DELETE FROM content WHERE ref_id = ?", ref_ids)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def load_text(ref_id, db_path=None):
+    """Texto completo de uma referência (ou None)."""
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT text FROM content WHERE ref_id = ?", (ref_id,)).fetchone()
+    finally:
+        conn.close()
+    return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+
+def load_texts(ref_ids, db_path=None):
+    """Textos completos de várias referências: {ref_id: texto} (as sem texto guardado ficam de fora)."""
+    ref_ids = [int(r) for r in ref_ids]
+    texts = {}
+    conn = _connect(db_path)
+    try:
+        for i in range(0, len(ref_ids), 500): # Limite de parâmetros por consulta do SQLite
+            chunk = ref_ids[i:i + 500]
+            rows = conn.execute(
+                f"SELECT ref_id, text FROM content WHERE ref_id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            texts.update((ref_id, zlib.decompress(blob).decode('utf-8')) for ref_id, blob in rows)
+    finally:
+        conn.close()
+    return texts
+
+
+def stored_ids(db_path=None):
+    conn = _connect(db_path)
+    try:
+        return {r[0] for r in conn.execute("SELECT ref_id FROM content")}
+    finally:
+        conn.close()
+
+
+def _query_terms(query):
+    query = query.strip()
+    phrase = len(query) > 1 and query.startswith('"') and query.endswith('"')
+    return analyze(query.strip('"')), phrase
+
+
+def search(query, db_path=None):
+    """
+    Referências cujo texto completo contém todos os termos da consulta
+    (consulta entre aspas: a frase, com os termos consecutivos).
+    Retorna lista de (ref_id, nº de ocorrências), da maior para a menor contagem.
+    """
+    terms, phrase = _query_terms(query)
+    if not terms:
+        return []
+    unique_terms = list(dict.fromkeys(terms))
+
+    conn = _connect(db_path)
+    try:
+        postings = {}
+        for term in unique_terms:
+            rows = conn.execute("SELECT ref_id, positions FROM postings WHERE term = ?", (term,)).fetchall()
+            if not rows:
+                return []
+            postings[term] = dict(rows)
+    finally:
+        conn.close()
+
+    docs = set.intersection(*(set(p) for p in postings.values()))
+    results = []
+    for ref_id in docs:
+        positions = {term: _decode_positions(postings[term][ref_id]) for term in unique_terms}
+        if phrase and len(terms) > 1:
+            # Frase: início das ocorrências do 1º termo seguidas, em ordem, pelos demais
+            starts = positions[terms[0]]
+            for offset, term in enumerate(terms[1:], 1):
+                starts = np.intersect1d(starts, positions[term] - offset)
+            hits = len(starts)
+        else:
+            hits = sum(len(p) for p in positions.values())
+        if hits:
+            results.append((ref_id, hits))
+    results.sort(key=lambda r: (-r[1], r[0]))
+    return results
+
+
+def _escape_markdown(text):
+    return re.sub(r'([\\`*_{}\[\]<>#|~$])', r'\\\1', text.replace('\n', ' '))
+
+
+def snippets(ref_id, query, max_snippets=MAX_SNIPPETS, width=SNIPPET_CHARS, db_path=None):
+    """Trechos do texto em torno das ocorrências dos termos, com os termos em negrito (Markdown)."""
+    text = load_text(ref_id, db_path=db_path)
+    terms, _phrase = _query_terms(query)
+    if not text or not terms:
+        return []
+    wanted = set(terms)
+
+    windows, spans = [], []
+    for term, start, end in analyze_with_offsets(text):
+        if term not in wanted:
+            continue
+        lo = max(0, start - width // 2)
+        hi = min(len(text), end + width // 2)
+        if windows and lo <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], hi)
+        elif len(windows) == max_snippets:
+            break # Trechos suficientes: não percorre o resto do documento
+        else:
+            windows.append([lo, hi])
+        spans.append((start, end))
+
+    result = []
+    for lo, hi in windows:
+        parts, cursor = [], lo
+        for start, end in spans:
+            if start >= lo and end <= hi:
+                parts.append(_escape_markdown(text[cursor:start]))
+                parts.append(f"**{_escape_markdown(text[start:end])}**")
+                cursor = end
+        parts.append(_escape_markdown(text[cursor:hi]))
+        result.append(('…' if lo > 0 else '') + ''.join(parts).strip() + ('…' if hi < len(text) else ''))
+    return result
@@ -0,0 +1,177 @@
+import zlib
+from functools import lru_cache
+import numpy as np
+
+from ranking import analyze
+
+# --- Detecção de Quase-Duplicatas (MinHash + LSH) ---
+# Cada referência vira um conjunto de shingles (pares de termos consecutivos de
+# título + autor + resumo, já sem acentos e com stemming leve). A assinatura
+# MinHash estima a similaridade de Jaccard entre conjuntos; as faixas (bands)
+# do LSH agrupam assinaturas parecidas em buckets, de modo que só os pares que
+# caem no mesmo bucket são comparados — sem comparar todos com todos.
+
+NUM_PERM = 128
+BANDS = 32 # 32 faixas × 4 linhas: pares com Jaccard ≳ 0,4 quase sempre viram candidatos
+ROWS_PER_BAND = NUM_PERM // BANDS
+DUPLICATE_THRESHOLD = 0.6 # Similaridade estimada a partir da qual o par é reportado
+MAX_BUCKET = 200 # Buckets maiores (textos genéricos) não geram pares no relatório
+PERM_GROUP = 16 # Permutações calculadas por vez: 16 × bloco de 200 mil hashes × 8 bytes ≈ 25 MB
+
+# Hash universal multiply-shift: ((a·x + b) mod 2^64) >> 32, sem divisões
+_rng = np.random.default_rng(20240601) # Semente fixa: assinaturas estáveis entre processos
+_PERM_A = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1) # ímpares
+_PERM_B = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+_EMPTY = np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32)
+
+
+def reference_text(titulo, autor, resumo):
+    return f"{titulo or ''}\n{autor or ''}\n{resumo or ''}"
+
+
+def shingles(text):
+    """Conjunto de shingles: pares de termos consecutivos (ou o termo único, em textos de uma palavra)."""
+    terms = analyze(text)
+    if len(terms) < 2:
+        return set(terms)
+    return {f"{a} {b}" for a, b in zip(terms, terms[1:])}
+
+
+def signature(shingle_set):
+    """Assinatura MinHash (NUM_PERM valores) de um conjunto de shingles."""
+    if not shingle_set:
+        return _EMPTY
+    return signatures([shingle_set])[0]
+
+
+def estimated_similarity(sig_a, sig_b):
+    return float(np.mean(sig_a == sig_b))
+
+
+def signatures(shingle_sets, chunk_rows=200_000):
+    """Assinaturas de vários conjuntos de uma vez (matriz n × NUM_PERM), em blocos vetorizados."""
+    sizes = np.asarray([len(s) for s in shingle_sets], dtype=np.int64)
+    result = np.tile(_EMPTY, (len(shingle_sets), 1))
+    if not sizes.sum():
+        return result
+    hashes = np.fromiter(
+        (zlib.crc32(sh.encode('utf-8')) for s in shingle_sets for sh in s), dtype=np.uint64, count=int(sizes.sum())
+    )
+    docs = np.repeat(np.arange(len(shingle_sets)), sizes)
+    # Blocos de linhas que terminam na fronteira de um documento (limita a memória da matriz de hashes)
+    start = 0
+    while start < len(hashes):
+        stop = min(start + chunk_rows, len(hashes))
+        if stop < len(hashes):
+            boundary = int(np.searchsorted(docs, docs[stop], side='left'))
+            stop = boundary if boundary > start else int(np.searchsorted(docs, docs[start], side='right'))
+        block = hashes[None, start:stop]
+        block_docs = docs[start:stop]
+        firsts = np.flatnonzero(np.r_[True, block_docs[1:] != block_docs[:-1]])
+        # Poucas permutações por vez (pico de memória limitado); uma linha por permutação,
+        # para que a redução por documento percorra memória contígua
+        for p in range(0, NUM_PERM, PERM_GROUP):
+            a = _PERM_A[p:p + PERM_GROUP, None]
+            b = _PERM_B[p:p + PERM_GROUP, None]
+            permuted = ((a * block + b) >> np.uint64(32)).astype(np.uint32)
+            result[block_docs[firsts], p:p + PERM_GROUP] = np.minimum.reduceat(permuted, firsts, axis=1).T
+        start = stop
+    return result
+
+
+@lru_cache(maxsize=MAX_BUCKET)
+def _bucket_pairs(size):
+    return np.triu_indices(size, k=1)
+
+
+def band_keys(sigs):
+    """Chave (uint64) de cada faixa de cada assinatura: matriz n × BANDS."""
+    rows = sigs.reshape(len(sigs), BANDS, ROWS_PER_BAND).astype(np.uint64)
+    keys = np.zeros(rows.shape[:2], dtype=np.uint64)
+    for r in range(ROWS_PER_BAND):
+        keys = keys * np.uint64(0x100000001B3) ^ rows[:, :, r] # Mistura estilo FNV (colisões desprezíveis)
+    return keys
+
+
+class DuplicateIndex:
+    """
+    Índice LSH sobre as assinaturas MinHash das referências. Cada faixa guarda as
+    chaves ordenadas e as posições correspondentes: um bucket é um trecho contíguo.
+    """
+
+    def __init__(self, ids, texts):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        sets = [shingles(t) for t in texts]
+        self.signatures = signatures(sets)
+        valid = np.flatnonzero([bool(s) for s in sets]) # Textos vazios não entram nos buckets
+        keys = band_keys(self.signatures[valid])
+        order = np.argsort(keys, axis=0, kind='stable')
+        self._band_positions = valid[order].T           # BANDS × n: posições ordenadas pela chave
+        self._band_keys = np.take_along_axis(keys, order, axis=0).T
+
+    def _candidates(self, sig):
+        keys = band_keys(sig[None, :])[0]
+        found = [np.empty(0, dtype=np.int64)]
+        for band, key in enumerate(keys):
+            lo = np.searchsorted(self._band_keys[band], key, side='left')
+            hi = np.searchsorted(self._band_keys[band], key, side='right')
+            found.append(self._band_positions[band][lo:hi])
+        return np.unique(np.concatenate(found))
+
+    def query(self, text, threshold=DUPLICATE_THRESHOLD, exclude_id=None):
+        """Referências parecidas com `text`: lista de (id, similaridade estimada), em ordem decrescente."""
+        sig = signature(shingles(text))
+        if sig is _EMPTY:
+            return []
+        candidates = self._candidates(sig)
+        sims = (self.signatures[candidates] == sig).mean(axis=1)
+        matches = [
+            (int(self.ids[pos]), float(sim)) for pos, sim in zip(candidates, sims)
+            if sim >= threshold and self.ids[pos] != exclude_id
+        ]
+        matches.sort(key=lambda m: -m[1])
+        return matches
+
+    def report(self, threshold=DUPLICATE_THRESHOLD):
+        """
+        Pares de prováveis duplicatas no catálogo inteiro: lista de (id_a, id_b, similaridade),
+        em ordem decrescente. Só os pares que dividem algum bucket são comparados.
+        """
+        n = len(self.ids)
+        pair_codes = []
+        for keys, positions in zip(self._band_keys, self._band_positions):
+            if len(keys) < 2:
+                continue
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            sizes = np.diff(np.r_[starts, len(keys)])
+            # Buckets de 2 (a grande maioria) sem laço em Python
+            pares = starts[sizes == 2]
+            a, b = positions[pares], positions[pares + 1]
+            pair_codes.append(np.minimum(a, b) * n + np.maximum(a, b))
+            for start, size in zip(starts[(sizes > 2) & (sizes <= MAX_BUCKET)], sizes[(sizes > 2) & (sizes <= MAX_BUCKET)]):
+                members = np.sort(positions[start:start + size])
+                i, j = _bucket_pairs(int(size))
+                pair_codes.append(members[i] * n + members[j])
+        if not pair_codes:
+            return []
+        codes = np.unique(np.concatenate(pair_codes))
+        if not len(codes):
+            return []
+        first, second = codes // n, codes % n
+        sims = np.empty(len(codes))
+        for start in range(0, len(codes), 50_000): # Comparação vetorizada das assinaturas, em blocos
+            block = slice(start, start + 50_000)
+            sims[block] = (self.signatures[first[block]] == self.signatures[second[block]]).mean(axis=1)
+        keep = np.flatnonzero(sims >= threshold)
+        results = [(int(self.ids[first[k]]), int(self.ids[second[k]]), float(sims[k])) for k in keep]
+        results.sort(key=lambda r: (-r[2], r[0], r[1]))
+        return results
+
+
+def build_duplicate_index(cat):
+    """Constrói o índice de duplicatas a partir do modelo do catálogo."""
+    texts = [
+        reference_text(t, a, r)
+        for t, a, r in zip(cat['titulo'].tolist(), cat['autor'].tolist(), cat['resumo'].tolist())
+    ]
+    return DuplicateIndex(cat['id'].tolist(), texts)
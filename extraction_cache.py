@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# --- Cache de Extrações de PDF (Endereçado por Conteúdo) ---
+# O mesmo PDF costuma ser processado várias vezes (novo upload, o mesmo arquivo
+# do Drive com outro link de compartilhamento, nova tentativa após falha ao
+# salvar). O texto limpo e as sugestões de metadados ficam guardados pelo
+# SHA-256 dos bytes do PDF; o ID do arquivo no Drive aponta para o mesmo
+# conteúdo, o que evita até o download. Tamanho limitado, com descarte LRU.
+
+EXTRACTION_CACHE_FILE = os.environ.get('BIBLIOTECA_EXTRACTION_CACHE', 'biblioteca_extracoes.sqlite')
+MAX_CACHE_BYTES = int(os.environ.get('BIBLIOTECA_EXTRACTION_CACHE_MB', 512)) * 1024 * 1024
+PIPELINE_VERSION = 1 # Incrementar quando a extração/limpeza mudar: entradas antigas viram falta
+
+_lock = threading.Lock()
+
+
+def _connect(db_path=None):
+    conn = sqlite3.connect(db_path or EXTRACTION_CACHE_FILE, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS extractions (
+            sha256 TEXT PRIMARY KEY,
+            pipeline INTEGER NOT NULL,
+            text BLOB NOT NULL,
+            suggestions TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL,
+            last_used REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS drive_files (
+            file_id TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS extractions_lru ON extractions (last_used)")
+    return conn
+
+
+def pdf_sha256(pdf_bytes):
+    """SHA-256 do conteúdo de um arquivo binário (BytesIO), lido em blocos."""
+    digest = hashlib.sha256()
+    pdf_bytes.seek(0)
+    for chunk in iter(lambda: pdf_bytes.read(1024 * 1024), b''):
+        digest.update(chunk)
+    pdf_bytes.seek(0)
+    return digest.hexdigest()
+
+
+def get(sha256=None, file_id=None, db_path=None):
+    """
+    Extração em cache pelo conteúdo (SHA-256) ou pelo ID do arquivo no Drive:
+    {'sha256', 'texto', 'sugestoes'} ou None. Um acerto renova a entrada (LRU).
+    """
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            if sha256 is None and file_id:
+                row = conn.execute("SELECT sha256 FROM drive_files WHERE file_id = ?", (file_id,)).fetchone()
+                sha256 = row[0] if row else None
+            if sha256 is None:
+                return None
+            row = conn.execute(
+                "SELECT text, suggestions FROM extractions WHERE sha256 = ? AND pipeline = ?", (sha256, PIPELINE_VERSION)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE extractions SET last_used = ? WHERE sha256 = ?", (time.time(), sha256))
+            conn.commit()
+        finally:
+            conn.close()
+    return {'sha256': sha256, 'texto': zlib.decompress(row[0]).decode('utf-8'), 'sugestoes': json.loads(row[1])}
+
+
+def put(sha256, text, suggestions, file_id=None, db_path=None, max_bytes=None):
+    """Guarda a extração (texto limpo + sugestões) do conteúdo `sha256` e descarta as menos usadas além do limite."""
+    blob = zlib.compress(text.encode('utf-8'), 6)
+    suggestions = json.dumps(suggestions, ensure_ascii=False, default=str)
+    now = time.time()
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO extractions (sha256, pipeline, text, suggestions, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (sha256, PIPELINE_VERSION, blob, suggestions, len(blob) + len(suggestions), now, now)
+            )
+            if file_id:
+                conn.execute("INSERT OR REPLACE INTO drive_files (file_id, sha256) VALUES (?, ?)", (file_id, sha256))
+            _evict(conn, MAX_CACHE_BYTES if max_bytes is None else max_bytes)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def link_file_id(file_id, sha256, db_path=None):
+    """Associa um ID do Drive a um conteúdo já em cache (mesmo PDF com outro link)."""
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            conn.execute("INSERT OR REPLACE INTO drive_files (file_id, sha256) VALUES (?, ?)", (file_id, sha256))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def _evict(conn, max_bytes):
+    """Remove as entradas usadas há mais tempo até o total caber em `max_bytes`."""
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+    if total <= max_bytes:
+        return
+    excess = total - max_bytes
+    victims = []
+    for sha256, size in conn.execute("SELECT sha256, size FROM extractions ORDER BY last_used"):
+        if excess <= 0:
+            break
+        victims.append((sha256,))
+        excess -= size
+    conn.executemany("DELETE FROM extractions WHERE sha256 = ?", victims)
+    conn.execute("DELETE FROM drive_files WHERE sha256 NOT IN (SELECT sha256 FROM extractions)")
+
+
+def stats(db_path=None):
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            n, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions").fetchone()
+        finally:
+            conn.close()
+    return {'entradas': n, 'bytes': total, 'limite_bytes': MAX_CACHE_BYTES}
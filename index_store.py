@@ -0,0 +1,148 @@
+import json
+import mmap
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from ranking import ANALYZER_VERSION
+
+# --- Índices de Busca Persistidos (Partida a Frio) ---
+# Os índices de cada versão do catálogo (vocabulário, postings, ranking, temas)
+# e o próprio modelo do catálogo são gravados em disco, num diretório por
+# versão. Um processo novo (reinício do servidor, cache descartado, outro
+# worker) reabre os arrays via memory-map em vez de reconstruí-los: as páginas
+# ficam no cache do sistema operacional e são compartilhadas entre processos.
+#
+# Layout:  <INDEX_DIR>/<nome>/<versão>/manifest.json + um arquivo por bloco
+#          (arrays → .npy, blocos de bytes → .bin, modelo do catálogo → .pkl)
+
+INDEX_DIR = os.environ.get('BIBLIOTECA_INDEX_DIR', 'biblioteca_indices')
+FORMAT_VERSION = 1 # Incrementar quando o formato de algum índice mudar (arquivos antigos são ignorados)
+KEEP_VERSIONS = 2 # Versões mantidas em disco por índice (igual ao max_entries dos caches)
+
+_MANIFEST = 'manifest.json'
+_CATALOG_FILE = 'catalogo.pkl'
+
+
+def _entry_dir(name, version, base_dir=None):
+    return os.path.join(base_dir or INDEX_DIR, name, str(version))
+
+
+def _read_manifest(directory, kind, source):
+    """Manifesto da entrada, ou None se não existe ou é de outro formato/tipo/origem."""
+    try:
+        with open(os.path.join(directory, _MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (manifest.get('format') != FORMAT_VERSION or manifest.get('analyzer') != ANALYZER_VERSION
+            or manifest.get('kind') != kind or manifest.get('source') != source):
+        return None
+    return manifest
+
+
+def _map_bytes(path):
+    """Conteúdo do arquivo via memory-map (arquivos vazios não podem ser mapeados)."""
+    if not os.path.getsize(path):
+        return b''
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) # O mapa continua válido após fechar o arquivo
+
+
+def _write_entry(name, version, kind, source, write_files, meta=None, base_dir=None):
+    """
+    Grava a entrada num diretório temporário e o publica com uma renomeação
+    (leitores nunca veem uma entrada pela metade). Remove versões antigas.
+    """
+    target = _entry_dir(name, version, base_dir)
+    tmp = f"{target}.tmp-{os.getpid()}"
+    try:
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        files = write_files(tmp)
+        manifest = {'format': FORMAT_VERSION, 'analyzer': ANALYZER_VERSION, 'kind': kind, 'source': source, 'version': version, 'meta': meta or {}, 'files': files}
+        with open(os.path.join(tmp, _MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        if os.path.exists(target):
+            shutil.rmtree(target) # Entrada de outra origem/formato com o mesmo número de versão
+        os.replace(tmp, target)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return False # Persistir é só uma otimização: o índice em memória continua válido
+    _prune(os.path.dirname(target))
+    return True
+
+
+def _prune(name_dir, keep=KEEP_VERSIONS):
+    """Remove as versões mais antigas (arquivos ainda mapeados por outro processo podem falhar: ignorados)."""
+    versions = sorted((int(d) for d in os.listdir(name_dir) if d.isdigit()), reverse=True)
+    for version in versions[keep:]:
+        shutil.rmtree(os.path.join(name_dir, str(version)), ignore_errors=True)
+
+
+def save_index(index, name, version, source, base_dir=None):
+    """Persiste um índice que implementa `to_arrays()` (TextIndex, TagIndex, BM25Index)."""
+    arrays, meta = index.to_arrays()
+
+    def write_files(directory):
+        files = {}
+        for key, value in arrays.items():
+            if isinstance(value, (bytes, bytearray, mmap.mmap)):
+                files[key] = f"{key}.bin"
+                with open(os.path.join(directory, files[key]), 'wb') as f:
+                    f.write(value)
+            else:
+                files[key] = f"{key}.npy"
+                np.save(os.path.join(directory, files[key]), np.ascontiguousarray(value))
+        return files
+
+    return _write_entry(name, version, type(index).__name__, source, write_files, meta, base_dir)
+
+
+def load_index(cls, name, version, source, base_dir=None):
+    """Reabre o índice persistido da versão via memory-map, ou None se não houver um válido."""
+    directory = _entry_dir(name, version, base_dir)
+    manifest = _read_manifest(directory, cls.__name__, source)
+    if manifest is None:
+        return None
+    try:
+        arrays = {}
+        for key, filename in manifest['files'].items():
+            path = os.path.join(directory, filename)
+            arrays[key] = _map_bytes(path) if filename.endswith('.bin') else np.load(path, mmap_mode='r')
+        return cls.from_arrays(arrays, manifest['meta'])
+    except (OSError, ValueError, KeyError):
+        return None # Entrada incompleta ou corrompida: reconstruída e regravada
+
+
+def load_or_build(cls, name, version, source, build, base_dir=None):
+    """Índice da versão a partir do disco; se ausente, constrói com `build()` e persiste para os próximos processos."""
+    index = load_index(cls, name, version, source, base_dir)
+    if index is None:
+        index = build()
+        save_index(index, name, version, source, base_dir)
+    return index
+
+
+def load_or_build_catalog(name, version, source, build, base_dir=None):
+    """
+    Modelo do catálogo (metadados dos documentos) da versão: lido do disco ou
+    construído com `build()` e persistido. Colunas de texto não são mapeáveis,
+    então o DataFrame é gravado serializado (leitura ~10× mais rápida que refazer a carga).
+    """
+    directory = _entry_dir(name, version, base_dir)
+    if _read_manifest(directory, 'DataFrame', source) is not None:
+        try:
+            return pd.read_pickle(os.path.join(directory, _CATALOG_FILE))
+        except Exception:
+            pass # Arquivo ilegível (ex.: outra versão do pandas): reconstruído abaixo
+    cat = build()
+
+    def write_files(tmp):
+        cat.to_pickle(os.path.join(tmp, _CATALOG_FILE))
+        return {'catalogo': _CATALOG_FILE}
+
+    _write_entry(name, version, 'DataFrame', source, write_files, {'n_docs': len(cat)}, base_dir)
+    return cat
@@ -0,0 +1,418 @@
+import sqlite3
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import pandas as pd
+
+# --- Espelho Local (SQLite) das Abas do Google Sheets ---
+# Cada aba vira uma tabela local com uma linha por linha de dados da planilha.
+# A leitura das páginas é sempre feita aqui; o Sheets só é consultado quando
+# a data de modificação da planilha muda.
+
+MIRROR_DB_FILE = os.environ.get('BIBLIOTECA_MIRROR_DB', 'biblioteca_mirror.sqlite')
+SYNC_INTERVAL_SECONDS = 60 # Intervalo mínimo entre verificações de modificação no Sheets
+
+_lock = threading.RLock() # Serializa as escritas locais; leituras não o usam (WAL: leitores não esperam escritores)
+_syncing = set() # Abas (base, aba) com uma sincronização em andamento neste processo
+
+
+def _connect(db_path=None):
+    """Abre a base local do espelho e garante a tabela de controle."""
+    conn = sqlite3.connect(db_path or MIRROR_DB_FILE, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mirror_meta (
+            tab TEXT PRIMARY KEY,
+            header TEXT,
+            remote_stamp TEXT,
+            checked_at REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tab_versions (
+            tab TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS db_identity (nonce TEXT NOT NULL)")
+    return conn
+
+
+def _bump(conn, sheet_name):
+    conn.execute(
+        "INSERT INTO tab_versions (tab, version) VALUES (?, 1) "
+        "ON CONFLICT(tab) DO UPDATE SET version = version + 1",
+        (sheet_name,)
+    )
+
+
+def _table_name(sheet_name):
+    """Normaliza o nome da aba para uso como nome de tabela SQLite."""
+    return "tab_" + ''.join(c if c.isalnum() else '_' for c in sheet_name)
+
+
+def _row_hash(values):
+    return hashlib.sha1(json.dumps(values, default=str, ensure_ascii=False).encode()).hexdigest()
+
+
+def _remote_stamp(spreadsheet):
+    """Data de modificação da planilha (metadado do Drive, sem ler as células)."""
+    try:
+        return spreadsheet.get_lastUpdateTime()
+    except Exception:
+        return None
+
+
+def _ensure_table(conn, sheet_name, header):
+    """Cria (ou recria, se o cabeçalho mudou) a tabela local da aba."""
+    table = _table_name(sheet_name)
+    row = conn.execute("SELECT header FROM mirror_meta WHERE tab = ?", (sheet_name,)).fetchone()
+    if row and json.loads(row[0]) == header:
+        return table
+
+    cols = ", ".join(f'"{c}"' for c in header)
+    conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+    conn.execute(f'CREATE TABLE "{table}" (sheet_row INTEGER PRIMARY KEY, row_hash TEXT{", " + cols if cols else ""})')
+    conn.execute(
+        "INSERT INTO mirror_meta (tab, header, remote_stamp, checked_at) VALUES (?, ?, NULL, 0) "
+        "ON CONFLICT(tab) DO UPDATE SET header = excluded.header, remote_stamp = NULL",
+        (sheet_name, json.dumps(header))
+    )
+    return table
+
+
+def sync_tab(spreadsheet, sheet_name, force=False, db_path=None):
+    """
+    Sincroniza a aba com o espelho local.
+    Retorna True se alguma linha local mudou.
+
+    A API do Sheets não expõe um histórico de alterações por linha, então a
+    sincronização é incremental em duas etapas: (1) a data de modificação da
+    planilha é consultada no máximo a cada SYNC_INTERVAL_SECONDS e, se não
+    mudou, nada é baixado; (2) se mudou, as linhas são comparadas por hash e
+    apenas as linhas alteradas, novas ou removidas são gravadas localmente.
+
+    A planilha é baixada (e suas linhas, hasheadas) fora de `_lock`, que só protege a
+    transação de escrita local: as leituras das páginas não esperam a chamada ao Sheets.
+    """
+    key = (db_path or MIRROR_DB_FILE, sheet_name)
+    with _lock:
+        if key in _syncing and not force:
+            return False # Outra sessão já está sincronizando: as leituras usam o espelho atual
+        _syncing.add(key)
+    try:
+        return _sync_tab(spreadsheet, sheet_name, force, db_path)
+    finally:
+        with _lock:
+            _syncing.discard(key)
+
+
+def _sync_tab(spreadsheet, sheet_name, force, db_path):
+    conn = _connect(db_path)
+    try:
+        meta = conn.execute(
+            "SELECT remote_stamp, checked_at FROM mirror_meta WHERE tab = ?", (sheet_name,)
+        ).fetchone()
+    finally:
+        conn.close()
+    now = time.time()
+
+    if meta and not force and now - (meta[1] or 0) < SYNC_INTERVAL_SECONDS:
+        return False
+
+    stamp = _remote_stamp(spreadsheet)
+    if meta and not force and stamp and stamp == meta[0]:
+        with _lock:
+            conn = _connect(db_path)
+            try:
+                conn.execute("UPDATE mirror_meta SET checked_at = ? WHERE tab = ?", (now, sheet_name))
+                conn.commit()
+            finally:
+                conn.close()
+        return False
+
+    worksheet = spreadsheet.worksheet(sheet_name)
+    records = worksheet.get_all_records()
+    header = list(records[0].keys()) if records else worksheet.row_values(1)
+    remote = {}
+    for i, record in enumerate(records):
+        values = [record.get(c) for c in header]
+        remote[i + 2] = (_row_hash(values), values) # Linha 1 é o cabeçalho
+
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            table = _ensure_table(conn, sheet_name, header)
+            local_hashes = dict(conn.execute(f'SELECT sheet_row, row_hash FROM "{table}"').fetchall())
+            upserts = [[r, h] + values for r, (h, values) in remote.items() if local_hashes.get(r) != h]
+            removed = [(r,) for r in local_hashes if r not in remote]
+
+            if upserts:
+                placeholders = ", ".join("?" for _ in range(len(header) + 2))
+                conn.executemany(f'INSERT OR REPLACE INTO "{table}" VALUES ({placeholders})', upserts)
+            if removed:
+                conn.executemany(f'DELETE FROM "{table}" WHERE sheet_row = ?', removed)
+
+            conn.execute(
+                "UPDATE mirror_meta SET remote_stamp = ?, checked_at = ? WHERE tab = ?",
+                (stamp, now, sheet_name)
+            )
+            changed = bool(upserts or removed)
+            if changed:
+                _bump(conn, sheet_name)
+            conn.commit()
+            return changed
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def read_tab(sheet_name, db_path=None):
+    """
+    Lê a aba a partir do espelho local.
+    O índice do DataFrame é a posição da linha de dados (linha da planilha - 2),
+    igual ao DataFrame montado a partir de get_all_records().
+    """
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN") # Cabeçalho e linhas do mesmo instantâneo (WAL), mesmo com uma sincronização em curso
+        meta = conn.execute("SELECT header FROM mirror_meta WHERE tab = ?", (sheet_name,)).fetchone()
+        if not meta:
+            return pd.DataFrame()
+        header = json.loads(meta[0])
+        df = pd.read_sql_query(f'SELECT * FROM "{_table_name(sheet_name)}" ORDER BY sheet_row', conn)
+    finally:
+        conn.close()
+
+    df.index = df.pop('sheet_row') - 2
+    df.index.name = None
+    return df[header]
+
+
+def read_header(sheet_name, db_path=None):
+    """Cabeçalho real da aba (ordem das colunas na planilha), conforme a última sincronização."""
+    conn = _connect(db_path)
+    try:
+        meta = conn.execute("SELECT header FROM mirror_meta WHERE tab = ?", (sheet_name,)).fetchone()
+    finally:
+        conn.close()
+    return json.loads(meta[0]) if meta else []
+
+
+def mark_stale(sheet_name, db_path=None):
+    """Força a próxima sincronização da aba a consultar o Sheets (usado após escritas)."""
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            conn.execute("UPDATE mirror_meta SET remote_stamp = NULL, checked_at = 0 WHERE tab = ?", (sheet_name,))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+# --- Versões por Aba (Invalidação Seletiva de Cache) ---
+# Cada aba tem um contador de versão na base local. Os caches das páginas são
+# chaveados por essa versão: uma escrita (ou uma sincronização que trouxe
+# mudanças) incrementa apenas a versão da própria aba.
+
+
+def tab_version(sheet_name, db_path=None):
+    """Versão atual da aba (consulta local, sem acesso ao Sheets)."""
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT version FROM tab_versions WHERE tab = ?", (sheet_name,)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else 0
+
+
+def database_id(db_path=None):
+    """
+    Identificador aleatório da base local, gerado na primeira consulta. Uma base
+    apagada ou recriada recomeça as versões em 1: quem guarda dados por versão
+    (índices persistidos) inclui este identificador para distinguir as bases.
+    """
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            row = conn.execute("SELECT nonce FROM db_identity").fetchone()
+            if not row:
+                conn.execute( # Uma única instrução: dois processos não criam identificadores diferentes
+                    "INSERT INTO db_identity (nonce) SELECT ? WHERE NOT EXISTS (SELECT 1 FROM db_identity)",
+                    (uuid.uuid4().hex,)
+                )
+                conn.commit()
+                row = conn.execute("SELECT nonce FROM db_identity").fetchone()
+        finally:
+            conn.close()
+    return row[0]
+
+
+def bump_tab_version(sheet_name, db_path=None):
+    """Incrementa a versão da aba, invalidando apenas os caches que dependem dela."""
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            _bump(conn, sheet_name)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+# --- Escrita Direta nas Tabelas Locais (Backend SQLite) ---
+# Mesmo formato do espelho: `sheet_row` faz o papel da linha da planilha, então
+# o índice id → linha e o motor de diferenças funcionam igual nos dois backends.
+
+
+def ensure_tab(sheet_name, header, db_path=None):
+    """Cria a tabela local da aba, ou acrescenta colunas que faltam (sem apagar dados)."""
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            meta = conn.execute("SELECT header FROM mirror_meta WHERE tab = ?", (sheet_name,)).fetchone()
+            if not meta:
+                _ensure_table(conn, sheet_name, list(header))
+            else:
+                atual = json.loads(meta[0])
+                faltando = [c for c in header if c not in atual]
+                for col in faltando:
+                    conn.execute(f'ALTER TABLE "{_table_name(sheet_name)}" ADD COLUMN "{col}"')
+                if faltando:
+                    conn.execute(
+                        "UPDATE mirror_meta SET header = ? WHERE tab = ?", (json.dumps(atual + faltando), sheet_name)
+                    )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def _insert_rows(conn, sheet_name, rows):
+    """Insere linhas ao final da tabela local, na transação em curso (sem commit)."""
+    header = json.loads(conn.execute("SELECT header FROM mirror_meta WHERE tab = ?", (sheet_name,)).fetchone()[0])
+    table = _table_name(sheet_name)
+    next_row = (conn.execute(f'SELECT MAX(sheet_row) FROM "{table}"').fetchone()[0] or 1) + 1
+    values = []
+    for i, row in enumerate(rows):
+        row = (list(row) + [''] * len(header))[:len(header)]
+        values.append([next_row + i, _row_hash(row)] + row)
+    placeholders = ", ".join("?" for _ in range(len(header) + 2))
+    conn.executemany(f'INSERT INTO "{table}" VALUES ({placeholders})', values)
+    return len(values)
+
+
+def append_local_rows(sheet_name, rows, db_path=None):
+    """Acrescenta linhas (na ordem do cabeçalho) ao final da tabela local. Retorna o nº de linhas."""
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            n_rows = _insert_rows(conn, sheet_name, rows)
+            _bump(conn, sheet_name)
+            conn.commit()
+            return n_rows
+        finally:
+            conn.close()
+
+
+def append_local_row_new_id(sheet_name, values, min_id=1, db_path=None):
+    """
+    Acrescenta uma linha com ID novo (1 + maior ID da tabela, ou `min_id`), calculado
+    e gravado na mesma transação: cadastros simultâneos não recebem o mesmo ID.
+    `values` é a linha sem o ID (a coluna 'id' é a primeira do cabeçalho). Retorna o ID.
+    """
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE") # Outros processos na mesma base esperam o commit
+            header = json.loads(conn.execute("SELECT header FROM mirror_meta WHERE tab = ?", (sheet_name,)).fetchone()[0])
+            table = _table_name(sheet_name)
+            max_id = conn.execute(f'SELECT MAX(CAST("id" AS INTEGER)) FROM "{table}"').fetchone()[0]
+            new_id = max(max_id or 0, int(min_id) - 1) + 1
+            next_row = (conn.execute(f'SELECT MAX(sheet_row) FROM "{table}"').fetchone()[0] or 1) + 1
+            row = ([new_id] + list(values) + [''] * len(header))[:len(header)]
+            placeholders = ", ".join("?" for _ in range(len(header) + 2))
+            conn.execute(f'INSERT INTO "{table}" VALUES ({placeholders})', [next_row, _row_hash(row)] + row)
+            _bump(conn, sheet_name)
+            conn.commit()
+            return new_id
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def update_local_cells(sheet_name, changes, db_path=None):
+    """Aplica alterações [(linha, coluna_base_1, valor)] na tabela local. Retorna o nº de células."""
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            header = json.loads(conn.execute("SELECT header FROM mirror_meta WHERE tab = ?", (sheet_name,)).fetchone()[0])
+            table = _table_name(sheet_name)
+            for sheet_row, col_number, value in changes:
+                conn.execute(
+                    f'UPDATE "{table}" SET "{header[col_number - 1]}" = ? WHERE sheet_row = ?', (value, sheet_row)
+                )
+            if changes:
+                _bump(conn, sheet_name)
+            conn.commit()
+            return len(changes)
+        finally:
+            conn.close()
+
+
+def delete_local_rows(sheet_name, rows, db_path=None):
+    """Exclui linhas da tabela local. Retorna o nº de linhas excluídas."""
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            cur = conn.executemany(
+                f'DELETE FROM "{_table_name(sheet_name)}" WHERE sheet_row = ?', [(r,) for r in rows]
+            )
+            if cur.rowcount:
+                _bump(conn, sheet_name)
+            conn.commit()
+            return cur.rowcount
+        finally:
+            conn.close()
+
+
+def replace_local_rows(sheet_name, rows, db_path=None):
+    """
+    Substitui todo o conteúdo da tabela local (reescrita completa). Retorna o nº de linhas.
+    Exclusão, reinserção e nova versão numa única transação: nenhum leitor (nem uma
+    falha no meio) vê a aba vazia.
+    """
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            conn.execute(f'DELETE FROM "{_table_name(sheet_name)}"')
+            n_rows = _insert_rows(conn, sheet_name, rows)
+            _bump(conn, sheet_name)
+            conn.commit()
+            return n_rows
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def read_cells(sheet_name, column, rows, db_path=None):
+    """Valores de uma coluna nas linhas indicadas: {linha: valor}."""
+    with _lock:
+        conn = _connect(db_path)
+        try:
+            placeholders = ", ".join("?" for _ in rows)
+            result = conn.execute(
+                f'SELECT sheet_row, "{column}" FROM "{_table_name(sheet_name)}" WHERE sheet_row IN ({placeholders})',
+                list(rows)
+            ).fetchall()
+        finally:
+            conn.close()
+    return dict(result)
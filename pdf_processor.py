@@ -1,7 +1,13 @@
 import requests
-from pdfminer.high_level import extract_text_to_fp
+from pdfminer.converter import TextConverter
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
 from io import StringIO, BytesIO
+from itertools import islice
+import hashlib
+import os
 import re
+import tempfile
 from datetime import datetime
 # A importação problemática do gensim foi removida aqui.
 
@@ -21,60 +27,248 @@ def extract_file_id(drive_link):
 
 # --- Função de Processamento Principal ---
 
-def process_pdf_bytes(pdf_bytes):
+METADATA_PAGES = 5 # Páginas extraídas de imediato para a sugestão de metadados (título, autor, resumo)
+
+def iter_pdf_pages(pdf_bytes, maxpages=0):
     """
-    Extrai texto limpo de um objeto BytesIO contendo o PDF.
+    Gera o texto bruto de cada página, à medida que o pdfminer a interpreta.
+    Concatenadas, as páginas são idênticas à saída de extract_text_to_fp.
     """
+    pdf_bytes.seek(0)
+    rsrcmgr = PDFResourceManager(caching=True)
+    output_string = StringIO()
+    device = TextConverter(rsrcmgr, output_string, codec='utf-8', laparams=None)
+    interpreter = PDFPageInterpreter(rsrcmgr, device)
     try:
-        output_string = StringIO()
-        
-        pdf_bytes.seek(0)
-        
-        extract_text_to_fp(pdf_bytes, output_string)
-        
-        raw_text = output_string.getvalue()
+        for page in PDFPage.get_pages(pdf_bytes, maxpages=maxpages, caching=True):
+            interpreter.process_page(page)
+            yield output_string.getvalue()
+            output_string.seek(0)
+            output_string.truncate(0)
+    finally:
+        device.close()
         output_string.close()
-        
-        # --- Etapa de Limpeza de Texto (PLN Básico) ---
-        # 1. Remover quebras de linha/hifenização de palavras (mantendo parágrafos)
-        text = re.sub(r'(\w+)-\s*\n\s*(\w+)', r'\1\2', raw_text)
-        
-        # 2. Substituir múltiplas quebras de linha (parágrafos) por um marcador único [PARAGRAPH]
-        text = re.sub(r'\n\s*\n', '[PARAGRAPH]', text)
-        
-        # 3. Substituir quebras de linha únicas (dentro da frase) e espaços por um único espaço
-        text = re.sub(r'\s*\n\s*', ' ', text)
-        
-        # 4. Normalizar os parágrafos de volta para quebras de linha
-        text = text.replace('[PARAGRAPH]', '\n\n')
-        
+
+# --- Normalização do Texto Extraído (Passada Única) ---
+# Mesma limpeza das 4 substituições de _clean_extracted_text_regex, com saída
+# idêntica, numa só passada sobre as páginas à medida que chegam: cada trecho
+# de espaços com quebra de linha é decidido uma vez (hifenização desfeita,
+# espaço simples ou parágrafo). Regras equivalentes às expressões originais:
+#  - "palavra-<espaços com \n>palavra" → palavras unidas. Como a expressão
+#    original consome a 2ª palavra inteira, uma palavra que acabou de ser unida
+#    não pode ser unida de novo ao hífen que a segue ("a-\nb-\nc" → "ab-\nc");
+#  - espaços com 2+ quebras → parágrafo; o que vem antes da 1ª e depois da
+#    última quebra é mantido como está;
+#  - espaços com 1 quebra → um espaço; espaços sem quebra ficam inalterados;
+#  - um "[PARAGRAPH]" literal no texto também vira parágrafo (efeito do
+#    marcador da versão original, preservado para não mudar a saída).
+
+_LINE_BREAK_RUN = re.compile(r'(-?)(\s*\n\s*)') # Hífen opcional + trecho de espaços com quebra de linha
+_LAST_WHITESPACE = re.compile(r'.*\s', re.S)
+_NON_WORD = re.compile(r'\W')
+_LEGACY_MARKER = '[PARAGRAPH]'
+
+def _is_word_char(c):
+    return c.isalnum() or c == '_' # Mesma definição de \w do módulo re
+
+class TextNormalizer:
+    """
+    Limpeza incremental do texto extraído: `feed(página)` a cada página e
+    `text()` para o texto limpo até ali (como se o documento terminasse nesse
+    ponto), sem interromper a alimentação. Só a última palavra de cada bloco
+    fica pendente, pois a decisão sobre ela depende do bloco seguinte.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._pending = ''
+        self._pending_joined = False # A parte pendente começa numa palavra recém-unida
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        buf = self._pending + chunk
+        # Corte após o último trecho de espaços seguido de texto: tudo antes dele já pode ser decidido
+        end = len(buf.rstrip())
+        last = _LAST_WHITESPACE.match(buf, 0, end) if end else None
+        if last is None:
+            self._pending = buf
+            return
+        out, self._pending_joined = self._normalize(buf, last.end(), self._pending_joined)
+        self._parts.append(out)
+        self._pending = buf[last.end():]
+
+    def text(self):
+        tail, _joined = self._normalize(self._pending, len(self._pending), self._pending_joined)
+        text = ''.join(self._parts) + tail
+        if _LEGACY_MARKER in text:
+            text = text.replace(_LEGACY_MARKER, '\n\n')
         return text.strip()
 
+    @staticmethod
+    def _normalize(buf, cut, joined):
+        """Normaliza buf[:cut]; devolve (texto, se a última união termina exatamente em `cut`)."""
+        last_join_end = 0 if joined else None
+        size = len(buf)
+
+        def replace(match):
+            nonlocal last_join_end
+            start, end = match.span()
+            run = match.group(2)
+            if match.group(1):
+                if (start and _is_word_char(buf[start - 1]) and end < size and _is_word_char(buf[end])
+                        and (last_join_end is None or _NON_WORD.search(buf, last_join_end, start))):
+                    last_join_end = end
+                    return ''
+                prefix = '-'
+            else:
+                prefix = ''
+            first = run.index('\n')
+            last = run.rindex('\n')
+            if first == last:
+                return prefix + ' '
+            return prefix + run[:first] + '\n\n' + run[last + 1:]
+
+        out = _LINE_BREAK_RUN.sub(replace, buf[:cut])
+        return out, last_join_end == cut
+
+def clean_extracted_text(raw_text):
+    """Limpeza do texto extraído: desfaz a hifenização e as quebras de linha, mantendo os parágrafos."""
+    normalizer = TextNormalizer()
+    normalizer.feed(raw_text)
+    return normalizer.text()
+
+def _clean_extracted_text_regex(raw_text):
+    """Implementação original em 4 passadas (referência para comparação e benchmark)."""
+    # --- Etapa de Limpeza de Texto (PLN Básico) ---
+    # 1. Remover quebras de linha/hifenização de palavras (mantendo parágrafos)
+    text = re.sub(r'(\w+)-\s*\n\s*(\w+)', r'\1\2', raw_text)
+    
+    # 2. Substituir múltiplas quebras de linha (parágrafos) por um marcador único [PARAGRAPH]
+    text = re.sub(r'\n\s*\n', '[PARAGRAPH]', text)
+    
+    # 3. Substituir quebras de linha únicas (dentro da frase) e espaços por um único espaço
+    text = re.sub(r'\s*\n\s*', ' ', text)
+    
+    # 4. Normalizar os parágrafos de volta para quebras de linha
+    text = text.replace('[PARAGRAPH]', '\n\n')
+    
+    return text.strip()
+
+def process_pdf_bytes(pdf_bytes, max_pages=0):
+    """
+    Extrai texto limpo de um objeto BytesIO contendo o PDF.
+    `max_pages` limita a extração às primeiras páginas (0 = documento inteiro).
+    """
+    try:
+        normalizer = TextNormalizer()
+        for page in iter_pdf_pages(pdf_bytes, maxpages=max_pages):
+            normalizer.feed(page)
+        return normalizer.text()
     except Exception as e:
         return f"Erro durante a extração do PDF: {e}"
 
+def process_pdf_in_stages(pdf_bytes, first_pages=METADATA_PAGES):
+    """
+    Extração em duas etapas, para não esperar o documento inteiro antes das sugestões:
+    devolve (texto limpo das primeiras páginas, função que continua a extração e
+    devolve o texto completo limpo). A função é None se o PDF já terminou nessas
+    páginas (ou se houve erro, informado no texto, como em process_pdf_bytes).
+    A função continua do ponto em que a primeira etapa parou (pode rodar em outra thread).
+    """
+    try:
+        pages = iter_pdf_pages(pdf_bytes)
+        normalizer = TextNormalizer() # As páginas iniciais não são limpas de novo na 2ª etapa
+        for page in islice(pages, first_pages):
+            normalizer.feed(page)
+        head_text = normalizer.text()
+        next_page = next(pages, None)
+    except Exception as e:
+        return f"Erro durante a extração do PDF: {e}", None
+    if next_page is None:
+        return head_text, None
+
+    def extract_rest():
+        try:
+            normalizer.feed(next_page)
+            for page in pages:
+                normalizer.feed(page)
+            return normalizer.text()
+        except Exception as e:
+            return f"Erro durante a extração do PDF: {e}"
+
+    return head_text, extract_rest
+
 # --- Função que Recebe o Link do Drive e Faz o Download ---
 
-def extract_text_from_drive_link(drive_download_link):
+MAX_DOWNLOAD_BYTES = int(os.environ.get('BIBLIOTECA_MAX_PDF_MB', 300)) * 1024 * 1024 # Limite por PDF baixado
+SPOOL_MEMORY_BYTES = 8 * 1024 * 1024 # Acima disso o download vai para um arquivo temporário em disco
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+DOWNLOAD_TIMEOUT = (15, 120) # Segundos: conexão, intervalo máximo entre blocos recebidos
+PDF_MAGIC = b'%PDF-'
+
+def download_pdf_from_drive_link(drive_download_link, max_bytes=MAX_DOWNLOAD_BYTES):
     """
-    Faz o download do PDF a partir do link do Drive e processa o texto.
+    Faz o download do PDF a partir do link do Drive, em blocos, para um arquivo
+    temporário (em memória até SPOOL_MEMORY_BYTES, depois em disco) que o pdfminer
+    lê diretamente. O SHA-256 é calculado durante o download. Interrompe cedo se
+    o conteúdo não começa como um PDF ou se passa de `max_bytes`.
+    Retorna (arquivo posicionado no início, sha256, None) ou (None, None, mensagem de erro).
     """
+    pdf_file = None
     try:
-        response = requests.get(drive_download_link, stream=True)
-        response.raise_for_status() 
-        
-        content_type = response.headers.get('Content-Type')
-        if 'pdf' not in content_type and 'octet-stream' not in content_type:
-             return f"Erro: O link não retornou um arquivo PDF. Tipo: {content_type}"
+        with requests.get(drive_download_link, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status() 
+            
+            content_type = response.headers.get('Content-Type') or ''
+            if 'pdf' not in content_type and 'octet-stream' not in content_type:
+                 return None, None, f"Erro: O link não retornou um arquivo PDF. Tipo: {content_type}"
 
-        pdf_bytes = BytesIO(response.content)
-        
-        return process_pdf_bytes(pdf_bytes)
+            tamanho_max_mb = max_bytes / (1024 * 1024)
+            declarado = response.headers.get('Content-Length')
+            if declarado and declarado.isdigit() and int(declarado) > max_bytes:
+                return None, None, f"Erro: O arquivo excede o limite de {tamanho_max_mb:.0f} MB para download."
+
+            pdf_file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+            digest = hashlib.sha256()
+            inicio = b''
+            total = 0
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                if len(inicio) < 1024:
+                    inicio += chunk[:1024]
+                    # O cabeçalho %PDF- pode vir após alguns bytes (a especificação tolera até 1 KB)
+                    if len(inicio) >= 1024 and PDF_MAGIC not in inicio:
+                        pdf_file.close()
+                        return None, None, "Erro: O link não retornou um arquivo PDF (conteúdo não começa com %PDF-). Verifique se é um link de DOWNLOAD DIRETO."
+                total += len(chunk)
+                if total > max_bytes:
+                    pdf_file.close()
+                    return None, None, f"Erro: O arquivo excede o limite de {tamanho_max_mb:.0f} MB para download."
+                digest.update(chunk)
+                pdf_file.write(chunk)
+
+        if PDF_MAGIC not in inicio: # Arquivos com menos de 1 KB
+            pdf_file.close()
+            return None, None, "Erro: O link não retornou um arquivo PDF (conteúdo não começa com %PDF-). Verifique se é um link de DOWNLOAD DIRETO."
+        pdf_file.seek(0)
+        return pdf_file, digest.hexdigest(), None
 
     except requests.exceptions.HTTPError as e:
-        return f"Erro HTTP ao baixar o arquivo: Certifique-se de que o link do Drive é de DOWNLOAD DIRETO e está configurado para acesso público. Erro: {e}"
+        return None, None, f"Erro HTTP ao baixar o arquivo: Certifique-se de que o link do Drive é de DOWNLOAD DIRETO e está configurado para acesso público. Erro: {e}"
     except Exception as e:
-        return f"Erro inesperado no download: {e}"
+        if pdf_file is not None:
+            pdf_file.close()
+        return None, None, f"Erro inesperado no download: {e}"
+
+def extract_text_from_drive_link(drive_download_link):
+    """
+    Faz o download do PDF a partir do link do Drive e processa o texto.
+    """
+    pdf_file, _sha256, erro = download_pdf_from_drive_link(drive_download_link)
+    if erro:
+        return erro
+    with pdf_file:
+        return process_pdf_bytes(pdf_file)
 
 # --- FUNÇÃO DE SUGESTÃO DE METADADOS (PLN AVANÇADO HEURÍSTICA - REVERTEU) ---
 
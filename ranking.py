@@ -0,0 +1,182 @@
+import re
+import unicodedata
+from functools import lru_cache
+import numpy as np
+from scipy import sparse
+
+from catalog_model import fold_text
+
+# --- Ranqueamento BM25 da Busca ---
+# Índice BM25F pré-calculado por versão do catálogo: cada campo tem um peso,
+# os textos são minúsculos, sem acentos e passam por um stemming leve para
+# português/espanhol. A matriz termo × documento já guarda a contribuição BM25
+# de cada termo; uma consulta soma poucas linhas esparsas e seleciona o top-k.
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+FIELD_WEIGHTS_BIBLIO = {'titulo': 3.0, 'autor': 2.0, 'tags': 2.0, 'resumo': 1.0}
+FIELD_WEIGHTS_DATASET = {'titulo': 3.0, 'descricao': 1.0}
+
+_TOKEN_RE = re.compile(r'\w+')
+
+# Sufixos de plural/flexão (já sem acentos), do mais longo para o mais curto.
+_SUFFIXES = (
+    ('ciones', 'cion'), ('coes', 'cao'), ('oes', 'ao'), ('aes', 'ao'), ('ais', 'al'),
+    ('eis', 'el'), ('ois', 'ol'), ('res', 'r'), ('les', 'l'), ('ns', 'm'), ('s', ''),
+)
+_MIN_STEM = 3
+_NOT_PLURAL_S = ('ss', 'us', 'is') # 'processus', 'analisis', 'congress' → o 's' final não é plural
+
+# Incrementar quando a análise (tokens, stemming) mudar: índices persistidos com termos antigos são refeitos
+ANALYZER_VERSION = 2
+
+
+@lru_cache(maxsize=200_000)
+def light_stem(token):
+    """
+    Stemming leve para português/espanhol: remove o plural e a vogal final de
+    gênero ('mineracoes' → 'mineraca', 'urbanos'/'urbana' → 'urban',
+    'desigualdades'/'desigualdad' → 'desigualdad', 'nacionais' → 'nacional').
+    Espera um token já sem acentos.
+    """
+    if len(token) <= _MIN_STEM + 1 or token.isdigit():
+        return token
+    for suffix, repl in _SUFFIXES:
+        if token.endswith(suffix):
+            if not repl and token.endswith(_NOT_PLURAL_S):
+                break
+            candidate = token[:-len(suffix)] + repl
+            if len(candidate) >= _MIN_STEM:
+                token = candidate
+            break
+    if len(token) > _MIN_STEM + 1 and token[-1] in 'aeo':
+        token = token[:-1]
+    return token
+
+
+@lru_cache(maxsize=200_000)
+def _term(token):
+    return light_stem(fold_text(token))
+
+
+def analyze(text):
+    """Texto → lista de termos (minúsculas, sem acentos, com stemming leve)."""
+    if not isinstance(text, str):
+        text = fold_text(text)
+    # Normaliza token a token (com cache): o vocabulário se repete muito mais que o texto
+    return [_term(t) for t in _TOKEN_RE.findall(unicodedata.normalize('NFC', text).lower())]
+
+
+def analyze_with_offsets(text):
+    """Gera os termos com a posição (início, fim) no texto, para destacar trechos. Espera texto já em NFC."""
+    for m in _TOKEN_RE.finditer(text):
+        yield _term(m.group().lower()), m.start(), m.end()
+
+
+class BM25Index:
+    """Índice BM25F sobre vários campos com pesos, com busca top-k."""
+
+    def __init__(self, fields, k1=BM25_K1, b=BM25_B):
+        """`fields` é {nome do campo: (lista de textos, peso)}; as listas têm o mesmo tamanho."""
+        self.n_docs = len(next(iter(fields.values()))[0]) if fields else 0
+        self.vocab = {}
+        combined = None
+
+        for texts, weight in fields.values():
+            rows, cols, data = [], [], []
+            lengths = np.zeros(self.n_docs, dtype=np.float64)
+            for doc, text in enumerate(texts):
+                terms = analyze(text)
+                lengths[doc] = len(terms)
+                counts = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+                for term, tf in counts.items():
+                    rows.append(self.vocab.setdefault(term, len(self.vocab)))
+                    cols.append(doc)
+                    data.append(tf)
+            if not data:
+                continue
+            # tf normalizado pelo comprimento do campo (BM25F), já multiplicado pelo peso
+            avg_len = lengths.mean() or 1.0
+            norm = weight / (1 - b + b * lengths / avg_len)
+            data = np.asarray(data, dtype=np.float64) * norm[cols]
+            field_matrix = sparse.csr_matrix(
+                (data, (rows, cols)), shape=(len(self.vocab), self.n_docs), dtype=np.float64
+            )
+            if combined is None:
+                combined = field_matrix
+            else:
+                combined.resize((len(self.vocab), self.n_docs))
+                combined = combined + field_matrix
+
+        if combined is None:
+            self.matrix = sparse.csr_matrix((0, self.n_docs), dtype=np.float32)
+            return
+
+        combined = combined.tocsr()
+        combined.resize((len(self.vocab), self.n_docs))
+        df = np.diff(combined.indptr) # nº de documentos por termo
+        idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+        # Saturação BM25 aplicada uma única vez: cada célula vira a contribuição final do termo
+        term_of_cell = np.repeat(np.arange(len(self.vocab)), df)
+        tf = combined.data
+        combined.data = idf[term_of_cell] * tf * (k1 + 1) / (tf + k1)
+        self.matrix = combined.astype(np.float32)
+
+    def to_arrays(self):
+        """Matriz CSR e vocabulário (termos em ordem, um por linha) para persistência."""
+        terms = sorted(self.vocab)
+        matrix = self.matrix[[self.vocab[t] for t in terms]] if terms else self.matrix
+        arrays = {
+            'data': matrix.data, 'indices': matrix.indices, 'indptr': matrix.indptr,
+            'vocab': '\n'.join(terms).encode('utf-8'),
+        }
+        return arrays, {'n_docs': self.n_docs, 'n_terms': len(terms)}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        """Reabre o índice sobre a matriz persistida (ex.: memory-mapped), sem recalcular o BM25."""
+        index = cls.__new__(cls)
+        index.n_docs = meta['n_docs']
+        terms = arrays['vocab'][:].decode('utf-8').split('\n') if meta['n_terms'] else []
+        index.vocab = {term: i for i, term in enumerate(terms)}
+        index.matrix = sparse.csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']), shape=(len(terms), index.n_docs), copy=False
+        )
+        return index
+
+    def scores(self, query, match_all=False):
+        """
+        Vetor denso de pontuações (uma por documento); zeros onde nenhum termo casa.
+        Com `match_all`, só pontuam os documentos que contêm todos os termos da consulta.
+        """
+        terms = set(analyze(query))
+        term_ids = sorted(self.vocab[t] for t in terms if t in self.vocab)
+        if not term_ids or (match_all and len(term_ids) < len(terms)):
+            return np.zeros(self.n_docs, dtype=np.float32)
+        rows = self.matrix[term_ids]
+        scores = np.asarray(rows.sum(axis=0)).ravel()
+        if match_all and len(term_ids) > 1:
+            scores[np.diff(rows.tocsc().indptr) < len(term_ids)] = 0
+        return scores
+
+    def top_k(self, query, k=20, candidates=None, match_all=False):
+        """
+        As k posições de maior pontuação (ordem decrescente) e suas pontuações.
+        `candidates` (máscara booleana) restringe o ranking, ex.: ao resultado dos filtros.
+        """
+        scores = self.scores(query, match_all)
+        if candidates is not None:
+            scores = np.where(candidates, scores, 0)
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > k:
+            hits = np.sort(hits[np.argpartition(-scores[hits], k - 1)[:k]]) # Empates na ordem do catálogo
+        order = hits[np.argsort(-scores[hits], kind='stable')]
+        return order, scores[order]
+
+
+def build_bm25_index(cat, field_weights):
+    """Constrói o índice BM25 a partir das colunas de texto do modelo do catálogo."""
+    return BM25Index({col: (cat[col].tolist(), weight) for col, weight in field_weights.items()})
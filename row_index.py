@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+from change_set import normalize_value
+
+# --- Índice id → Linha da Planilha e Exclusão em Lote ---
+# O índice é montado uma vez a partir do DataFrame carregado (cujo índice é a
+# posição da linha de dados), evitando varreduras df[df['id'] == id] a cada exclusão.
+# IDs repetidos na planilha (edição manual, cadastros concorrentes antigos) são
+# mantidos: cada ID aponta para todas as suas linhas, e excluí-lo remove todas.
+
+
+def build_row_index(df, verify_col='titulo'):
+    """
+    Monta o dicionário {id: [(linha_planilha, valor_de_conferência), ...]} a partir do DataFrame
+    carregado (mais de uma entrada quando o ID se repete). O valor de conferência (por padrão
+    o título) é usado para detectar se a planilha mudou.
+    """
+    if df.empty or 'id' not in df.columns:
+        return {}
+    verify_values = df[verify_col].tolist() if verify_col in df.columns else [''] * len(df)
+    index = {}
+    for i, pos, v in zip(df['id'], df.index, verify_values):
+        index.setdefault(normalize_value(i), []).append((int(pos) + 2, v)) # +2: cabeçalho e base 1
+    return index
+
+
+def duplicate_ids(row_index, ids=None):
+    """IDs (entre `ids`, ou todos) que aparecem em mais de uma linha da aba."""
+    keys = row_index if ids is None else [normalize_value(i) for i in ids]
+    return [k for k in dict.fromkeys(keys) if len(row_index.get(k, ())) > 1]
+
+
+def positions_by_id(id_values, ids):
+    """
+    Posições (0-based, em `id_values`) das linhas cujo ID está em `ids`, na ordem de `ids`.
+    Um ID repetido dá todas as suas linhas (na ordem da aba); IDs ausentes são ignorados.
+    """
+    wanted = list(dict.fromkeys(ids))
+    if not wanted:
+        return np.empty(0, dtype=np.int64)
+    rank = pd.Index(wanted).get_indexer(pd.Index(id_values)) # Só `wanted` precisa ser único
+    positions = np.flatnonzero(rank >= 0)
+    return positions[np.argsort(rank[positions], kind='stable')]
+
+
+def lookup_rows(row_index, ids):
+    """
+    Converte ids em linhas da planilha (todas as linhas de um ID repetido).
+    Retorna ({linha: valor_de_conferência}, ids_nao_encontrados).
+    """
+    rows, missing = {}, []
+    for i in ids:
+        entries = row_index.get(normalize_value(i))
+        if not entries:
+            missing.append(i)
+        else:
+            rows.update(entries)
+    return rows, missing
+
+
+def verify_rows(worksheet, col_number, expected):
+    """
+    Confere, com uma única leitura de coluna, se as linhas ainda contêm os valores esperados.
+    `expected` é {linha_planilha: valor_no_snapshot}. Retorna False se a planilha mudou.
+    """
+    fresh = worksheet.col_values(col_number)
+    for row, value in expected.items():
+        fresh_value = fresh[row - 1] if row <= len(fresh) else '' # col_values omite células vazias no fim
+        if normalize_value(fresh_value) != normalize_value(value):
+            return False
+    return True
+
+
+def merge_row_ranges(rows):
+    """Agrupa linhas contíguas em intervalos [inicio, fim] (inclusivos), em ordem decrescente."""
+    ranges = []
+    for row in sorted(set(rows)):
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return [tuple(r) for r in reversed(ranges)]
+
+
+def delete_rows_batch(spreadsheet, worksheet, rows):
+    """
+    Exclui as linhas com o menor número possível de requisições deleteDimension,
+    todas em uma única chamada batch_update. Os intervalos vão de baixo para cima
+    para que uma exclusão não desloque as seguintes. Retorna o nº de linhas excluídas.
+    """
+    ranges = merge_row_ranges(rows)
+    if not ranges:
+        return 0
+    requests_body = [
+        {
+            'deleteDimension': {
+                'range': {
+                    'sheetId': worksheet.id,
+                    'dimension': 'ROWS',
+                    'startIndex': start - 1, # Base 0, inclusivo
+                    'endIndex': end          # Base 0, exclusivo
+                }
+            }
+        }
+        for start, end in ranges
+    ]
+    spreadsheet.batch_update({'requests': requests_body})
+    return sum(end - start + 1 for start, end in ranges)
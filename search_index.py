@@ -0,0 +1,499 @@
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from catalog_model import fold_text
+
+# --- Índice Invertido para a Busca da Biblioteca Principal ---
+# Construído uma vez por versão do catálogo a partir das colunas busca_*
+# (minúsculas e sem acentos). As consultas devolvem as posições das linhas do
+# modelo do catálogo, sem varrer o DataFrame inteiro a cada rerun.
+
+_TOKEN_RE = re.compile(r'\w+')
+_FIELD_SEP = '\x00' # Separa os campos de um documento (nenhum termo de busca o contém)
+_TERM_CACHE_SIZE = 256
+
+
+class TextIndex:
+    """
+    Índice invertido termo → posições das linhas.
+
+    Semântica igual à do filtro por substring: um termo de busca casa com um
+    documento se aparecer como substring de algum dos campos indexados. Para
+    isso, o termo é procurado dentro do vocabulário (uma busca em C sobre o
+    vocabulário concatenado) e as listas de postings dos termos encontrados são unidas.
+
+    Tudo fica em blocos contíguos (vocabulário e textos em UTF-8, postings
+    concatenadas com offsets), o que permite persistir o índice e reabri-lo
+    via memory-map (ver index_store).
+    """
+
+    def __init__(self, fields):
+        """`fields` é uma lista de colunas (listas de strings já normalizadas com fold_text), uma por campo."""
+        self.n_docs = len(fields[0]) if fields else 0
+        doc_texts = [_FIELD_SEP.join(values) for values in zip(*fields)] if fields else []
+
+        term_docs = {}
+        for doc, text in enumerate(doc_texts):
+            for token in set(_TOKEN_RE.findall(text)):
+                term_docs.setdefault(token, []).append(doc)
+
+        vocab = sorted(term_docs)
+        encoded = [term.encode('utf-8') for term in vocab]
+        self._blob = b'\n'.join(encoded)
+        self._starts = _offsets([len(term) + 1 for term in encoded])[:-1]
+        self._post_ptr = _offsets([len(term_docs[t]) for t in vocab])
+        self._post_data = np.fromiter(
+            (doc for term in vocab for doc in term_docs[term]), dtype=np.int32, count=int(self._post_ptr[-1])
+        )
+        encoded = [text.encode('utf-8') for text in doc_texts]
+        self._docs_blob = b''.join(encoded)
+        self._doc_ptr = _offsets([len(text) for text in encoded])
+        self._term_cache = OrderedDict()
+        self._cache_lock = threading.Lock() # Instância compartilhada entre as sessões (cache_resource)
+
+    def to_arrays(self):
+        """Blocos do índice para persistência: (arrays/bytes por nome, metadados)."""
+        arrays = {
+            'blob': self._blob, 'starts': self._starts, 'post_data': self._post_data,
+            'post_ptr': self._post_ptr, 'docs_blob': self._docs_blob, 'doc_ptr': self._doc_ptr,
+        }
+        return arrays, {'n_docs': self.n_docs}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        """Reabre o índice sobre blocos já prontos (ex.: memory-mapped), sem reconstruir nada."""
+        index = cls.__new__(cls)
+        index.n_docs = meta['n_docs']
+        index._blob, index._starts = arrays['blob'], arrays['starts']
+        index._post_data, index._post_ptr = arrays['post_data'], arrays['post_ptr']
+        index._docs_blob, index._doc_ptr = arrays['docs_blob'], arrays['doc_ptr']
+        index._term_cache = OrderedDict()
+        index._cache_lock = threading.Lock()
+        return index
+
+    def _postings(self, term_id):
+        return self._post_data[self._post_ptr[term_id]:self._post_ptr[term_id + 1]]
+
+    def _doc_text(self, doc):
+        return self._docs_blob[self._doc_ptr[doc]:self._doc_ptr[doc + 1]].decode('utf-8')
+
+    def _docs_with_substring(self, sub):
+        """Posições dos documentos em que algum token contém `sub` (só caracteres de palavra)."""
+        with self._cache_lock:
+            cached = self._term_cache.get(sub)
+            if cached is not None:
+                self._term_cache.move_to_end(sub)
+                return cached
+
+        # Busca sobre o vocabulário em UTF-8: uma substring em bytes é também uma substring em caracteres
+        needle = sub.encode('utf-8')
+        term_ids = []
+        pos = self._blob.find(needle)
+        while pos != -1:
+            term_id = int(np.searchsorted(self._starts, pos, side='right')) - 1
+            term_ids.append(term_id)
+            # Pula para o próximo termo do vocabulário
+            next_start = int(self._starts[term_id + 1]) if term_id + 1 < len(self._starts) else len(self._blob)
+            pos = self._blob.find(needle, next_start)
+
+        if not term_ids:
+            docs = np.empty(0, dtype=np.int32)
+        elif len(term_ids) == 1:
+            docs = self._postings(term_ids[0])
+        else:
+            docs = np.unique(np.concatenate([self._postings(t) for t in term_ids]))
+
+        # A busca no vocabulário roda fora do lock; só a leitura/inserção/descarte do LRU é serializada
+        with self._cache_lock:
+            self._term_cache[sub] = docs
+            self._term_cache.move_to_end(sub)
+            if len(self._term_cache) > _TERM_CACHE_SIZE:
+                self._term_cache.popitem(last=False)
+        return docs
+
+    def _docs_with_term(self, term):
+        """Documentos em que `term` aparece como substring de algum campo."""
+        parts = _TOKEN_RE.findall(term)
+        if not parts:
+            return self._verify(np.arange(self.n_docs, dtype=np.int32), term)
+
+        docs = self._docs_with_substring(parts[0])
+        for part in parts[1:]:
+            docs = np.intersect1d(docs, self._docs_with_substring(part), assume_unique=True)
+
+        # Termo só com caracteres de palavra: o resultado do índice já é exato.
+        if len(parts) == 1 and parts[0] == term:
+            return docs
+        return self._verify(docs, term)
+
+    def _verify(self, docs, text):
+        """Confere a substring nos candidatos (termos com pontuação ou frases entre aspas)."""
+        return np.asarray([d for d in docs if text in self._doc_text(d)], dtype=np.int32)
+
+    def search(self, query):
+        """
+        Posições (ordenadas) das linhas que casam com a consulta.
+        Vários termos separados por espaço: todos precisam aparecer (AND), em qualquer campo.
+        Consulta entre aspas ("desigualdade urbana"): a frase precisa aparecer inteira em um campo.
+        """
+        query = fold_text(query).strip()
+        if not query:
+            return np.arange(self.n_docs, dtype=np.int32)
+
+        phrase = len(query) > 1 and query.startswith('"') and query.endswith('"')
+        if phrase:
+            query = query[1:-1].strip()
+
+        docs = None
+        for term in query.split():
+            term_docs = self._docs_with_term(term)
+            docs = term_docs if docs is None else np.intersect1d(docs, term_docs, assume_unique=True)
+            if not len(docs):
+                break
+
+        if phrase and len(query.split()) > 1:
+            docs = self._verify(docs, query)
+        return docs
+
+    def search_mask(self, query):
+        """Mesma busca, como máscara booleana alinhada às linhas do catálogo."""
+        mask = np.zeros(self.n_docs, dtype=bool)
+        mask[self.search(query)] = True
+        return mask
+
+
+def _offsets(sizes):
+    """Offsets de início de cada bloco (e o total no fim) a partir dos tamanhos."""
+    offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    return offsets
+
+
+def build_text_index(cat, search_columns):
+    """Constrói o índice a partir das colunas busca_* do modelo do catálogo."""
+    return TextIndex([cat[col].tolist() for col in search_columns])
+
+
+class TagIndex:
+    """
+    Listas de postings por tag: tag → posições (ordenadas) das linhas que a contêm.
+    Serve as opções do filtro de temas (com contagens) e combina vários temas
+    com E/OU por interseção/união de arrays, sem percorrer as linhas.
+    """
+
+    def __init__(self, tags_lists):
+        self.n_docs = len(tags_lists)
+        tag_docs = {}
+        for doc, tags in enumerate(tags_lists):
+            for tag in set(tags):
+                tag_docs.setdefault(tag, []).append(doc)
+        self.tags = sorted(tag_docs)
+        self.postings = {tag: np.asarray(docs, dtype=np.int32) for tag, docs in tag_docs.items()}
+        self.counts = {tag: len(docs) for tag, docs in tag_docs.items()}
+
+    def to_arrays(self):
+        """Postings concatenadas na ordem de `tags`, com offsets (ver TextIndex.to_arrays)."""
+        data = np.concatenate([self.postings[t] for t in self.tags]) if self.tags else np.empty(0, dtype=np.int32)
+        arrays = {'post_data': data, 'post_ptr': _offsets([self.counts[t] for t in self.tags])}
+        return arrays, {'n_docs': self.n_docs, 'tags': self.tags}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        index = cls.__new__(cls)
+        index.n_docs = meta['n_docs']
+        index.tags = list(meta['tags'])
+        data, ptr = arrays['post_data'], arrays['post_ptr']
+        index.postings = {tag: data[ptr[i]:ptr[i + 1]] for i, tag in enumerate(index.tags)}
+        index.counts = {tag: int(ptr[i + 1] - ptr[i]) for i, tag in enumerate(index.tags)}
+        return index
+
+    def search(self, tags, match_all=True):
+        """Posições das linhas com todas (match_all) ou alguma das tags."""
+        lists = [self.postings.get(tag, np.empty(0, dtype=np.int32)) for tag in tags]
+        if not lists:
+            return np.arange(self.n_docs, dtype=np.int32)
+        if match_all:
+            docs = lists[0]
+            for other in sorted(lists[1:], key=len): # Menores primeiro: interseções mais baratas
+                if not len(docs):
+                    break
+                docs = np.intersect1d(docs, other, assume_unique=True)
+            return docs
+        return np.unique(np.concatenate(lists))
+
+    def search_mask(self, tags, match_all=True):
+        mask = np.zeros(self.n_docs, dtype=bool)
+        mask[self.search(tags, match_all)] = True
+        return mask
+
+
+def build_tag_index(cat):
+    """Constrói o índice de tags a partir da coluna tags_lista do modelo do catálogo."""
+    return TagIndex(cat['tags_lista'].tolist())
+
+
+def edit_distance(a, b, max_dist):
+    """
+    Distância de edição com transposição de letras vizinhas ('urbnaa' → 'urbana' custa 1).
+    Limitada: retorna max_dist + 1 assim que o limite é ultrapassado.
+    """
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > max_dist:
+            return max_dist + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+def _trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(term):
+    """Tolerância a erros de digitação conforme o tamanho do termo."""
+    return 0 if len(term) < 4 else 1 if len(term) < 7 else 2
+
+
+class TrigramIndex:
+    """
+    Busca tolerante a erros de digitação ('Harvy' → 'harvey', 'Quijana' → 'quijano').
+    Trigramas de caracteres apontam para as palavras do vocabulário; só as palavras
+    com trigramas em comum são comparadas por distância de edição.
+    """
+
+    MAX_CANDIDATES = 64 # Palavras com mais trigramas em comum verificadas por termo
+
+    def __init__(self, fields):
+        """`fields`: listas de strings já normalizadas com fold_text (ex.: busca_titulo e busca_autor)."""
+        self.n_docs = len(fields[0]) if fields else 0
+        word_docs = {}
+        for values in fields:
+            for doc, text in enumerate(values):
+                for word in set(_TOKEN_RE.findall(text)):
+                    word_docs.setdefault(word, set()).add(doc)
+
+        self.words = sorted(word_docs)
+        self.postings = [np.asarray(sorted(word_docs[w]), dtype=np.int32) for w in self.words]
+        gram_words = {}
+        for word_id, word in enumerate(self.words):
+            for gram in _trigrams(word):
+                gram_words.setdefault(gram, []).append(word_id)
+        self._grams = {g: np.asarray(ids, dtype=np.int32) for g, ids in gram_words.items()}
+        self._word_ids = {w: i for i, w in enumerate(self.words)}
+
+    def similar_words(self, term, max_dist=None):
+        """Palavras do vocabulário a até `max_dist` edições: lista de (palavra, distância, nº de documentos)."""
+        term = fold_text(term)
+        max_dist = max_edits(term) if max_dist is None else max_dist
+        if term in self._word_ids and max_dist == 0:
+            return [(term, 0, len(self.postings[self._word_ids[term]]))]
+
+        lists = [self._grams[g] for g in _trigrams(term) if g in self._grams]
+        if not lists:
+            return []
+        overlap = np.bincount(np.concatenate(lists), minlength=len(self.words))
+        # Cada edição (ou transposição) destrói no máximo 4 trigramas: filtro barato antes da distância de edição
+        needed = max(1, len(_trigrams(term)) - 4 * max_dist)
+        candidates = np.flatnonzero(overlap >= needed)
+        if len(candidates) > self.MAX_CANDIDATES:
+            candidates = candidates[np.argpartition(-overlap[candidates], self.MAX_CANDIDATES - 1)[:self.MAX_CANDIDATES]]
+
+        matches = []
+        for word_id in candidates:
+            word = self.words[word_id]
+            dist = edit_distance(term, word, max_dist)
+            if dist <= max_dist:
+                matches.append((word, dist, len(self.postings[word_id])))
+        matches.sort(key=lambda m: (m[1], -m[2], m[0]))
+        return matches
+
+    def suggest(self, query, k=5):
+        """Sugestões de correção da consulta inteira, ordenadas (menos edições, termos mais frequentes)."""
+        terms = fold_text(query).split()
+        options = []
+        for term in terms:
+            similar = self.similar_words(term) if max_edits(term) else []
+            options.append([w for w, _d, _n in similar[:k]] or [term])
+        suggestions = []
+        for i in range(max(len(o) for o in options) if options else 0):
+            words = [o[min(i, len(o) - 1)] for o in options]
+            suggestion = ' '.join(words)
+            if suggestion != ' '.join(terms) and suggestion not in suggestions:
+                suggestions.append(suggestion)
+        return suggestions[:k]
+
+    def search(self, query):
+        """Posições das linhas em que todos os termos aparecem, admitindo erros de digitação."""
+        docs = None
+        for term in fold_text(query).split():
+            similar = self.similar_words(term)
+            if not similar:
+                return np.empty(0, dtype=np.int32)
+            term_docs = np.unique(np.concatenate([self.postings[self._word_ids[w]] for w, _d, _n in similar]))
+            docs = term_docs if docs is None else np.intersect1d(docs, term_docs, assume_unique=True)
+        return docs if docs is not None else np.arange(self.n_docs, dtype=np.int32)
+
+    def search_mask(self, query):
+        mask = np.zeros(self.n_docs, dtype=bool)
+        mask[self.search(query)] = True
+        return mask
+
+
+def build_trigram_index(cat, columns):
+    """Constrói o índice de trigramas a partir de colunas busca_* do modelo do catálogo."""
+    return TrigramIndex([cat[col].tolist() for col in columns])
+
+
+class ResultSet:
+    """
+    Resultado ordenado de uma busca unificada: posições (no modelo do catálogo) das
+    referências, seguidas das dos datasets. Só a página visível é materializada.
+    """
+
+    def __init__(self, biblio_positions, dataset_positions, notice=None):
+        self.biblio = np.asarray(biblio_positions, dtype=np.int64)
+        self.datasets = np.asarray(dataset_positions, dtype=np.int64)
+        self.notice = notice # Mensagem para o usuário (ex.: resultados aproximados)
+
+    @property
+    def total(self):
+        return len(self.biblio) + len(self.datasets)
+
+    def n_pages(self, page_size):
+        return max(1, -(-self.total // page_size))
+
+    def filter_biblio(self, mask):
+        """Mesmo resultado (e mesma ordem), mantendo só as referências marcadas em `mask`."""
+        return ResultSet(self.biblio[mask[self.biblio]], self.datasets, self.notice)
+
+    def page(self, number, page_size):
+        """Fatias (referências, datasets) da página `number` (a partir de 0)."""
+        start = number * page_size
+        stop = start + page_size
+        n_biblio = len(self.biblio)
+        biblio = self.biblio[start:stop]
+        datasets = self.datasets[max(0, start - n_biblio):max(0, stop - n_biblio)]
+        return biblio, datasets
+
+
+class QueryCache:
+    """
+    Cache LRU de resultados de busca, compartilhado entre sessões. As entradas
+    valem para uma tupla de versões das abas: quando qualquer versão muda, o
+    cache inteiro é descartado na próxima consulta.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._versions = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, versions, compute):
+        """Resultado em cache para (key, versions); senão chama `compute()` e guarda."""
+        with self._lock:
+            if versions != self._versions:
+                self._entries.clear()
+                self._versions = versions
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        result = compute() # Fora do lock: buscas distintas não se bloqueiam
+        with self._lock:
+            if versions == self._versions:
+                self._entries[key] = result
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entradas': len(self._entries), 'acertos': self.hits, 'faltas': self.misses,
+                'taxa_acerto': self.hits / total if total else 0.0,
+            }
+
+
+class FacetIndex:
+    """
+    Facetas da bibliografia (tipo, ano e tags) pré-calculadas por versão do catálogo:
+    códigos de tipo, anos inteiros e pares (tag, linha) achatados das listas de postings.
+    Filtros e contagens são operações vetoriais sobre esses arrays, sem groupby.
+    """
+
+    def __init__(self, cat, tag_index):
+        self.n_docs = len(cat)
+        self.tipos = [str(t) for t in cat['tipo'].cat.categories]
+        self._tipo_codes = cat['tipo'].cat.codes.to_numpy()
+        self._anos = cat['ano'].fillna(-1).to_numpy(dtype=np.int64)
+        validos = self._anos[self._anos >= 0]
+        self.ano_min = int(validos.min()) if len(validos) else None
+        self.ano_max = int(validos.max()) if len(validos) else None
+
+        self.tag_index = tag_index
+        self.tags = tag_index.tags
+        sizes = [len(tag_index.postings[t]) for t in self.tags]
+        self._tag_ids = np.repeat(np.arange(len(self.tags), dtype=np.int32), sizes)
+        self._tag_docs = (
+            np.concatenate([tag_index.postings[t] for t in self.tags]) if self.tags else np.empty(0, dtype=np.int32)
+        )
+
+    def _tipo_mask(self, tipos):
+        codes = [self.tipos.index(t) for t in tipos if t in self.tipos]
+        return np.isin(self._tipo_codes, codes)
+
+    def _ano_mask(self, anos):
+        lo, hi = anos
+        return (self._anos >= lo) & (self._anos <= hi)
+
+    def mask(self, tipos=(), anos=None, tags=(), match_all=True, exclude=None):
+        """Máscara das linhas que atendem às facetas selecionadas (`exclude` ignora uma delas)."""
+        mask = np.ones(self.n_docs, dtype=bool)
+        if tipos and exclude != 'tipo':
+            mask &= self._tipo_mask(tipos)
+        if anos is not None and exclude != 'ano':
+            mask &= self._ano_mask(anos)
+        if tags and exclude != 'tags':
+            mask &= self.tag_index.search_mask(tags, match_all)
+        return mask
+
+    def counts(self, base, tipos=(), anos=None, tags=(), match_all=True):
+        """
+        Contagens por valor de cada faceta dentro de `base` (máscara do resultado da busca).
+        Cada faceta é contada com as demais aplicadas; tipos e temas em modo OU não restringem a si mesmos.
+        """
+        base = np.asarray(base, dtype=bool)
+        sem_tipo = base & self.mask(tipos, anos, tags, match_all, exclude='tipo')
+        tipo_counts = np.bincount(self._tipo_codes[sem_tipo & (self._tipo_codes >= 0)], minlength=len(self.tipos))
+
+        sem_tags = base & self.mask(tipos, anos, tags if match_all else (), match_all, exclude=None if match_all else 'tags')
+        tag_counts = np.bincount(self._tag_ids[sem_tags[self._tag_docs]], minlength=len(self.tags))
+
+        sem_ano = base & self.mask(tipos, anos, tags, match_all, exclude='ano')
+        return {
+            'tipo': dict(zip(self.tipos, tipo_counts.tolist())),
+            'tags': dict(zip(self.tags, tag_counts.tolist())),
+            'ano': int((sem_ano & self._ano_mask(anos)).sum()) if anos is not None else int(sem_ano.sum()),
+        }
+
+
+def build_facet_index(cat, tag_index):
+    return FacetIndex(cat, tag_index)
@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from gspread.exceptions import APIError
+
+# --- Cliente do Google Sheets com Controle de Cota e Métricas ---
+# Envolve o handle da planilha devolvido por connect_to_sheets(): toda chamada à
+# API passa por um token bucket compartilhado (chamadas esperam na fila em vez
+# de estourar a cota), leituras idênticas simultâneas são coalescidas em uma só
+# requisição e cada tipo de operação tem contagem e latência registradas.
+
+SHEETS_REQUESTS_PER_MINUTE = int(os.environ.get('BIBLIOTECA_SHEETS_RPM', 55)) # Cota do Sheets: 60/min por usuário
+SHEETS_BURST = int(os.environ.get('BIBLIOTECA_SHEETS_BURST', 10))
+MAX_QUOTA_RETRIES = 3 # Novas tentativas quando, mesmo assim, a API responde 429
+
+# Métodos que leem dados (podem ser coalescidos); os demais são tratados como escrita.
+READ_METHODS = {
+    'get_all_records', 'get_all_values', 'get_values', 'get', 'row_values', 'col_values',
+    'acell', 'cell', 'batch_get', 'get_lastUpdateTime', 'fetch_sheet_metadata',
+}
+WRITE_METHODS = {
+    'update', 'batch_update', 'append_row', 'append_rows', 'delete_rows', 'insert_row',
+    'insert_rows', 'update_cell', 'update_cells', 'batch_clear', 'clear', 'values_batch_update',
+}
+
+
+class TokenBucket:
+    """Token bucket thread-safe: `acquire()` bloqueia até haver um token disponível."""
+
+    def __init__(self, rate_per_minute=SHEETS_REQUESTS_PER_MINUTE, capacity=SHEETS_BURST):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Consome um token, esperando se necessário. Retorna o tempo de espera em segundos."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class CallMetrics:
+    """Contagem, latência, erros e espera na fila por tipo de operação."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ops = {}
+
+    def record(self, op, latency, waited=0.0, error=False, coalesced=False):
+        with self._lock:
+            m = self._ops.setdefault(op, {
+                'chamadas': 0, 'coalescidas': 0, 'erros': 0,
+                'latencia_total_ms': 0.0, 'latencia_max_ms': 0.0, 'espera_fila_ms': 0.0
+            })
+            if coalesced:
+                m['coalescidas'] += 1
+                return
+            m['chamadas'] += 1
+            m['erros'] += int(error)
+            m['latencia_total_ms'] += latency * 1000
+            m['latencia_max_ms'] = max(m['latencia_max_ms'], latency * 1000)
+            m['espera_fila_ms'] += waited * 1000
+
+    def snapshot(self):
+        """Lista de dicionários (uma linha por operação), pronta para virar DataFrame."""
+        with self._lock:
+            rows = []
+            for op, m in sorted(self._ops.items()):
+                row = {'operacao': op, **m}
+                row['latencia_media_ms'] = m['latencia_total_ms'] / m['chamadas'] if m['chamadas'] else 0.0
+                rows.append(row)
+            return rows
+
+
+class _InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class QuotaAwareClient:
+    """Estado compartilhado: token bucket, métricas e leituras em andamento."""
+
+    def __init__(self, bucket=None, metrics=None):
+        self.bucket = bucket or TokenBucket()
+        self.metrics = metrics or CallMetrics()
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _call_api(self, op, fn):
+        for attempt in range(MAX_QUOTA_RETRIES + 1):
+            waited = self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                result = fn()
+            except APIError as e:
+                self.metrics.record(op, time.perf_counter() - start, waited, error=True)
+                if e.code != 429 or attempt == MAX_QUOTA_RETRIES:
+                    raise
+                time.sleep(2 ** attempt)
+                continue
+            except Exception:
+                self.metrics.record(op, time.perf_counter() - start, waited, error=True)
+                raise
+            self.metrics.record(op, time.perf_counter() - start, waited)
+            return result
+
+    def call(self, op, fn, coalesce_key=None):
+        """Executa uma chamada à API respeitando a cota. Leituras com a mesma chave compartilham a resposta."""
+        if coalesce_key is None:
+            return self._call_api(op, fn)
+
+        with self._lock:
+            inflight = self._inflight.get(coalesce_key)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[coalesce_key] = _InFlight()
+
+        if leader:
+            try:
+                inflight.result = self._call_api(op, fn)
+            except Exception as e:
+                inflight.error = e
+            finally:
+                with self._lock:
+                    del self._inflight[coalesce_key]
+                inflight.event.set()
+        else:
+            inflight.event.wait()
+            self.metrics.record(op, 0.0, coalesced=True)
+
+        if inflight.error is not None:
+            raise inflight.error
+        return inflight.result
+
+
+def _key(obj_key, op, args, kwargs):
+    try:
+        key = (obj_key, op, args, tuple(sorted(kwargs.items())))
+        hash(key)
+        return key
+    except TypeError:
+        return None # Argumentos não hasheáveis: sem coalescência
+
+
+class _Proxy:
+    """Repassa atributos ao objeto do gspread, interceptando os métodos que chamam a API."""
+
+    def __init__(self, target, client, prefix):
+        self._target = target
+        self._client = client
+        self._prefix = prefix
+
+    def _obj_key(self):
+        return id(self._target)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or (name not in READ_METHODS and name not in WRITE_METHODS):
+            return attr
+
+        op = f"{self._prefix}.{name}"
+
+        def wrapped(*args, **kwargs):
+            coalesce_key = _key(self._obj_key(), name, args, kwargs) if name in READ_METHODS else None
+            return self._client.call(op, lambda: attr(*args, **kwargs), coalesce_key)
+
+        return wrapped
+
+
+class QuotaAwareWorksheet(_Proxy):
+    def __init__(self, worksheet, client):
+        super().__init__(worksheet, client, 'worksheet')
+
+    def _obj_key(self):
+        return ('worksheet', self._target.spreadsheet.id, self._target.id)
+
+
+class QuotaAwareSpreadsheet(_Proxy):
+    """
+    Planilha com cota controlada. Os handles de aba ficam em cache: no gspread,
+    cada spreadsheet.worksheet(nome) custa uma requisição de metadados.
+    """
+
+    def __init__(self, spreadsheet, client=None):
+        super().__init__(spreadsheet, client or QuotaAwareClient(), 'spreadsheet')
+        self._worksheets = {}
+        self._ws_lock = threading.Lock()
+
+    @property
+    def metrics(self):
+        return self._client.metrics
+
+    def _obj_key(self):
+        return ('spreadsheet', self._target.id)
+
+    def worksheet(self, title):
+        with self._ws_lock:
+            cached = self._worksheets.get(title)
+        if cached is not None:
+            return cached
+        ws = self._client.call(
+            'spreadsheet.worksheet', lambda: self._target.worksheet(title), ('worksheet_lookup', self._target.id, title)
+        )
+        wrapped = QuotaAwareWorksheet(ws, self._client)
+        with self._ws_lock:
+            self._worksheets[title] = wrapped
+        return wrapped
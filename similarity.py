@@ -0,0 +1,205 @@
+import os
+import hashlib
+import threading
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from ranking import analyze, ANALYZER_VERSION
+import content_store
+
+# --- Obras Relacionadas (TF-IDF + Similaridade do Cosseno) ---
+# Cada referência vira um vetor de contagens (HashingVectorizer: sem vocabulário
+# a ajustar) sobre o título, o resumo e, quando disponível no cadastro, o texto
+# extraído do PDF. A matriz de contagens e as frequências de documento (df)
+# ficam em disco; novas referências só acrescentam linhas, sem reajuste. O peso
+# TF-IDF é aplicado sobre as contagens sempre que o conjunto muda.
+#
+# Cadastros avulsos não regravam a matriz inteira: as linhas novas vão para um
+# diário (<arquivo>.journal.npz), reaplicado na carga e incorporado ao arquivo
+# principal na próxima gravação completa (sync com mudanças, ou diário cheio).
+
+SIMILARITY_FILE = os.environ.get('BIBLIOTECA_SIMILARITY_FILE', 'biblioteca_similares.npz')
+N_FEATURES = 2 ** 18
+MAX_TEXT_CHARS = 200_000 # Limite do texto extraído por documento (PDFs muito longos)
+JOURNAL_MAX_ROWS = 1000 # Linhas no diário acima das quais a gravação compacta tudo no arquivo principal
+
+_vectorizer = HashingVectorizer(
+    analyzer=analyze, n_features=N_FEATURES, alternate_sign=False, norm=None, dtype=np.float32
+)
+
+
+def _catalog_text(titulo, resumo):
+    return f"{titulo or ''}\n{resumo or ''}"
+
+
+def _text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _read_counts(data):
+    return sparse.csr_matrix((data['data'], data['indices'], data['indptr']), shape=tuple(data['shape']))
+
+
+def _write_npz(path, counts, **arrays):
+    """Grava a matriz de contagens (e os demais arrays) num arquivo temporário e o publica com uma renomeação."""
+    tmp = path + '.tmp.npz'
+    np.savez(
+        tmp, data=counts.data, indices=counts.indices, indptr=counts.indptr, shape=np.asarray(counts.shape),
+        analyzer=np.asarray(ANALYZER_VERSION), **arrays
+    )
+    os.replace(tmp, path)
+
+
+class SimilarityIndex:
+    """Matriz de contagens documento × feature persistida em disco, com consulta por cosseno."""
+
+    def __init__(self, path=SIMILARITY_FILE, content_db_path=None):
+        self.path = path
+        self.journal_path = path + '.journal.npz'
+        self.content_db_path = content_db_path # Textos extraídos dos PDFs (content_store)
+        self._lock = threading.RLock()
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.hashes = np.empty(0, dtype='<U16') # Hash do título + resumo (detecta edições)
+        self.counts = sparse.csr_matrix((0, N_FEATURES), dtype=np.float32)
+        self.df = np.zeros(N_FEATURES, dtype=np.int32)
+        self._weighted = None
+        self._journal = [] # (ids, contagens, hashes) acrescentados desde a última gravação completa
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                with np.load(self.path) as data:
+                    if 'analyzer' not in data or int(data['analyzer']) != ANALYZER_VERSION:
+                        return # Vetores de outra versão da análise: refeitos no próximo sync
+                    self.counts = _read_counts(data)
+                    self.ids = data['ids']
+                    self.hashes = data['hashes']
+                    self.df = data['df']
+            except Exception:
+                self._reset() # Arquivo corrompido ou de outro formato: reconstruído no próximo sync
+                return
+        if os.path.exists(self.journal_path):
+            try:
+                with np.load(self.journal_path) as data:
+                    if 'analyzer' not in data or int(data['analyzer']) != ANALYZER_VERSION:
+                        return
+                    ids, counts, hashes = data['ids'], _read_counts(data), data['hashes']
+            except Exception:
+                return # Diário ilegível: as linhas que faltarem voltam no próximo sync
+            self._append(ids, counts, hashes) # Substitui por ID: reaplicar linhas já compactadas é inócuo
+
+    def save(self):
+        """
+        Persiste as mudanças: só as linhas acrescentadas desde a última gravação completa
+        (diário), ou tudo, quando o diário passa de JOURNAL_MAX_ROWS ou não há arquivo principal.
+        """
+        with self._lock:
+            if not os.path.exists(self.path) or sum(len(ids) for ids, _c, _h in self._journal) > JOURNAL_MAX_ROWS:
+                self._save_full()
+            elif self._journal:
+                ids = np.concatenate([ids for ids, _c, _h in self._journal])
+                counts = sparse.vstack([c for _i, c, _h in self._journal], format='csr')
+                hashes = np.concatenate([h for _i, _c, h in self._journal])
+                _write_npz(self.journal_path, counts, ids=ids, hashes=hashes)
+
+    def _save_full(self):
+        """Grava a matriz inteira no arquivo principal e descarta o diário (já incorporado)."""
+        _write_npz(self.path, self.counts, ids=self.ids, hashes=self.hashes, df=self.df)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal = []
+
+    def _remove_positions(self, positions):
+        if not len(positions):
+            return
+        removed = self.counts[positions]
+        self.df -= np.bincount(removed.indices, minlength=N_FEATURES).astype(np.int32)
+        keep = np.setdiff1d(np.arange(len(self.ids)), positions)
+        self.counts = self.counts[keep]
+        self.ids = self.ids[keep]
+        self.hashes = self.hashes[keep]
+
+    def add(self, ids, texts, hashes):
+        """Acrescenta (ou substitui) documentos: vetoriza só os novos e atualiza o df."""
+        if not len(ids):
+            return
+        new = _vectorizer.transform([t[:MAX_TEXT_CHARS] for t in texts]).tocsr()
+        ids = np.asarray(ids, dtype=np.int64)
+        hashes = np.asarray(hashes, dtype='<U16')
+        with self._lock:
+            self._append(ids, new, hashes)
+            self._journal.append((ids, new, hashes))
+
+    def _append(self, ids, new, hashes):
+        self._remove_positions(np.flatnonzero(np.isin(self.ids, ids)))
+        self.df += np.bincount(new.indices, minlength=N_FEATURES).astype(np.int32)
+        self.counts = sparse.vstack([self.counts, new], format='csr')
+        self.ids = np.concatenate([self.ids, ids])
+        self.hashes = np.concatenate([self.hashes, hashes])
+        self._weighted = None
+
+    def add_reference(self, item_id, titulo, resumo, extracted_text=None):
+        """Cadastro de uma nova referência (o texto extraído do PDF, se houver, enriquece o vetor)."""
+        base = _catalog_text(titulo, resumo)
+        text = base + ('\n' + extracted_text if extracted_text else '')
+        self.add([item_id], [text], [_text_hash(base)])
+
+    def sync(self, cat, keep_ids=()):
+        """
+        Alinha o índice ao catálogo: remove IDs excluídos e vetoriza apenas IDs novos
+        ou com título/resumo editados. `keep_ids` protege IDs ainda não gravados no
+        catálogo (fila de escrita). Retorna True se algo mudou (e foi salvo em disco).
+        Como em add_reference, o texto extraído do PDF (guardado no content_store)
+        entra no vetor: editar título/resumo não perde o texto completo.
+        """
+        ids = cat['id'].to_numpy(dtype=np.int64)
+        bases = [_catalog_text(t, r) for t, r in zip(cat['titulo'].tolist(), cat['resumo'].tolist())]
+        hashes = np.asarray([_text_hash(b) for b in bases], dtype='<U16')
+        with self._lock:
+            gone = np.flatnonzero(~np.isin(self.ids, np.concatenate([ids, np.asarray(keep_ids, dtype=np.int64)])))
+            self._remove_positions(gone)
+
+            current = dict(zip(self.ids.tolist(), self.hashes.tolist()))
+            stale = [i for i, (item_id, h) in enumerate(zip(ids.tolist(), hashes.tolist())) if current.get(item_id) != h]
+            extracted = content_store.load_texts(ids[stale].tolist(), db_path=self.content_db_path) if stale else {}
+            texts = [
+                bases[i] + ('\n' + extracted[ids[i]] if extracted.get(ids[i]) else '') for i in stale
+            ]
+            self.add(ids[stale], texts, hashes[stale])
+
+            changed = bool(len(gone) or stale)
+            if changed:
+                self._weighted = None
+                self._save_full() # Exclusões não cabem no diário
+            return changed
+
+    def _weighted_matrix(self):
+        """Matriz TF-IDF normalizada (L2), recalculada só quando o conjunto muda."""
+        if self._weighted is None:
+            n_docs = len(self.ids)
+            idf = (np.log((1 + n_docs) / (1 + self.df)) + 1).astype(np.float32)
+            weighted = self.counts.copy()
+            weighted.data *= idf[weighted.indices]
+            self._weighted = normalize(weighted, norm='l2', copy=False)
+        return self._weighted
+
+    def related(self, item_id, k=5):
+        """Os k documentos mais parecidos com `item_id`: lista de (id, similaridade), em ordem decrescente."""
+        with self._lock:
+            pos = np.flatnonzero(self.ids == item_id)
+            if not len(pos):
+                return []
+            matrix = self._weighted_matrix()
+            scores = (matrix @ matrix[pos[0]].T).toarray().ravel()
+            scores[pos[0]] = 0
+            hits = np.flatnonzero(scores > 0)
+            if len(hits) > k:
+                hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+            hits = hits[np.argsort(-scores[hits], kind='stable')]
+            return [(int(self.ids[h]), float(scores[h])) for h in hits]
@@ -0,0 +1,218 @@
+import os
+from abc import ABC, abstractmethod
+
+import local_mirror
+from change_set import compute_changes, apply_changes, normalize_value
+from row_index import lookup_rows, verify_rows, delete_rows_batch
+import write_queue
+
+# --- Backends de Armazenamento do Catálogo ---
+# Toda a persistência das abas ('bibliografia' e 'dados_externos') passa por
+# esta interface. O backend do Google Sheets é o padrão; o backend SQLite local
+# serve para coleções maiores, uso offline, testes e benchmarks.
+
+SQLITE_BACKEND_DB_FILE = os.environ.get('BIBLIOTECA_SQLITE_DB', 'biblioteca.sqlite')
+
+
+class StaleDataError(Exception):
+    """A aba mudou desde a última carga; a operação foi cancelada para não afetar linhas erradas."""
+
+
+def prepare_df(df, schema):
+    """Garante que o DataFrame tem todas as colunas do esquema, na ordem correta."""
+    df = df.copy()
+    for col in schema:
+        if col not in df.columns:
+            df[col] = None
+    return df[schema]
+
+
+class StorageBackend(ABC):
+    """
+    Interface de persistência. As linhas são identificadas pela "linha da planilha"
+    (posição no DataFrame + 2), o que mantém o índice id → linha válido nos dois backends.
+    `db_path` é a base SQLite local (espelho, versões das abas, fila de escrita);
+    None usa o arquivo padrão do espelho.
+    """
+
+    name = None
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+
+    @abstractmethod
+    def refresh(self, sheet_name):
+        """Atualiza a visão local da aba, se necessário, e devolve a versão atual."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def load(self, sheet_name):
+        """DataFrame da aba; o índice é a posição da linha de dados."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def header(self, sheet_name):
+        """Ordem real das colunas da aba."""
+        raise NotImplementedError
+
+    def version(self, sheet_name):
+        return local_mirror.tab_version(sheet_name, db_path=self.db_path)
+
+    @abstractmethod
+    def append(self, sheet_name, row):
+        """Acrescenta uma linha (na ordem do esquema)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def append_new(self, sheet_name, values, min_id=1):
+        """
+        Acrescenta uma linha nova com ID alocado atomicamente (nunca repetido entre
+        sessões simultâneas). `values` é a linha sem o ID; retorna o ID atribuído.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, sheet_name, df_original, df_atualizado, schema):
+        """Grava as alterações da grade. Retorna o nº de células escritas."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, sheet_name, ids, row_index):
+        """Exclui as linhas dos IDs. Retorna o nº de linhas excluídas; StaleDataError se a aba mudou."""
+        raise NotImplementedError
+
+    def invalidate(self, sheet_name):
+        """Invalida apenas os caches desta aba após uma escrita."""
+        local_mirror.bump_tab_version(sheet_name, db_path=self.db_path)
+
+    def pending_rows(self, sheet_name):
+        """Linhas aceitas mas ainda não persistidas no destino final."""
+        return []
+
+    def pending_count(self):
+        return 0
+
+
+class SheetsBackend(StorageBackend):
+    """Google Sheets, com leitura pelo espelho local e novas linhas pela fila de escrita."""
+
+    name = 'sheets'
+
+    def __init__(self, get_spreadsheet, db_path=None):
+        super().__init__(db_path)
+        self.get_spreadsheet = get_spreadsheet
+
+    def _spreadsheet(self):
+        spreadsheet = self.get_spreadsheet()
+        if not spreadsheet:
+            raise ConnectionError("Sem conexão com o Google Sheets.")
+        return spreadsheet
+
+    def refresh(self, sheet_name):
+        # Sem conexão, o último espelho sincronizado continua sendo servido.
+        spreadsheet = self.get_spreadsheet()
+        if spreadsheet:
+            local_mirror.sync_tab(spreadsheet, sheet_name, db_path=self.db_path)
+        return self.version(sheet_name)
+
+    def load(self, sheet_name):
+        return local_mirror.read_tab(sheet_name, db_path=self.db_path)
+
+    def header(self, sheet_name):
+        return local_mirror.read_header(sheet_name, db_path=self.db_path)
+
+    def append(self, sheet_name, row):
+        write_queue.enqueue_row(sheet_name, row, db_path=self.db_path)
+
+    def append_new(self, sheet_name, values, min_id=1):
+        # O contador de IDs fica na base da fila: alocação e enfileiramento na mesma transação
+        return write_queue.enqueue_new_row(sheet_name, values, min_id, db_path=self.db_path)
+
+    def update(self, sheet_name, df_original, df_atualizado, schema):
+        worksheet = self._spreadsheet().worksheet(sheet_name)
+        changes = None
+        if df_original is not None:
+            changes = compute_changes(df_original, df_atualizado, self.header(sheet_name), schema)
+
+        if changes is not None:
+            return apply_changes(worksheet, changes)
+
+        df_clean = prepare_df(df_atualizado, schema)
+        worksheet.update([df_clean.columns.values.tolist()] + df_clean.values.tolist())
+        return df_clean.size
+
+    def delete(self, sheet_name, ids, row_index):
+        rows, _missing = lookup_rows(row_index, ids)
+        if not rows:
+            return 0
+        spreadsheet = self._spreadsheet()
+        worksheet = spreadsheet.worksheet(sheet_name)
+        header = self.header(sheet_name)
+        if 'titulo' in header and not verify_rows(worksheet, header.index('titulo') + 1, rows):
+            raise StaleDataError(sheet_name)
+        return delete_rows_batch(spreadsheet, worksheet, rows)
+
+    def invalidate(self, sheet_name):
+        local_mirror.mark_stale(sheet_name, db_path=self.db_path) # Próxima leitura consulta o Sheets novamente
+        super().invalidate(sheet_name)
+
+    def pending_rows(self, sheet_name):
+        return write_queue.pending_rows(sheet_name, db_path=self.db_path)
+
+    def pending_count(self):
+        return write_queue.pending_count(db_path=self.db_path)
+
+
+class SQLiteBackend(StorageBackend):
+    """Base SQLite local: sem rede, baixa latência, escrita imediata."""
+
+    name = 'sqlite'
+
+    def __init__(self, schemas, db_path=SQLITE_BACKEND_DB_FILE):
+        super().__init__(db_path)
+        for sheet_name, schema in schemas.items():
+            local_mirror.ensure_tab(sheet_name, schema, db_path=db_path)
+
+    def refresh(self, sheet_name):
+        return self.version(sheet_name)
+
+    def load(self, sheet_name):
+        return local_mirror.read_tab(sheet_name, db_path=self.db_path)
+
+    def header(self, sheet_name):
+        return local_mirror.read_header(sheet_name, db_path=self.db_path)
+
+    def append(self, sheet_name, row):
+        local_mirror.append_local_rows(sheet_name, [row], db_path=self.db_path)
+
+    def append_new(self, sheet_name, values, min_id=1):
+        return local_mirror.append_local_row_new_id(sheet_name, values, min_id, db_path=self.db_path)
+
+    def append_many(self, sheet_name, rows):
+        """Carga em lote (importações, benchmarks)."""
+        return local_mirror.append_local_rows(sheet_name, rows, db_path=self.db_path)
+
+    def update(self, sheet_name, df_original, df_atualizado, schema):
+        changes = None
+        if df_original is not None:
+            changes = compute_changes(df_original, df_atualizado, self.header(sheet_name), schema)
+
+        if changes is not None:
+            return local_mirror.update_local_cells(sheet_name, changes, db_path=self.db_path)
+
+        df_clean = prepare_df(df_atualizado, schema)
+        local_mirror.replace_local_rows(sheet_name, df_clean.values.tolist(), db_path=self.db_path)
+        return df_clean.size
+
+    def delete(self, sheet_name, ids, row_index):
+        rows, _missing = lookup_rows(row_index, ids)
+        if not rows:
+            return 0
+        if 'titulo' in self.header(sheet_name):
+            atuais = local_mirror.read_cells(sheet_name, 'titulo', list(rows), db_path=self.db_path)
+            if any(normalize_value(atuais.get(r)) != normalize_value(v) for r, v in rows.items()):
+                raise StaleDataError(sheet_name)
+        return local_mirror.delete_local_rows(sheet_name, list(rows), db_path=self.db_path)
+
+    def invalidate(self, sheet_name):
+        pass # As escritas locais já incrementam a versão da aba
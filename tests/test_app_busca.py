@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# O app lê os caminhos dos arquivos locais ao importar os módulos: cada cenário roda
+# num processo próprio, com o backend SQLite apontando para o diretório temporário.
+CENARIO_ID_REPETIDO = textwrap.dedent('''
+    import content_store
+    from storage import SQLiteBackend
+    from catalog_model import SCHEMA_BIBLIO, SCHEMA_DATASET
+    from streamlit.testing.v1 import AppTest
+
+    backend = SQLiteBackend({'bibliografia': SCHEMA_BIBLIO, 'dados_externos': SCHEMA_DATASET})
+    linha = lambda i, titulo: [i, titulo, 'Autor', 'Livro', 2001, 'cidade', '', 'resumo', 'A1', '2024-01-01']
+    backend.append_many('bibliografia', [linha(1, 'Primeira'), linha(7, 'Repetida A'), linha(7, 'Repetida B')])
+    content_store.store_text(7, 'O quilombo zyxwvu aparece no texto completo do PDF.')
+
+    at = AppTest.from_file('app.py', default_timeout=120)
+    at.run()
+    at.checkbox(key='busca_texto_completo').check()
+    at.text_input(key='search_geral').set_value('zyxwvu').run()
+    assert not at.exception, [e.value for e in at.exception]
+    print([h.value for h in at.subheader])
+''')
+
+CENARIO_BASE_RECRIADA = textwrap.dedent('''
+    import sys
+    from storage import SQLiteBackend
+    from catalog_model import SCHEMA_BIBLIO, SCHEMA_DATASET
+    from streamlit.testing.v1 import AppTest
+
+    termo, n = sys.argv[1], int(sys.argv[2])
+    backend = SQLiteBackend({'bibliografia': SCHEMA_BIBLIO, 'dados_externos': SCHEMA_DATASET})
+    backend.append_many('bibliografia', [
+        [i, f'{termo} {i}', 'Autor', 'Livro', 2001, 'cidade', '', 'resumo', 'A1', '2024-01-01'] for i in range(1, n + 1)
+    ])
+
+    at = AppTest.from_file('app.py', default_timeout=120)
+    at.run()
+    at.text_input(key='search_geral').set_value(termo).run()
+    assert not at.exception, [e.value for e in at.exception]
+    print([h.value for h in at.subheader])
+''')
+
+
+def _rodar_app(tmp_path, script, *args):
+    env = dict(
+        os.environ,
+        BIBLIOTECA_BACKEND='sqlite',
+        BIBLIOTECA_SQLITE_DB=str(tmp_path / 'biblioteca.sqlite'),
+        BIBLIOTECA_MIRROR_DB=str(tmp_path / 'mirror.sqlite'),
+        BIBLIOTECA_CONTENT_DB=str(tmp_path / 'conteudo.sqlite'),
+        BIBLIOTECA_SIMILARITY_FILE=str(tmp_path / 'similares.npz'),
+        BIBLIOTECA_INDEX_DIR=str(tmp_path / 'indices'),
+        BIBLIOTECA_EXTRACTION_CACHE=str(tmp_path / 'extracoes.sqlite'),
+    )
+    return subprocess.run(
+        [sys.executable, '-c', script, *args], cwd=RAIZ, env=env, capture_output=True, text=True, timeout=300
+    )
+
+
+def test_busca_no_texto_completo_com_id_repetido(tmp_path):
+    resultado = _rodar_app(tmp_path, CENARIO_ID_REPETIDO)
+    assert resultado.returncode == 0, resultado.stderr[-3000:]
+    assert 'Resultados da Busca Unificada (2 itens):' in resultado.stdout
+
+
+def test_base_recriada_nao_reaproveita_indices(tmp_path):
+    primeira = _rodar_app(tmp_path, CENARIO_BASE_RECRIADA, 'alfa', '3')
+    assert 'Resultados da Busca Unificada (3 itens):' in primeira.stdout, primeira.stderr[-3000:]
+    # Base apagada e recriada no mesmo caminho: as versões das abas recomeçam do mesmo número
+    (tmp_path / 'biblioteca.sqlite').unlink()
+    segunda = _rodar_app(tmp_path, CENARIO_BASE_RECRIADA, 'beta', '5')
+    assert segunda.returncode == 0, segunda.stderr[-3000:]
+    assert 'Resultados da Busca Unificada (5 itens):' in segunda.stdout
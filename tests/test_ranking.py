@@ -0,0 +1,34 @@
+import pytest
+
+from ranking import light_stem, _SUFFIXES
+
+# Um par (flexionada, base) por regra de _SUFFIXES: as duas formas têm o mesmo termo
+PARES_POR_SUFIXO = {
+    'ciones': ('naciones', 'nacion'),
+    'coes': ('mineracoes', 'mineracao'),
+    'oes': ('limoes', 'limao'),
+    'aes': ('capitaes', 'capitao'),
+    'ais': ('nacionais', 'nacional'),
+    'eis': ('papeis', 'papel'),
+    'ois': ('espanhois', 'espanhol'),
+    'res': ('mulheres', 'mulher'),
+    'les': ('papeles', 'papel'),
+    'ns': ('homens', 'homem'),
+    's': ('urbanos', 'urbano'),
+}
+
+
+def test_todos_os_sufixos_tem_par():
+    assert set(PARES_POR_SUFIXO) == {suffix for suffix, _repl in _SUFFIXES}
+
+
+@pytest.mark.parametrize('suffix', [suffix for suffix, _repl in _SUFFIXES])
+def test_plural_e_singular_tem_o_mesmo_termo(suffix):
+    plural, singular = PARES_POR_SUFIXO[suffix]
+    assert plural.endswith(suffix)
+    assert light_stem(plural) == light_stem(singular)
+
+
+@pytest.mark.parametrize('token', ['processus', 'analisis', 'congress'])
+def test_s_final_que_nao_e_plural(token):
+    assert light_stem(token) == token
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from row_index import build_row_index, duplicate_ids, lookup_rows, positions_by_id
+
+
+def test_posicoes_na_ordem_dos_ids():
+    assert positions_by_id(pd.Series([10, 20, 30]), [30, 10]).tolist() == [2, 0]
+
+
+def test_id_repetido_da_todas_as_linhas():
+    ids = pd.Series([5, 7, 9, 7])
+    assert positions_by_id(ids, [7, 5]).tolist() == [1, 3, 0]
+    assert positions_by_id(ids, [7, 7]).tolist() == [1, 3]
+
+
+def test_ids_ausentes_sao_ignorados():
+    assert positions_by_id(pd.Series([1, 2]), [3, 2]).tolist() == [1]
+    assert positions_by_id(pd.Series([1, 2]), []).dtype == np.int64
+
+
+def test_indice_de_linhas_com_id_repetido():
+    df = pd.DataFrame({'id': [1, 2, 2], 'titulo': ['a', 'b', 'c']})
+    row_index = build_row_index(df)
+    assert duplicate_ids(row_index) == ['2']
+    rows, missing = lookup_rows(row_index, [2, 4])
+    assert rows == {3: 'b', 4: 'c'}
+    assert missing == [4]
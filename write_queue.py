@@ -0,0 +1,319 @@
+import sqlite3
+import json
+import random
+import threading
+import time
+import requests
+from gspread.exceptions import APIError
+
+from local_mirror import MIRROR_DB_FILE
+
+# --- Fila de Escrita Local (Write-Behind) para Novas Linhas ---
+# Os formulários de cadastro gravam a nova linha nesta fila (SQLite, durável) e
+# retornam na hora. Um flusher em segundo plano envia as linhas pendentes ao
+# Sheets em lotes com append_rows, com novas tentativas e backoff exponencial.
+#
+# append_rows não é idempotente: se o Sheets aplicou o lote mas a resposta se
+# perdeu (timeout, 5xx) ou o processo morreu antes de remover o lote da fila,
+# reenviar duplicaria as linhas. Um lote enviado sem confirmação fica marcado
+# como "em dúvida"; antes de reenviá-lo, os IDs já presentes no fim da aba são
+# descartados do lote. Linhas que falham repetidamente com erros permanentes
+# saem da fila (write_queue_failed) para não bloquear as seguintes e aparecem na interface.
+
+MAX_BATCH_ROWS = 500        # Linhas por chamada append_rows
+MAX_RETRIES = 5             # Tentativas por lote em erros transitórios (429/5xx)
+BASE_BACKOFF_SECONDS = 1.0  # Espera inicial do backoff exponencial
+FLUSH_INTERVAL_SECONDS = 5  # Intervalo do flusher em segundo plano
+MAX_ATTEMPTS = 5            # Rodadas com erro permanente antes de a linha sair da fila
+VERIFY_LOOKBACK_ROWS = 2000 # Linhas finais da aba conferidas antes de reenviar um lote em dúvida
+
+_flush_lock = threading.Lock()
+
+
+def _connect(db_path=None):
+    conn = sqlite3.connect(db_path or MIRROR_DB_FILE, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS write_queue (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tab TEXT NOT NULL,
+            row TEXT NOT NULL,
+            created_at REAL,
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            in_doubt INTEGER DEFAULT 0
+        )
+    """)
+    columns = {r[1] for r in conn.execute("PRAGMA table_info(write_queue)")}
+    if 'in_doubt' not in columns: # Filas criadas antes da verificação de reenvio
+        try:
+            conn.execute("ALTER TABLE write_queue ADD COLUMN in_doubt INTEGER DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass # Outra conexão acrescentou a coluna ao mesmo tempo
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS write_queue_failed (
+            seq INTEGER PRIMARY KEY,
+            tab TEXT NOT NULL,
+            row TEXT NOT NULL,
+            created_at REAL,
+            attempts INTEGER,
+            last_error TEXT,
+            in_doubt INTEGER DEFAULT 0,
+            failed_at REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS id_counters (
+            tab TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+    """)
+    return conn
+
+
+def enqueue_row(sheet_name, row, db_path=None):
+    """Grava uma nova linha na fila local. Retorna imediatamente."""
+    conn = _connect(db_path)
+    try:
+        conn.execute(
+            "INSERT INTO write_queue (tab, row, created_at) VALUES (?, ?, ?)",
+            (sheet_name, json.dumps(row, default=str, ensure_ascii=False), time.time())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def enqueue_new_row(sheet_name, values, min_id=1, db_path=None):
+    """
+    Grava na fila uma nova linha com um ID alocado atomicamente: o contador da aba
+    é incrementado na mesma transação da inserção, então cadastros simultâneos
+    (outras sessões ou processos) nunca recebem o mesmo ID. `values` é a linha sem
+    o ID; `min_id` é o menor ID aceitável (1 + maior ID já presente na aba).
+    Retorna o ID atribuído.
+    """
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE") # Trava de escrita da base até o commit
+        row = conn.execute("SELECT last_id FROM id_counters WHERE tab = ?", (sheet_name,)).fetchone()
+        queued = conn.execute(
+            "SELECT MAX(CAST(json_extract(row, '$[0]') AS INTEGER)) FROM write_queue WHERE tab = ?", (sheet_name,)
+        ).fetchone()[0]
+        new_id = max(row[0] if row else 0, queued or 0, int(min_id) - 1) + 1
+        conn.execute(
+            "INSERT INTO id_counters (tab, last_id) VALUES (?, ?) ON CONFLICT(tab) DO UPDATE SET last_id = excluded.last_id",
+            (sheet_name, new_id)
+        )
+        conn.execute(
+            "INSERT INTO write_queue (tab, row, created_at) VALUES (?, ?, ?)",
+            (sheet_name, json.dumps([new_id] + list(values), default=str, ensure_ascii=False), time.time())
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return new_id
+
+
+def pending_count(sheet_name=None, db_path=None):
+    """Número de linhas aguardando envio (de uma aba ou de todas)."""
+    conn = _connect(db_path)
+    try:
+        if sheet_name:
+            return conn.execute("SELECT COUNT(*) FROM write_queue WHERE tab = ?", (sheet_name,)).fetchone()[0]
+        return conn.execute("SELECT COUNT(*) FROM write_queue").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def pending_rows(sheet_name, db_path=None):
+    """Linhas pendentes de uma aba, na ordem de inserção."""
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute("SELECT row FROM write_queue WHERE tab = ? ORDER BY seq", (sheet_name,)).fetchall()
+    finally:
+        conn.close()
+    return [json.loads(r[0]) for r in rows]
+
+
+def last_error(db_path=None):
+    """Último erro registrado pelo flusher (ou None)."""
+    conn = _connect(db_path)
+    try:
+        row = conn.execute(
+            "SELECT last_error FROM write_queue WHERE last_error IS NOT NULL ORDER BY seq LIMIT 1"
+        ).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def failed_rows(db_path=None):
+    """Linhas retiradas da fila após falhas permanentes: dicts com seq, aba, linha, tentativas e erro."""
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT seq, tab, row, attempts, last_error, failed_at FROM write_queue_failed ORDER BY seq"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [
+        {'seq': seq, 'aba': tab, 'linha': json.loads(row), 'tentativas': attempts, 'erro': error, 'falhou_em': failed_at}
+        for seq, tab, row, attempts, error, failed_at in rows
+    ]
+
+
+def requeue_failed(seqs=None, db_path=None):
+    """Devolve linhas que falharam à fila (todas, ou só as `seqs`), com as tentativas zeradas."""
+    conn = _connect(db_path)
+    try:
+        where, params = ("", ()) if seqs is None else (f"WHERE seq IN ({','.join('?' * len(seqs))})", tuple(seqs))
+        conn.execute(
+            "INSERT INTO write_queue (seq, tab, row, created_at, in_doubt) "
+            f"SELECT seq, tab, row, created_at, in_doubt FROM write_queue_failed {where}",
+            params
+        )
+        moved = conn.execute(f"DELETE FROM write_queue_failed {where}", params).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return moved
+
+
+def discard_failed(seqs, db_path=None):
+    """Descarta definitivamente linhas que falharam."""
+    conn = _connect(db_path)
+    try:
+        removed = conn.executemany("DELETE FROM write_queue_failed WHERE seq = ?", [(s,) for s in seqs]).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return removed
+
+
+def _is_transient(error):
+    """Erros que valem nova tentativa: cota (429), erros do servidor (5xx) e falhas de rede."""
+    if isinstance(error, APIError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def _id_key(value):
+    """ID comparável entre a fila (int) e a planilha (texto, às vezes '12.0')."""
+    try:
+        return str(int(float(value)))
+    except (TypeError, ValueError):
+        return str(value).strip()
+
+
+def _without_sent_rows(worksheet, rows, lookback=VERIFY_LOOKBACK_ROWS):
+    """Remove do lote as linhas cujo ID (1ª coluna) já está entre as últimas `lookback` linhas da aba."""
+    present = {_id_key(v) for v in worksheet.col_values(1)[-lookback:]}
+    return [r for r in rows if not r or _id_key(r[0]) not in present]
+
+
+def _append_with_backoff(worksheet, rows, max_retries=MAX_RETRIES, base_delay=BASE_BACKOFF_SECONDS, in_doubt=False):
+    """
+    Chama append_rows com backoff exponencial (com jitter) em erros transitórios.
+    Antes de cada reenvio (e do 1º envio, se o lote está `in_doubt`), confere na
+    aba quais linhas já chegaram, para não duplicá-las. Retorna o nº de linhas enviadas.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            if attempt or in_doubt:
+                rows = _without_sent_rows(worksheet, rows)
+                if not rows:
+                    return 0 # O envio anterior foi aplicado; só a confirmação se perdeu
+            worksheet.append_rows(rows, value_input_option='USER_ENTERED')
+            return len(rows)
+        except Exception as e:
+            if not _is_transient(e) or attempt == max_retries:
+                raise
+            time.sleep(base_delay * (2 ** attempt) + random.uniform(0, base_delay))
+
+
+def _move_to_failed(conn, seqs):
+    marks = ','.join('?' * len(seqs))
+    conn.execute(
+        "INSERT OR REPLACE INTO write_queue_failed (seq, tab, row, created_at, attempts, last_error, in_doubt, failed_at) "
+        f"SELECT seq, tab, row, created_at, attempts, last_error, in_doubt, ? FROM write_queue WHERE seq IN ({marks})",
+        (time.time(), *seqs)
+    )
+    conn.execute(f"DELETE FROM write_queue WHERE seq IN ({marks})", seqs)
+
+
+def flush_queue(spreadsheet, max_batch=MAX_BATCH_ROWS, db_path=None):
+    """
+    Envia as linhas pendentes ao Sheets, agrupadas por aba em chamadas append_rows.
+    Retorna {aba: nº de linhas enviadas}. Linhas com falha permanecem na fila; uma
+    linha que já falhou vai sozinha no lote, e após MAX_ATTEMPTS falhas permanentes
+    sai da fila (ver failed_rows), liberando as linhas seguintes da aba.
+    """
+    sent = {}
+    with _flush_lock:
+        conn = _connect(db_path)
+        try:
+            tabs = [r[0] for r in conn.execute("SELECT DISTINCT tab FROM write_queue ORDER BY tab").fetchall()]
+            for tab in tabs:
+                while True:
+                    batch = conn.execute(
+                        "SELECT seq, row, last_error, in_doubt, attempts FROM write_queue WHERE tab = ? ORDER BY seq LIMIT ?",
+                        (tab, max_batch)
+                    ).fetchall()
+                    if not batch:
+                        break
+                    if batch[0][2] is not None:
+                        batch = batch[:1] # Isola a linha que já falhou: um erro dela não segura o lote inteiro
+                    seqs = [b[0] for b in batch]
+                    marks = ','.join('?' * len(seqs))
+                    in_doubt = any(b[3] for b in batch)
+                    # Marcado antes do envio: se o processo morrer no meio, o próximo envio confere a aba antes
+                    conn.execute(f"UPDATE write_queue SET in_doubt = 1, attempts = attempts + 1 WHERE seq IN ({marks})", seqs)
+                    conn.commit()
+                    try:
+                        n_sent = _append_with_backoff(spreadsheet.worksheet(tab), [json.loads(b[1]) for b in batch], in_doubt=in_doubt)
+                    except Exception as e:
+                        transient = _is_transient(e)
+                        conn.execute(
+                            f"UPDATE write_queue SET last_error = ?, in_doubt = ? WHERE seq IN ({marks})",
+                            (str(e), int(transient or in_doubt), *seqs)
+                        )
+                        if not transient and len(seqs) == 1 and batch[0][4] + 1 >= MAX_ATTEMPTS:
+                            _move_to_failed(conn, seqs)
+                            conn.commit()
+                            continue # Próximas linhas da aba seguem na mesma rodada
+                        conn.commit()
+                        break
+                    conn.execute(f"DELETE FROM write_queue WHERE seq IN ({marks})", seqs)
+                    conn.commit()
+                    sent[tab] = sent.get(tab, 0) + n_sent
+        finally:
+            conn.close()
+    return sent
+
+
+def start_flusher(get_spreadsheet, on_flush=None, interval=FLUSH_INTERVAL_SECONDS, db_path=None):
+    """
+    Inicia o flusher em segundo plano (thread daemon).
+    `get_spreadsheet` devolve o handle da planilha; `on_flush(aba, n_linhas)` é chamado após cada envio.
+    """
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                if not pending_count(db_path=db_path):
+                    continue
+                spreadsheet = get_spreadsheet()
+                if not spreadsheet:
+                    continue
+                for tab, n_rows in flush_queue(spreadsheet, db_path=db_path).items():
+                    if on_flush:
+                        on_flush(tab, n_rows)
+            except Exception:
+                pass # A fila é durável: a próxima rodada tenta de novo
+
+    thread = threading.Thread(target=_loop, name="biblioteca-write-queue", daemon=True)
+    thread.start()
+    return thread